@@ -1,11 +1,44 @@
 import streamlit as st
 import pandas as pd
 from database import DatabaseManager
+from analytics_cache import AnalyticsCache
+from catalog_cache import ReferenceCatalog
+from archive_manager import ArchiveManager
+from backup import BackupManager
+from notification_hub import NotificationHub
+from search_index import SearchIndex, MatriculaIndex
+from rate_limit import LoginGuard
+from recipient_sets import RecipientSets
+from session_store import SessionManager
+from trend_rollup import TrendRollup
+from audience import Audience
+from campaigns import SubmissionWriter, SurveyCampaigns
+from employer_index import EmployerNormalizer
+from migrations import MigrationRunner
+from notification_retention import NotificationRetention, NOTIFICATION_HOT_DAYS, NOTIFICATION_RETENTION_DAYS
 from datetime import datetime, date
 
 class AdminModule:
     def __init__(self):
         self.db = DatabaseManager()
+        self.analytics = AnalyticsCache.for_database(self.db)
+        self.catalog = ReferenceCatalog.for_database(self.db)
+        self.archive = ArchiveManager(self.db)
+        self.retention = NotificationRetention.for_database(self.db)
+        self.hub = NotificationHub.for_database(self.db)
+        self.search = SearchIndex.for_database(self.db)
+        self.recipients = RecipientSets.for_database(self.db)
+        self.sessions = SessionManager.for_database(self.db)
+        self.login_guard = LoginGuard.for_database(self.db)
+        self.trends = TrendRollup.for_database(self.db)
+        self.campaigns = SurveyCampaigns.for_database(self.db)
+        self.submissions = SubmissionWriter.for_database(self.db)
+        self.employers = EmployerNormalizer.for_database(self.db)
+        self.migrations = MigrationRunner.for_database(self.db)
+        self.backups = BackupManager.for_database(self.db)
+        self.matriculas = {
+            fuente: MatriculaIndex.for_database(self.db, fuente) for fuente in ('egresados', 'usuarios')
+        }
     
     def show_admin_dashboard(self):
         """Dashboard principal del administrador"""
@@ -17,11 +50,13 @@ class AdminModule:
             "📊 Dashboard Principal",
             "👨‍🎓 Gestión de Alumnos Egresados", 
             "🔍 Búsqueda de Alumnos",
+            "🔎 Búsqueda Global",
             "📝 Registro de Nuevos Egresados",
             "🎓 Gestión de Carreras",
             "🏢 Gestión de Empresas",
             "💼 Gestión de Ofertas de Trabajo",
             "📧 Gestión de Notificaciones",
+            "📋 Campañas de Encuesta",
             "👥 Gestión de Usuarios"
         ])
         
@@ -31,6 +66,8 @@ class AdminModule:
             self.manage_graduates()
         elif option == "🔍 Búsqueda de Alumnos":
             self.search_students()
+        elif option == "🔎 Búsqueda Global":
+            self.global_search()
         elif option == "📝 Registro de Nuevos Egresados":
             self.register_new_graduate()
         elif option == "🎓 Gestión de Carreras":
@@ -41,6 +78,8 @@ class AdminModule:
             self.manage_job_offers()
         elif option == "📧 Gestión de Notificaciones":
             self.manage_notifications()
+        elif option == "📋 Campañas de Encuesta":
+            self.manage_campaigns()
         elif option == "👥 Gestión de Usuarios":
             self.manage_users()
     
@@ -51,43 +90,154 @@ class AdminModule:
         col1, col2, col3, col4 = st.columns(4)
         
         # Total de egresados
-        total_graduates = self.db.execute_query("SELECT COUNT(*) as total FROM alumnos_egresados")
+        total_graduates = self.db.execute_query("SELECT COUNT(*) as total FROM alumnos_egresados", query_class='analitica')
         with col1:
             st.metric("Total Egresados", total_graduates.iloc[0]['total'] if not total_graduates.empty else 0)
         
         # Egresados activos (con cuenta)
-        active_users = self.db.execute_query("SELECT COUNT(*) as total FROM usuarios WHERE tipo_usuario = 'alumno' AND activo = 1")
+        active_users = self.db.execute_query("SELECT COUNT(*) as total FROM usuarios WHERE tipo_usuario = 'alumno' AND activo = 1", query_class='analitica')
         with col2:
             st.metric("Usuarios Activos", active_users.iloc[0]['total'] if not active_users.empty else 0)
         
         # Empresas registradas
-        companies = self.db.execute_query("SELECT COUNT(*) as total FROM empresas WHERE activa = 1")
+        companies = self.db.execute_query("SELECT COUNT(*) as total FROM empresas WHERE activa = 1", query_class='analitica')
         with col3:
             st.metric("Empresas Registradas", companies.iloc[0]['total'] if not companies.empty else 0)
         
         # Ofertas activas
-        job_offers = self.db.execute_query("SELECT COUNT(*) as total FROM ofertas_trabajo WHERE activa = 1")
+        job_offers = self.db.execute_query("SELECT COUNT(*) as total FROM ofertas_trabajo WHERE activa = 1", query_class='analitica')
         with col4:
             st.metric("Ofertas Activas", job_offers.iloc[0]['total'] if not job_offers.empty else 0)
         
         # Gráficos adicionales
         st.subheader("📈 Estadísticas por Carrera")
-        career_stats = self.db.execute_query('''
-            SELECT c.nombre_carrera, COUNT(ae.id) as total_egresados
-            FROM carreras c
-            LEFT JOIN alumnos_egresados ae ON c.id = ae.carrera_id
-            GROUP BY c.id, c.nombre_carrera
-            ORDER BY total_egresados DESC
-        ''')
+        career_stats = self.analytics.career_stats()
         
         if not career_stats.empty:
             st.bar_chart(career_stats.set_index('nombre_carrera'))
+        
+        # Indicadores por cohorte desde la caché columnar
+        st.subheader("🎓 Seguimiento por Año de Egreso")
+        cohort_stats = self.analytics.cohort_stats()
+        if not cohort_stats.empty:
+            st.dataframe(cohort_stats, use_container_width=True, hide_index=True)
+        else:
+            st.info("No hay egresados registrados")
+        
+        # Tendencias mensuales desde la agregación incremental (sin recorrer el historial completo)
+        st.subheader("📉 Tendencias por Cohorte")
+        self.trends.run()
+        col1, col2 = st.columns(2)
+        with col1:
+            indicador = st.selectbox("Indicador:", ["% Trabajando", "% Estudiando"], key="trend_indicator")
+        with col2:
+            carreras = self.catalog.ids_carreras()
+            carrera = st.selectbox("Carrera:", ["Todas"] + list(carreras.keys()), key="trend_career")
+        series = self.trends.series(
+            'laboral' if indicador == "% Trabajando" else 'academica',
+            None if carrera == "Todas" else carreras[carrera]
+        )
+        if not series.empty:
+            st.line_chart(series)
+            st.caption("Porcentaje mensual por año de egreso, según la última situación registrada a cada mes")
+        else:
+            st.info("Aún no hay historial de situación para mostrar tendencias")
+        
+        # Empleadores normalizados: el conteo agrupa por empleador_id en lugar de por texto libre
+        st.subheader("🏢 Dónde Trabajan Nuestros Egresados")
+        self.employers.run()
+        carrera_empleo = st.selectbox("Carrera:", ["Todas"] + list(carreras.keys()), key="employer_career")
+        top_employers = self.employers.top_employers(10, None if carrera_empleo == "Todas" else carreras[carrera_empleo])
+        if not top_employers.empty:
+            st.bar_chart(top_employers.set_index('Empleador'))
+            stats = self.employers.stats()
+            st.caption(f"{stats['variantes']} formas de escribir el nombre agrupadas en {stats['empleadores']} empleadores")
+        else:
+            st.info("Aún no hay egresados con empleo registrado")
+        
+        # Métricas de concurrencia de la base de datos
+        with st.expander("⚙️ Métricas de la Base de Datos"):
+            metrics = self.db.get_metrics()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Cola de escritura", metrics['writer_queue_depth'])
+                st.metric("Cola máxima", metrics['writer_queue_max'])
+            with col2:
+                st.metric("Espera promedio (s)", metrics['lock_wait_avg_s'])
+                st.metric("Espera máxima (s)", metrics['lock_wait_max_s'])
+            with col3:
+                st.metric("Escrituras", metrics['writes'])
+                st.metric("Conexiones de lectura", metrics['read_connections'])
+            
+            if metrics['replica_age_s'] is not None:
+                st.caption(f"Réplica de lectura actualizada hace {metrics['replica_age_s']} s "
+                           f"({metrics['replica_refreshes']} actualizaciones)")
+            
+            st.caption(f"Motor de almacenamiento: {metrics['backend']}")
+            
+            pendientes = self.migrations.pending()
+            if pendientes:
+                st.warning(f"Migraciones del esquema en curso: {', '.join(str(v) for v in pendientes)}")
+            for version, error in self.migrations.failed():
+                st.error(f"La migración {version} se detuvo tras varios intentos: {error}")
+                if st.button(f"Reintentar migración {version}", key=f"reintentar_migracion_{version}"):
+                    self.migrations.retry(version)
+                    st.rerun()
+            st.dataframe(self.migrations.status(), use_container_width=True, hide_index=True)
+            if st.button("Ejecutar checkpoint del WAL"):
+                result = self.db.checkpoint("PASSIVE")
+                if result:
+                    st.success(f"Checkpoint completado: {result['checkpointed']} de {result['log_frames']} páginas")
+                else:
+                    st.info("El motor actual administra sus propios checkpoints")
+        
+        # Respaldos en caliente (backup.py)
+        with st.expander("💾 Respaldos de la Base de Datos"):
+            if not self.backups.supported:
+                st.info("El motor actual administra sus propios respaldos")
+            else:
+                respaldos = [manifest for _, manifest in self.backups.snapshots() if manifest]
+                if respaldos:
+                    st.dataframe(pd.DataFrame([{
+                        'Fecha': manifest['creado'],
+                        'Tamaño (KiB)': round(manifest['bytes_comprimido'] / 1024),
+                        'Copia (s)': manifest['segundos_copia'],
+                        'Verificación': manifest['verificacion']
+                    } for manifest in reversed(respaldos)]), use_container_width=True, hide_index=True)
+                else:
+                    st.info("Aún no hay respaldos")
+                st.caption(f"Carpeta: {self.backups.directory} · Para restaurar: python backup.py --restaurar [--hasta FECHA]")
+                if st.button("Crear respaldo ahora"):
+                    with st.spinner("Respaldando..."):
+                        manifest = self.backups.snapshot()
+                        self.backups.rotate()
+                    if manifest['verificado']:
+                        st.success(f"Respaldo {manifest['archivo']} creado y verificado")
+                    else:
+                        st.error(f"El respaldo no superó la verificación: {manifest['verificacion']}")
+        
+        # Intentos de inicio de sesión (límite por ventana deslizante)
+        with st.expander("🔐 Intentos de Inicio de Sesión"):
+            login_stats = self.login_guard.stats()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Intentos", login_stats['intentos'])
+                st.metric("Fallidos", login_stats['fallidos'])
+            with col2:
+                st.metric("Bloqueados por matrícula", login_stats['bloqueados_matricula'])
+                st.metric("Bloqueados por cliente", login_stats['bloqueados_cliente'])
+            with col3:
+                st.metric("Verificaciones bcrypt", login_stats['verificaciones_bcrypt'] + login_stats['verificaciones_simuladas'])
+                st.metric("Tiempo en bcrypt (s)", login_stats['bcrypt_total_s'])
+            st.caption(f"Matrículas inexistentes en caché: {login_stats['matriculas_inexistentes']} · "
+                       f"Verificaciones sin turno: {login_stats['saturados']} · "
+                       f"Bloqueados sin dirección del cliente: {login_stats['bloqueados_sin_direccion']}")
     
     def manage_graduates(self):
         """Gestión CRUD de alumnos egresados"""
         st.subheader("👨‍🎓 Gestión de Alumnos Egresados")
         
-        tab1, tab2, tab3, tab4 = st.tabs(["Ver Todos", "Crear", "Actualizar", "Eliminar"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["Ver Todos", "Crear", "Actualizar", "Eliminar", "Archivo y Lotes"])
         
         with tab1:
             self.view_all_graduates()
@@ -100,6 +250,9 @@ class AdminModule:
         
         with tab4:
             self.delete_graduate()
+        
+        with tab5:
+            self.bulk_graduate_actions()
     
     def view_all_graduates(self):
         """Ver todos los egresados"""
@@ -111,7 +264,7 @@ class AdminModule:
             FROM alumnos_egresados ae
             LEFT JOIN carreras c ON ae.carrera_id = c.id
             ORDER BY ae.fecha_egreso DESC
-        ''')
+        ''', query_class='listado')
         
         if not graduates.empty:
             st.dataframe(graduates, use_container_width=True)
@@ -133,10 +286,9 @@ class AdminModule:
                 telefono = st.text_input("Teléfono")
             
             with col2:
-                # Obtener carreras
-                carreras = self.db.execute_query("SELECT id, nombre_carrera FROM carreras WHERE activa = 1")
-                if not carreras.empty:
-                    carrera_options = dict(zip(carreras['nombre_carrera'], carreras['id']))
+                # Obtener carreras del catálogo compartido
+                carrera_options = self.catalog.carreras_activas()
+                if carrera_options:
                     carrera_selected = st.selectbox("Carrera*", list(carrera_options.keys()))
                     carrera_id = carrera_options[carrera_selected]
                 else:
@@ -154,28 +306,28 @@ class AdminModule:
             if submit:
                 if matricula and nombre and apellidos and fecha_egreso:
                     try:
-                        # Insertar en alumnos_egresados
-                        query = '''
-                            INSERT INTO alumnos_egresados 
-                            (matricula, nombre, apellidos, email, telefono, carrera_id, 
-                             fecha_ingreso, fecha_egreso, promedio, cedula_profesional, titulo_obtenido)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        self.db.execute_query(query, (
-                            matricula, nombre, apellidos, email, telefono, carrera_id,
-                            fecha_ingreso, fecha_egreso, promedio, cedula_profesional, titulo_obtenido
-                        ))
-                        
-                        # Crear usuario para login (contraseña temporal = matrícula)
+                        # Contraseña temporal = matrícula (se calcula fuera de la transacción)
                         password_hash = self.db.hash_password(matricula)
-                        user_query = '''
-                            INSERT INTO usuarios (matricula, password, tipo_usuario, nombre, apellidos, email, telefono)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        self.db.execute_query(user_query, (
-                            matricula, password_hash, 'alumno', nombre, apellidos, email, telefono
-                        ))
                         
+                        # Usuario y egresado se registran juntos o no se registra ninguno
+                        with self.db.transaction() as tx:
+                            tx.execute('''
+                                INSERT INTO usuarios (matricula, password, tipo_usuario, nombre, apellidos, email, telefono)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ''', (
+                                matricula, password_hash, 'alumno', nombre, apellidos, email, telefono
+                            ))
+                            tx.execute('''
+                                INSERT INTO alumnos_egresados 
+                                (matricula, nombre, apellidos, email, telefono, carrera_id, 
+                                 fecha_ingreso, fecha_egreso, promedio, cedula_profesional, titulo_obtenido)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (
+                                matricula, nombre, apellidos, email, telefono, carrera_id,
+                                fecha_ingreso, fecha_egreso, promedio, cedula_profesional, titulo_obtenido
+                            ))
+                        
+                        self._refresh_search([matricula])
                         st.success(f"¡Egresado {nombre} {apellidos} registrado exitosamente!")
                         st.info(f"Contraseña temporal: {matricula}")
                         
@@ -189,7 +341,7 @@ class AdminModule:
         st.write("### Actualizar Información de Egresado")
         
         # Buscar egresado
-        matricula_search = st.text_input("Ingrese la matrícula del egresado a actualizar:")
+        matricula_search = self._matricula_selector("Ingrese la matrícula del egresado a actualizar:", "update_graduate")
         
         if matricula_search:
             graduate = self.db.execute_query(
@@ -228,6 +380,8 @@ class AdminModule:
                                 nombre, apellidos, email, telefono, promedio, 
                                 cedula_profesional, titulo_obtenido, matricula_search
                             ))
+                            # Nombre y apellidos cambian: también las sugerencias de matrícula
+                            self._refresh_search([matricula_search])
                             st.success("¡Información actualizada exitosamente!")
                         except Exception as e:
                             st.error(f"Error al actualizar: {str(e)}")
@@ -239,7 +393,7 @@ class AdminModule:
         st.write("### Eliminar Egresado")
         st.warning("⚠️ Esta acción eliminará permanentemente al egresado del sistema")
         
-        matricula_delete = st.text_input("Ingrese la matrícula del egresado a eliminar:")
+        matricula_delete = self._matricula_selector("Ingrese la matrícula del egresado a eliminar:", "delete_graduate")
         
         if matricula_delete:
             graduate = self.db.execute_query(
@@ -253,12 +407,9 @@ class AdminModule:
                 
                 if st.button("🗑️ Confirmar Eliminación", type="secondary"):
                     try:
-                        # Eliminar de todas las tablas relacionadas
-                        self.db.execute_query("DELETE FROM notificaciones WHERE matricula = ?", (matricula_delete,))
-                        self.db.execute_query("DELETE FROM situacion_laboral WHERE matricula = ?", (matricula_delete,))
-                        self.db.execute_query("DELETE FROM situacion_academica WHERE matricula = ?", (matricula_delete,))
-                        self.db.execute_query("DELETE FROM usuarios WHERE matricula = ?", (matricula_delete,))
-                        self.db.execute_query("DELETE FROM alumnos_egresados WHERE matricula = ?", (matricula_delete,))
+                        # Las tablas relacionadas se limpian con ON DELETE CASCADE
+                        self.db.delete_graduates([matricula_delete])
+                        self._refresh_search([matricula_delete])
                         
                         st.success("¡Egresado eliminado exitosamente!")
                     except Exception as e:
@@ -266,6 +417,49 @@ class AdminModule:
             else:
                 st.error("No se encontró ningún egresado con esa matrícula")
     
+    def bulk_graduate_actions(self):
+        """Eliminación en lote y archivo de egresados antiguos"""
+        st.write("### Eliminar Egresados en Lote")
+        graduates = self.db.fetch_all(
+            "SELECT matricula, nombre, apellidos FROM alumnos_egresados ORDER BY matricula"
+        )
+        labels = {f"{matricula} - {nombre} {apellidos}": matricula for matricula, nombre, apellidos in graduates}
+        selected = st.multiselect("Seleccione los egresados a eliminar:", list(labels.keys()))
+        
+        if selected and st.button(f"🗑️ Eliminar {len(selected)} egresados", type="secondary"):
+            try:
+                matriculas = [labels[label] for label in selected]
+                deleted = self.db.delete_graduates(matriculas)
+                self._refresh_search(matriculas)
+                st.success(f"¡{deleted} egresados eliminados exitosamente!")
+            except Exception as e:
+                st.error(f"Error al eliminar: {str(e)}")
+        
+        st.write("### Archivar Egresados Antiguos")
+        st.info("Los egresados archivados y su historial se guardan comprimidos fuera de las tablas activas")
+        anos = st.number_input("Archivar egresados con más de (años de egreso):", min_value=1, max_value=50, value=10)
+        candidates = self.archive.count_candidates(anos)
+        st.write(f"**Egresados que se archivarían:** {candidates}")
+        
+        if candidates and st.button("📦 Archivar egresados"):
+            try:
+                archived = self.archive.archive_graduates(anos)
+                self.search.sync()
+                self._invalidate_matriculas()
+                st.success(f"¡{archived} egresados archivados exitosamente!")
+            except Exception as e:
+                st.error(f"Error al archivar: {str(e)}")
+        
+        total, recent = self.archive.archived_summary()
+        st.write(f"**Total de egresados archivados:** {total}")
+        if recent:
+            archived = pd.DataFrame(recent, columns=["Matrícula", "Nombre", "Apellidos", "Fecha de Egreso", "Fecha de Archivo"])
+            st.dataframe(archived, hide_index=True)
+            
+            matricula = st.selectbox("Consultar historial archivado:", archived["Matrícula"].tolist())
+            if st.button("Ver historial"):
+                st.json(self.archive.load_history(matricula))
+    
     def search_students(self):
         """Búsqueda avanzada de estudiantes"""
         st.subheader("🔍 Búsqueda de Alumnos Egresados")
@@ -273,7 +467,7 @@ class AdminModule:
         search_type = st.radio("Buscar por:", ["Matrícula", "Nombre", "Carrera"])
         
         if search_type == "Matrícula":
-            matricula = st.text_input("Ingrese la matrícula:")
+            matricula = self._matricula_selector("Ingrese la matrícula:", "search_students")
             if matricula:
                 self.show_student_details(matricula)
         
@@ -285,7 +479,7 @@ class AdminModule:
                     FROM alumnos_egresados ae
                     LEFT JOIN carreras c ON ae.carrera_id = c.id
                     WHERE ae.nombre LIKE ? OR ae.apellidos LIKE ?
-                ''', (f'%{nombre}%', f'%{nombre}%'))
+                ''', (f'%{nombre}%', f'%{nombre}%'), query_class='listado')
                 
                 if not results.empty:
                     st.dataframe(results)
@@ -293,9 +487,9 @@ class AdminModule:
                     st.info("No se encontraron resultados")
         
         elif search_type == "Carrera":
-            carreras = self.db.execute_query("SELECT DISTINCT nombre_carrera FROM carreras WHERE activa = 1")
-            if not carreras.empty:
-                carrera = st.selectbox("Seleccione la carrera:", carreras['nombre_carrera'].tolist())
+            carreras = self.catalog.nombres_carreras(solo_activas=True)
+            if carreras:
+                carrera = st.selectbox("Seleccione la carrera:", carreras)
                 
                 results = self.db.execute_query('''
                     SELECT ae.matricula, ae.nombre, ae.apellidos, ae.fecha_egreso, ae.promedio
@@ -303,13 +497,67 @@ class AdminModule:
                     JOIN carreras c ON ae.carrera_id = c.id
                     WHERE c.nombre_carrera = ?
                     ORDER BY ae.fecha_egreso DESC
-                ''', (carrera,))
+                ''', (carrera,), query_class='listado')
                 
                 if not results.empty:
                     st.dataframe(results)
                 else:
                     st.info("No se encontraron egresados para esta carrera")
     
+    def global_search(self):
+        """Búsqueda en egresados, usuarios, empresas y ofertas desde un solo cuadro"""
+        st.subheader("🔎 Búsqueda Global")
+        
+        if not self.search.ready:
+            st.info("El índice de búsqueda se está construyendo; los resultados pueden estar incompletos")
+        
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            texto = st.text_input("Buscar matrícula, nombre, empresa u oferta:")
+        with col2:
+            tipos = st.multiselect("Tipos:", ['egresado', 'usuario', 'empresa', 'oferta'])
+        
+        if texto:
+            results, elapsed_ms = self.search.timed_search(texto, limit=50, tipos=tipos or None)
+            st.caption(f"{len(results)} resultados en {elapsed_ms:.1f} ms")
+            if results:
+                st.dataframe(
+                    pd.DataFrame(results, columns=['Tipo', 'Clave', 'Nombre', 'Detalle']),
+                    use_container_width=True, hide_index=True
+                )
+                
+                graduates = [clave for tipo, clave, _, _ in results if tipo == 'egresado']
+                if graduates:
+                    matricula = st.selectbox("Ver detalle del egresado:", graduates)
+                    if matricula:
+                        self.show_student_details(matricula)
+            else:
+                st.info("No se encontraron resultados")
+    
+    def _refresh_search(self, matriculas):
+        """Actualiza en los índices de búsqueda a los egresados y usuarios indicados"""
+        self.search.refresh('egresado', matriculas)
+        self.search.refresh('usuario', matriculas)
+        self._invalidate_matriculas()
+
+    def _invalidate_matriculas(self):
+        """Descarta las sugerencias de matrícula en memoria tras altas, bajas o cambios de nombre"""
+        for index in self.matriculas.values():
+            index.invalidate()
+    
+    def _matricula_selector(self, label, key, fuente='egresados'):
+        """Campo de matrícula con sugerencias por prefijo (desde memoria); devuelve la matrícula elegida"""
+        prefix = st.text_input(label, key=f"{key}_prefijo")
+        if not prefix:
+            return None
+        suggestions = self.matriculas[fuente].suggest(prefix)
+        if not suggestions:
+            st.error("No se encontró ninguna matrícula que empiece así")
+            return None
+        options = {f"{matricula} - {nombre}": matricula for matricula, nombre in suggestions}
+        choice = st.selectbox("Coincidencias:", list(options.keys()), key=f"{key}_sugerencias")
+        return options[choice]
+    
     def show_student_details(self, matricula):
         """Muestra detalles completos de un estudiante"""
         # Información básica
@@ -347,10 +595,10 @@ class AdminModule:
                 st.write(f"**Cédula:** {grad_data['cedula_profesional'] or 'No registrada'}")
         
         with tab2:
-            academic = self.db.execute_query(
+            academic = self.catalog.decode(self.db.execute_query(
                 "SELECT * FROM situacion_academica WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
                 (matricula,)
-            )
+            ))
             
             if not academic.empty:
                 acad_data = academic.iloc[0]
@@ -365,10 +613,10 @@ class AdminModule:
                 st.info("No hay información académica registrada")
         
         with tab3:
-            laboral = self.db.execute_query(
+            laboral = self.catalog.decode(self.db.execute_query(
                 "SELECT * FROM situacion_laboral WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
                 (matricula,)
-            )
+            ))
             
             if not laboral.empty:
                 lab_data = laboral.iloc[0]
@@ -420,6 +668,7 @@ class AdminModule:
                             VALUES (?, ?, ?, ?)
                         '''
                         self.db.execute_query(query, (nombre_carrera, facultad, duracion_semestres, activa))
+                        self.search.sync()
                         st.success("¡Carrera agregada exitosamente!")
                     except Exception as e:
                         st.error(f"Error: {str(e)}")
@@ -428,11 +677,37 @@ class AdminModule:
         """Gestión de empresas"""
         st.subheader("🏢 Gestión de Empresas")
         
-        companies = self.db.execute_query("SELECT * FROM empresas ORDER BY fecha_registro DESC")
-        if not companies.empty:
-            st.dataframe(companies)
-        else:
-            st.info("No hay empresas registradas")
+        tab1, tab2 = st.tabs(["Empresas Registradas", "Empleadores de Egresados"])
+        
+        with tab1:
+            companies = self.db.execute_query("SELECT * FROM empresas ORDER BY fecha_registro DESC", query_class='listado')
+            if not companies.empty:
+                st.dataframe(companies)
+            else:
+                st.info("No hay empresas registradas")
+        
+        with tab2:
+            # Empleadores normalizados desde lo que capturan los alumnos en su situación laboral
+            self.employers.run()
+            employers = self.employers.employers()
+            if employers.empty:
+                st.info("Aún no hay empleadores capturados por los egresados")
+                return
+            st.dataframe(employers, use_container_width=True, hide_index=True)
+            
+            st.write("**Fusionar empleadores duplicados**")
+            opciones = {f"{row['nombre']} (#{row['id']}, {row['registros']} registros)": row['id'] for _, row in employers.iterrows()}
+            col1, col2 = st.columns(2)
+            with col1:
+                origen = st.selectbox("Empleador duplicado:", list(opciones.keys()), key="employer_merge_from")
+            with col2:
+                destino = st.selectbox("Fusionar en:", list(opciones.keys()), key="employer_merge_to")
+            if st.button("Fusionar"):
+                if opciones[origen] == opciones[destino]:
+                    st.error("Seleccione dos empleadores distintos")
+                else:
+                    movidos = self.employers.merge(opciones[origen], opciones[destino])
+                    st.success(f"Empleador fusionado; {movidos} registros actualizados")
     
     def manage_job_offers(self):
         """Gestión de ofertas de trabajo"""
@@ -446,17 +721,16 @@ class AdminModule:
                 FROM ofertas_trabajo ot
                 JOIN empresas e ON ot.empresa_id = e.id
                 ORDER BY ot.fecha_publicacion DESC
-            ''')
+            ''', query_class='listado')
             if not offers.empty:
                 st.dataframe(offers)
             else:
                 st.info("No hay ofertas registradas")
         
         with tab2:
-            companies = self.db.execute_query("SELECT id, nombre_empresa FROM empresas WHERE activa = 1")
-            if not companies.empty:
+            company_options = self.catalog.empresas_activas()
+            if company_options:
                 with st.form("job_offer_form"):
-                    company_options = dict(zip(companies['nombre_empresa'], companies['id']))
                     empresa_selected = st.selectbox("Empresa", list(company_options.keys()))
                     empresa_id = company_options[empresa_selected]
                     
@@ -482,6 +756,7 @@ class AdminModule:
                                 empresa_id, titulo_puesto, descripcion, requisitos,
                                 salario_ofrecido, modalidad, ubicacion, fecha_vencimiento
                             ))
+                            self.search.sync()
                             st.success("¡Oferta creada exitosamente!")
                         except Exception as e:
                             st.error(f"Error: {str(e)}")
@@ -493,57 +768,205 @@ class AdminModule:
         st.subheader("📧 Gestión de Notificaciones")
         
         # Enviar notificación masiva
+        st.write("### Enviar Notificación Masiva")
+        
+        # Filtros para destinatarios (fuera del formulario para ver el conteo antes de enviar)
+        filter_type = st.selectbox("Enviar a:", [
+            "Todos los egresados",
+            "Por carrera específica",
+            "Por año de egreso",
+            "Audiencia personalizada"
+        ])
+        
+        recipients = ()
+        audience = None
+        if filter_type == "Audiencia personalizada":
+            audience = self._audience_builder()
+        elif filter_type == "Todos los egresados":
+            recipients = self.recipients.get('todos')
+        elif filter_type == "Por carrera específica":
+            carreras = self.catalog.ids_carreras()
+            if carreras:
+                carrera_filter = st.selectbox("Carrera:", list(carreras.keys()))
+                recipients = self.recipients.get('carrera', carreras[carrera_filter])
+        else:
+            año_filter = st.number_input("Año de egreso:", min_value=2000, max_value=date.today().year, value=2023)
+            recipients = self.recipients.get('anio', int(año_filter))
+        
+        st.caption(f"👥 Destinatarios: {audience.count() if audience else len(recipients)}")
+        
+        # El CSV solo se arma al pedirlo (no en cada rerun): del cursor por lotes a un archivo temporal
+        if audience and st.button("📥 Preparar exportación CSV"):
+            with st.spinner("Generando CSV..."):
+                csv_file = audience.to_csv_file()
+            with csv_file:
+                st.download_button("Descargar destinatarios", csv_file,
+                                   file_name="destinatarios.csv", mime="text/csv")
+        
         with st.form("mass_notification"):
-            st.write("### Enviar Notificación Masiva")
             titulo = st.text_input("Título de la Notificación*")
             mensaje = st.text_area("Mensaje*")
             
-            # Filtros para destinatarios
-            filter_type = st.selectbox("Enviar a:", [
-                "Todos los egresados",
-                "Por carrera específica",
-                "Por año de egreso"
-            ])
-            
-            if filter_type == "Por carrera específica":
-                carreras = self.db.execute_query("SELECT DISTINCT nombre_carrera FROM carreras")
-                if not carreras.empty:
-                    carrera_filter = st.selectbox("Carrera:", carreras['nombre_carrera'].tolist())
-            elif filter_type == "Por año de egreso":
-                año_filter = st.number_input("Año de egreso:", min_value=2000, max_value=2024, value=2023)
-            
             submit = st.form_submit_button("Enviar Notificación")
             
             if submit and titulo and mensaje:
                 try:
-                    # Obtener destinatarios según filtro
-                    if filter_type == "Todos los egresados":
-                        recipients = self.db.execute_query("SELECT matricula FROM usuarios WHERE tipo_usuario = 'alumno'")
-                    elif filter_type == "Por carrera específica":
-                        recipients = self.db.execute_query('''
-                            SELECT u.matricula FROM usuarios u
-                            JOIN alumnos_egresados ae ON u.matricula = ae.matricula
-                            JOIN carreras c ON ae.carrera_id = c.id
-                            WHERE c.nombre_carrera = ?
-                        ''', (carrera_filter,))
-                    else:  # Por año
-                        recipients = self.db.execute_query('''
-                            SELECT u.matricula FROM usuarios u
-                            JOIN alumnos_egresados ae ON u.matricula = ae.matricula
-                            WHERE strftime('%Y', ae.fecha_egreso) = ?
-                        ''', (str(año_filter),))
+                    # Una sola transacción para todos los destinatarios
+                    if audience:
+                        sent = audience.send_notification(titulo, mensaje)
+                    else:
+                        sent = self.recipients.send(recipients, titulo, mensaje)
                     
-                    # Enviar notificaciones
-                    for _, recipient in recipients.iterrows():
-                        query = '''
-                            INSERT INTO notificaciones (matricula, titulo, mensaje)
-                            VALUES (?, ?, ?)
-                        '''
-                        self.db.execute_query(query, (recipient['matricula'], titulo, mensaje))
+                    # Avisar a las sesiones abiertas de los destinatarios (los de la audiencia
+                    # se leen de las notificaciones recién insertadas)
+                    if recipients:
+                        self.hub.publish(recipients)
+                    elif sent:
+                        self.hub.poll()
                     
-                    st.success(f"¡Notificación enviada a {len(recipients)} egresados!")
+                    st.success(f"¡Notificación enviada a {sent} egresados!")
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
+        
+        # Retención, particiones mensuales y compactación del historial
+        with st.expander("🗄️ Retención del Historial"):
+            st.caption(f"Las notificaciones leídas pasan a particiones mensuales a los {NOTIFICATION_HOT_DAYS} días "
+                       f"y se eliminan a los {NOTIFICATION_RETENTION_DAYS} días")
+            
+            partitions = self.retention.partitions_summary()
+            if partitions:
+                st.dataframe(pd.DataFrame(partitions, columns=['Periodo', 'Notificaciones']),
+                             use_container_width=True, hide_index=True)
+            
+            stats = self.retention.storage_stats()
+            if stats:
+                st.caption(f"Páginas: {stats['paginas']} · Libres: {stats['paginas_libres']} · "
+                           f"auto_vacuum: {stats['auto_vacuum']}")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Ejecutar mantenimiento ahora"):
+                    result = self.retention.run()
+                    st.success(f"{result['movidas']} movidas a particiones, {result['eliminadas']} eliminadas, "
+                               f"{result['particiones_eliminadas']} particiones descartadas, "
+                               f"{result['paginas_liberadas']} páginas liberadas")
+            with col2:
+                if stats and stats['auto_vacuum'] != 'INCREMENTAL':
+                    if st.button("Habilitar VACUUM incremental"):
+                        with st.spinner("Reconstruyendo la base de datos..."):
+                            self.retention.enable_incremental_vacuum()
+                        st.success("VACUUM incremental habilitado")
+    
+    def _audience_builder(self):
+        """Filtros combinables de egresados; devuelve la audiencia resultante"""
+        opciones = {"Todos": None, "Sí": True, "No": False}
+        año_actual = date.today().year
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            carreras = self.catalog.ids_carreras()
+            carreras_sel = st.multiselect("Carreras:", list(carreras.keys()))
+            facultades_sel = st.multiselect("Facultades:", self.catalog.facultades())
+            años = st.slider("Año de egreso:", 2000, año_actual, (2000, año_actual))
+            promedio = st.slider("Promedio:", 0.0, 10.0, (0.0, 10.0), step=0.1)
+        with col2:
+            trabaja = st.selectbox("Trabaja actualmente:", list(opciones.keys()))
+            relacionado = st.selectbox("Empleo relacionado con la carrera:", list(opciones.keys()))
+            estudia = st.selectbox("Estudia actualmente:", list(opciones.keys()))
+            titulado = st.selectbox("Título obtenido:", list(opciones.keys()))
+        
+        # Los rangos completos no filtran (así se incluyen egresados sin promedio registrado)
+        return Audience(
+            self.db,
+            carreras=[carreras[nombre] for nombre in carreras_sel],
+            facultades=facultades_sel,
+            anio_desde=años[0] if años[0] > 2000 else None,
+            anio_hasta=años[1] if años[1] < año_actual else None,
+            trabaja=opciones[trabaja],
+            estudia=opciones[estudia],
+            relacionado=opciones[relacionado],
+            promedio_min=promedio[0] if promedio[0] > 0.0 else None,
+            promedio_max=promedio[1] if promedio[1] < 10.0 else None,
+            titulado=opciones[titulado]
+        )
+    
+    def manage_campaigns(self):
+        """Campañas de encuesta para actualizar la situación de los egresados"""
+        st.subheader("📋 Campañas de Encuesta")
+        
+        tab1, tab2 = st.tabs(["Campañas", "Nueva Campaña"])
+        
+        with tab1:
+            campanas = self.campaigns.list()
+            if campanas.empty:
+                st.info("No hay campañas registradas")
+            for _, campana in campanas.iterrows():
+                estado = "🟢 Activa" if campana['activa'] else "⚪ Cerrada"
+                with st.expander(f"{estado} · {campana['nombre']} ({campana['fecha_inicio']} a {campana['fecha_fin']})"):
+                    tasas = self.campaigns.response_rates(campana['id'])
+                    if tasas is not None and not tasas.empty:
+                        audiencia = int(tasas['Audiencia'].sum())
+                        respuestas = int(tasas['Respuestas'].sum())
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Audiencia", audiencia)
+                        with col2:
+                            st.metric("Respuestas", respuestas)
+                        with col3:
+                            st.metric("Tasa de respuesta", f"{respuestas * 100 / audiencia:.1f}%" if audiencia else "0%")
+                        tasas['% Respuesta'] = (tasas['Respuestas'] * 100 / tasas['Audiencia']).round(1)
+                        st.dataframe(tasas, use_container_width=True, hide_index=True)
+                    else:
+                        st.info("La audiencia de esta campaña está vacía")
+                    
+                    st.caption(f"Recordatorios enviados: {campana['recordatorios_enviados']} · "
+                               f"Último: {campana['ultimo_recordatorio'] or 'ninguno'} · "
+                               f"Cada {campana['recordatorio_dias']} días")
+                    if campana['activa']:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            if st.button("📨 Enviar recordatorio ahora", key=f"recordar_{campana['id']}"):
+                                enviados = self.campaigns.send_reminders(campana['id'])
+                                st.success(f"Recordatorio enviado a {enviados} egresados sin respuesta")
+                        with col2:
+                            if st.button("Cerrar campaña", key=f"cerrar_{campana['id']}"):
+                                self.campaigns.close(campana['id'])
+                                st.rerun()
+            
+            # Respuestas recibidas por el escritor en lotes
+            stats = self.submissions.stats()
+            st.caption(f"Respuestas en cola: {stats['en_cola']} · Guardadas: {stats['guardadas']} "
+                       f"en {stats['lotes']} lotes (máximo {stats['lote_maximo']}) · Rechazadas: {stats['rechazadas']}")
+        
+        with tab2:
+            nombre = st.text_input("Nombre de la campaña*")
+            titulo = st.text_input("Título del aviso*", value="📋 Actualiza tu situación")
+            mensaje = st.text_area("Mensaje*", value="Ayúdanos a dar seguimiento a nuestros egresados: "
+                                   "actualiza tu situación laboral y académica en tu portal.")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                fecha_inicio = st.date_input("Inicio", value=date.today())
+            with col2:
+                fecha_fin = st.date_input("Fin", value=date.today())
+            with col3:
+                recordatorio_dias = st.number_input("Recordar cada (días)", min_value=1, max_value=90, value=7)
+            
+            st.write("**Audiencia**")
+            audience = self._audience_builder()
+            st.caption(f"👥 Destinatarios: {audience.count()}")
+            
+            if st.button("Crear Campaña"):
+                if not (nombre and titulo and mensaje):
+                    st.error("Por favor complete los campos obligatorios (*)")
+                elif fecha_fin < fecha_inicio:
+                    st.error("La fecha de fin debe ser posterior a la de inicio")
+                else:
+                    campana_id = self.campaigns.create(nombre, titulo, mensaje, fecha_inicio, fecha_fin, audience, recordatorio_dias)
+                    if fecha_inicio <= date.today():
+                        enviados = self.campaigns.send_reminders(campana_id)
+                        st.success(f"Campaña creada y enviada a {enviados} egresados")
+                    else:
+                        st.success("Campaña creada; el aviso se enviará al iniciar la ventana")
     
     def manage_users(self):
         """Gestión de usuarios del sistema"""
@@ -560,7 +983,7 @@ class AdminModule:
             
             # Activar/Desactivar usuarios
             st.write("### Activar/Desactivar Usuario")
-            matricula_toggle = st.text_input("Matrícula del usuario:")
+            matricula_toggle = self._matricula_selector("Matrícula del usuario:", "toggle_user", fuente='usuarios')
             if matricula_toggle:
                 user = self.db.execute_query("SELECT * FROM usuarios WHERE matricula = ?", (matricula_toggle,))
                 if not user.empty:
@@ -569,6 +992,9 @@ class AdminModule:
                     
                     if st.button(f"{'Desactivar' if current_status else 'Activar'} Usuario"):
                         self.db.execute_query("UPDATE usuarios SET activo = ? WHERE matricula = ?", (new_status, matricula_toggle))
+                        if not new_status:
+                            # Un usuario desactivado pierde sus sesiones abiertas en todos los procesos
+                            self.sessions.store.delete_user(matricula_toggle)
                         st.success(f"Usuario {'activado' if new_status else 'desactivado'} exitosamente")
                         st.rerun()
         else:
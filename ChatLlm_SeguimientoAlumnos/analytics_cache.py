@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import scheduler
+from catalog_cache import ReferenceCatalog
+
+ANALYTICS_REFRESH_SECONDS = int(os.getenv("ANALYTICS_REFRESH_SECONDS", "300"))
+
+# Ediciones de egresados (promedio, título, carrera) y de carreras no dejan fecha de cambio:
+# cuando cambia su versión se reescriben todos los años
+FULL_REFRESH_TABLES = ('alumnos_egresados', 'carreras')
+
+# Egresados con su carrera y la última situación académica y laboral registrada (etiquetas como código)
+EXTRACT_QUERY = '''
+    SELECT ae.matricula, ae.carrera_id, c.nombre_carrera, c.facultad,
+           ae.anio_egreso,
+           ae.fecha_egreso, ae.promedio, ae.titulo_obtenido, ae.fecha_registro,
+           sa.estudia_actualmente, sa.tipo_estudios_id, sa.fecha_actualizacion AS fecha_academica,
+           sl.trabaja_actualmente, sl.sector_id, sl.salario_rango_id, sl.relacionado_carrera,
+           sl.fecha_actualizacion AS fecha_laboral
+    FROM alumnos_egresados ae
+    LEFT JOIN carreras c ON ae.carrera_id = c.id
+    LEFT JOIN situacion_academica sa ON sa.id = (
+        SELECT MAX(id) FROM situacion_academica WHERE matricula = ae.matricula
+    )
+    LEFT JOIN situacion_laboral sl ON sl.id = (
+        SELECT MAX(id) FROM situacion_laboral WHERE matricula = ae.matricula
+    )
+'''
+
+
+class AnalyticsCache:
+    """Copia columnar (Arrow IPC, particionada por año de egreso) para estadísticas por cohorte"""
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, db):
+        root, _ = os.path.splitext(db.db_name)
+        self.db = db
+        self.catalog = ReferenceCatalog.for_database(db)
+        self.cache_dir = f"{root}_analytics"
+        self.state_path = os.path.join(self.cache_dir, "_estado.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def for_database(cls, db):
+        """Caché compartida por proceso, con actualización programada en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._caches_lock:
+            if key not in cls._caches:
+                cache = cls(db)
+                scheduler.schedule(f"analytics:{key}", ANALYTICS_REFRESH_SECONDS, cache.refresh)
+                cls._caches[key] = cache
+            return cls._caches[key]
+
+    def _partition_path(self, year):
+        return os.path.join(self.cache_dir, f"anio_egreso={year}.arrow")
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {'watermark': None, 'counts': {}}
+
+    def _save_state(self, state):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _changed_years(self, state):
+        """Años cuyo contenido cambió desde la última marca de agua o cuyo conteo difiere"""
+        # Sin año de egreso (fecha no válida) no hay partición; el año como entero evita claves "2023.0"
+        counts = self.db.execute_query('''
+            SELECT CAST(anio_egreso AS INTEGER) AS anio, COUNT(*) AS total
+            FROM alumnos_egresados
+            WHERE anio_egreso IS NOT NULL
+            GROUP BY anio_egreso
+        ''', query_class='analitica')
+        current = {str(int(row['anio'])): int(row['total']) for _, row in counts.iterrows()} if not counts.empty else {}
+        changed = {year for year in set(current) | set(state['counts']) if current.get(year) != state['counts'].get(year)}
+
+        if state['watermark']:
+            touched = self.db.execute_query('''
+                SELECT DISTINCT CAST(ae.anio_egreso AS INTEGER) AS anio
+                FROM alumnos_egresados ae
+                WHERE ae.anio_egreso IS NOT NULL AND (
+                    ae.fecha_registro > ?
+                    OR ae.matricula IN (SELECT matricula FROM situacion_academica WHERE fecha_actualizacion > ?)
+                    OR ae.matricula IN (SELECT matricula FROM situacion_laboral WHERE fecha_actualizacion > ?)
+                )
+            ''', (state['watermark'],) * 3, query_class='analitica')
+            if not touched.empty:
+                changed |= {str(int(year)) for year in touched['anio']}
+        else:
+            changed |= set(current)
+        return changed, current
+
+    def _version(self):
+        """Versión de egresados y carreras; None sin triggers de versión (entonces se reescribe todo)"""
+        if not self.db.engine.backend.supports_triggers:
+            return None
+        placeholders = ', '.join('?' for _ in FULL_REFRESH_TABLES)
+        result = self.db.execute_query(
+            f"SELECT COALESCE(SUM(version), 0) AS version FROM versiones_tablas WHERE tabla IN ({placeholders})",
+            FULL_REFRESH_TABLES, query_class='analitica'
+        )
+        return int(result.iloc[0]['version']) if not result.empty else 0
+
+    def _watermark(self):
+        result = self.db.execute_query('''
+            SELECT MAX(ultima) AS watermark FROM (
+                SELECT MAX(fecha_registro) AS ultima FROM alumnos_egresados
+                UNION ALL SELECT MAX(fecha_actualizacion) FROM situacion_academica
+                UNION ALL SELECT MAX(fecha_actualizacion) FROM situacion_laboral
+            ) marcas
+        ''', query_class='analitica')
+        if result.empty or pd.isna(result.iloc[0]['watermark']):
+            return None
+        # En PostgreSQL llega como Timestamp: se guarda como texto en el estado JSON
+        return str(result.iloc[0]['watermark'])
+
+    def refresh(self, full=False):
+        """Reescribe solo las particiones (años) con cambios desde la última ejecución"""
+        with self._lock:
+            state = {'watermark': None, 'counts': {}} if full else self._load_state()
+            # Versión y marca de agua se leen antes que los datos y de la misma clase de consulta:
+            # lo extraído es al menos tan reciente como lo que se registra en el estado
+            version = self._version()
+            if version is None or version != state.get('version'):
+                # Se conservan los conteos para borrar también los años que quedaron vacíos
+                state['watermark'] = None
+            watermark = self._watermark()
+            changed, counts = self._changed_years(state)
+            for year in changed:
+                path = self._partition_path(year)
+                if year not in counts:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                rows = self.db.execute_query(
+                    EXTRACT_QUERY + " WHERE ae.anio_egreso = ?",
+                    (int(year),), query_class='analitica'
+                )
+                table = pa.Table.from_pandas(rows, preserve_index=False)
+                tmp_path = f"{path}.tmp"
+                with pa.OSFile(tmp_path, 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                os.replace(tmp_path, path)
+            self._save_state({'watermark': watermark, 'counts': counts, 'version': version})
+            return sorted(changed)
+
+    def load_table(self):
+        """Lee todas las particiones con memory-map (sin copiar los buffers)"""
+        if not os.path.exists(self.state_path):
+            self.refresh()
+        tables = []
+        for name in sorted(os.listdir(self.cache_dir)):
+            if name.startswith("anio_egreso=") and name.endswith(".arrow"):
+                source = pa.memory_map(os.path.join(self.cache_dir, name), 'r')
+                tables.append(pa.ipc.open_file(source).read_all())
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options='default')
+
+    def career_stats(self):
+        """Total de egresados por carrera, incluidas las carreras sin egresados"""
+        stats = pd.DataFrame({'nombre_carrera': self.catalog.nombres_carreras(), 'total_egresados': 0})
+        table = self.load_table()
+        if table is not None:
+            grouped = table.group_by('nombre_carrera').aggregate([('matricula', 'count')]).to_pandas()
+            totals = dict(zip(grouped['nombre_carrera'], grouped['matricula_count']))
+            stats['total_egresados'] = stats['nombre_carrera'].map(totals).fillna(0).astype(int)
+        return stats.sort_values('total_egresados', ascending=False, kind='stable')
+
+    def cohort_stats(self):
+        """Indicadores de seguimiento por año de egreso"""
+        table = self.load_table()
+        if table is None:
+            return pd.DataFrame()
+        flags = pa.table({
+            'anio_egreso': table['anio_egreso'],
+            'matricula': table['matricula'],
+            'trabaja': pc.fill_null(pc.cast(table['trabaja_actualmente'], pa.int64()), 0),
+            'estudia': pc.fill_null(pc.cast(table['estudia_actualmente'], pa.int64()), 0),
+            'relacionado': pc.fill_null(pc.cast(table['relacionado_carrera'], pa.int64()), 0),
+            'titulado': pc.fill_null(pc.cast(table['titulo_obtenido'], pa.int64()), 0)
+        })
+        grouped = flags.group_by('anio_egreso').aggregate([
+            ('matricula', 'count'), ('trabaja', 'sum'), ('estudia', 'sum'),
+            ('relacionado', 'sum'), ('titulado', 'sum')
+        ]).to_pandas()
+        total = grouped['matricula_count']
+        return pd.DataFrame({
+            'Año de egreso': grouped['anio_egreso'],
+            'Egresados': total,
+            '% Trabajando': (grouped['trabaja_sum'] * 100 / total).round(1),
+            '% Estudiando': (grouped['estudia_sum'] * 100 / total).round(1),
+            '% Empleo relacionado': (grouped['relacionado_sum'] * 100 / total).round(1),
+            '% Titulados': (grouped['titulado_sum'] * 100 / total).round(1)
+        }).sort_values('Año de egreso', ascending=False)
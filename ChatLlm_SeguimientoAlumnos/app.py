@@ -1,22 +1,60 @@
 import streamlit as st
-from auth import AuthManager
-from admin_module import AdminModule
-from student_module import StudentModule
 
-# Inicializar componentes
-auth = AuthManager()
-admin_module = AdminModule()
-student_module = StudentModule()
-
-# Configuración inicial
+# Configuración inicial (debe ser la primera llamada a Streamlit)
 st.set_page_config(page_title="Seguimiento de Egresados - NovaUniversitas", layout="wide")
 
+
+# Los módulos se importan y crean una sola vez por proceso, y solo cuando se necesitan:
+# la página de login no paga el costo del panel de administración ni de pandas
+@st.cache_resource
+def get_auth():
+    from auth import AuthManager
+    return AuthManager()
+
+
+@st.cache_resource
+def get_admin_module():
+    from admin_module import AdminModule
+    return AdminModule()
+
+
+@st.cache_resource
+def get_student_module():
+    from student_module import StudentModule
+    return StudentModule()
+
+
+@st.cache_resource
+def start_background_jobs():
+    """Tareas de fondo del proceso; arrancan con la primera sesión iniciada, no en la página de login"""
+    from backup import BackupManager
+    from campaigns import SurveyCampaigns
+    from employer_index import EmployerNormalizer
+    from migrations import MigrationRunner
+    from notification_retention import NotificationRetention
+    from search_index import SearchIndex
+    from trend_rollup import TrendRollup
+    db = get_auth().db
+    MigrationRunner.for_database(db)
+    NotificationRetention.for_database(db)
+    BackupManager.for_database(db)
+    SearchIndex.for_database(db)
+    TrendRollup.for_database(db)
+    SurveyCampaigns.for_database(db)
+    EmployerNormalizer.for_database(db)
+    return True
+
+
+# Inicializar componentes
+auth = get_auth()
+
 def main():
     # Si no hay sesión, mostrar login
-    if not st.session_state.get("logged_in", False):
+    if not auth.is_logged_in():
         auth.login_page()
     else:
-        user = st.session_state.get("user")
+        user = auth.get_current_user()
+        start_background_jobs()
 
         # Barra superior
         st.sidebar.markdown("---")
@@ -25,9 +63,9 @@ def main():
 
         # Redirigir según tipo de usuario
         if user['tipo_usuario'] == "admin":
-            admin_module.show_admin_dashboard()
+            get_admin_module().show_admin_dashboard()
         elif user['tipo_usuario'] == "alumno":
-            student_module.show_student_dashboard(user)
+            get_student_module().show_student_dashboard(user)
         else:
             st.error("Tipo de usuario no reconocido")
 
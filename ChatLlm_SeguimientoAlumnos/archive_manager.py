@@ -0,0 +1,161 @@
+import json
+import os
+import zlib
+from contextlib import contextmanager
+
+# Tabla de egresados archivados (en la base adjunta "archivo")
+ARCHIVE_TABLE_DEFINITION = '''
+    matricula TEXT PRIMARY KEY,
+    nombre TEXT,
+    apellidos TEXT,
+    carrera_id INTEGER,
+    fecha_egreso DATE,
+    fecha_archivo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    historial BLOB NOT NULL
+'''
+
+# Historial que se conserva de cada egresado (la contraseña no se archiva)
+HISTORY_QUERIES = {
+    'alumnos_egresados': "SELECT * FROM alumnos_egresados WHERE matricula IN ({})",
+    'usuarios': '''
+        SELECT matricula, tipo_usuario, nombre, apellidos, email, telefono, fecha_registro, activo
+        FROM usuarios WHERE matricula IN ({})
+    ''',
+    'situacion_academica': "SELECT * FROM situacion_academica WHERE matricula IN ({})",
+    'situacion_laboral': "SELECT * FROM situacion_laboral WHERE matricula IN ({})",
+    'notificaciones': "SELECT * FROM notificaciones WHERE matricula IN ({})"
+}
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+
+
+def archive_path(db_name):
+    """Archivo SQLite que se adjunta como "archivo" junto a la base principal"""
+    root, ext = os.path.splitext(db_name)
+    return f"{root}_archivo{ext or '.db'}"
+
+
+class ArchiveManager:
+    """Mueve egresados antiguos y su historial a un archivo comprimido fuera de las tablas activas"""
+    def __init__(self, db):
+        self.db = db
+        self.archive_path = archive_path(db.db_name)
+        # Con SQLite el archivo vive en una base adjunta; en otros motores, en la misma base
+        self.schema = 'archivo.' if db.engine.backend.supports_pragmas else ''
+
+    def attach(self, conn):
+        """Adjunta la base de archivo a la conexión (fuera de una transacción: antes de modificar datos)"""
+        if self.schema:
+            attached = [row[1] for row in conn.execute("PRAGMA database_list").fetchall()]
+            if 'archivo' not in attached:
+                conn.execute("ATTACH DATABASE ? AS archivo", (self.archive_path,))
+
+    @contextmanager
+    def reading(self):
+        """Conexión de lectura con el archivo adjunto (no toma el escritor); None si aún no hay archivo"""
+        if self.schema and not os.path.exists(self.archive_path):
+            yield None
+            return
+        with self.db.read_connection() as conn:
+            self.attach(conn)
+            yield conn
+
+    def has_table(self, conn, tabla):
+        if self.schema:
+            query = "SELECT 1 FROM archivo.sqlite_master WHERE type = 'table' AND name = ?"
+        else:
+            query = "SELECT 1 FROM information_schema.tables WHERE table_name = ?"
+        return conn.execute(query, (tabla,)).fetchone() is not None
+
+    def _prepare(self, tx):
+        """Adjunta la base de archivo y crea la tabla de egresados archivados"""
+        self.attach(tx.conn)
+        tx.execute(f"CREATE TABLE IF NOT EXISTS {self.schema}egresados_archivados ({ARCHIVE_TABLE_DEFINITION})")
+
+    def _history(self, tx, matriculas):
+        """Historial de un lote de egresados agrupado por matrícula (una consulta por tabla)"""
+        placeholders = ', '.join('?' for _ in matriculas)
+        history = {matricula: {} for matricula in matriculas}
+        for tabla, query in HISTORY_QUERIES.items():
+            cursor = tx.conn.execute(query.format(placeholders), matriculas)
+            columns = [description[0] for description in cursor.description]
+            for row in cursor.fetchall():
+                record = dict(zip(columns, row))
+                history[record['matricula']].setdefault(tabla, []).append(record)
+        return history
+
+    def count_candidates(self, anos):
+        """Número de egresados con más de N años de egreso"""
+        result = self.db.fetch_one(
+            f"SELECT COUNT(*) FROM alumnos_egresados WHERE fecha_egreso < date('now', '-{int(anos)} years')"
+        )
+        return result[0] if result else 0
+
+    def archive_graduates(self, anos, batch_size=ARCHIVE_BATCH_SIZE):
+        """Archiva por lotes a los egresados con más de N años de egreso; devuelve cuántos se movieron.
+
+        SQLite no confirma atómicamente una transacción en WAL que toca dos bases adjuntas: cada lote
+        se copia y confirma primero en el archivo y después se borran de la base principal solo los
+        egresados que ya están archivados. Si el proceso se interrumpe entre ambos pasos, el siguiente
+        archivado vuelve a copiarlos (reemplazando la copia) y termina de borrarlos."""
+        candidates = self.db.fetch_all(f'''
+            SELECT matricula FROM alumnos_egresados
+            WHERE fecha_egreso < date('now', '-{int(anos)} years')
+            ORDER BY fecha_egreso
+        ''')
+        matriculas = [matricula for matricula, in candidates]
+        archived = 0
+
+        for start in range(0, len(matriculas), batch_size):
+            batch = matriculas[start:start + batch_size]
+            with self.db.transaction() as tx:
+                self._prepare(tx)
+                rows = []
+                for matricula, history in self._history(tx, batch).items():
+                    graduate = history.get('alumnos_egresados', [{}])[0]
+                    blob = zlib.compress(json.dumps(history, default=str).encode('utf-8'), 9)
+                    rows.append((
+                        matricula, graduate.get('nombre'), graduate.get('apellidos'),
+                        graduate.get('carrera_id'), graduate.get('fecha_egreso'), blob
+                    ))
+                tx.executemany(f'''
+                    INSERT INTO {self.schema}egresados_archivados
+                    (matricula, nombre, apellidos, carrera_id, fecha_egreso, historial)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (matricula) DO UPDATE SET historial = excluded.historial
+                ''', rows)
+            with self.db.transaction() as tx:
+                self.attach(tx.conn)
+                placeholders = ', '.join('?' for _ in batch)
+                copied = [matricula for matricula, in tx.conn.execute(
+                    f"SELECT matricula FROM {self.schema}egresados_archivados WHERE matricula IN ({placeholders})",
+                    batch
+                ).fetchall()]
+                if copied:
+                    archived += self.db.delete_graduates(copied, tx)
+        return archived
+
+    def archived_summary(self):
+        """Total de egresados archivados y los más recientes"""
+        with self.reading() as conn:
+            if conn is None or not self.has_table(conn, 'egresados_archivados'):
+                return 0, []
+            total = conn.execute(f"SELECT COUNT(*) FROM {self.schema}egresados_archivados").fetchone()[0]
+            recent = conn.execute(f'''
+                SELECT matricula, nombre, apellidos, fecha_egreso, fecha_archivo
+                FROM {self.schema}egresados_archivados
+                ORDER BY fecha_archivo DESC
+                LIMIT 20
+            ''').fetchall()
+        return total, recent
+
+    def load_history(self, matricula):
+        """Historial descomprimido de un egresado archivado (o None)"""
+        with self.reading() as conn:
+            if conn is None or not self.has_table(conn, 'egresados_archivados'):
+                return None
+            row = conn.execute(
+                f"SELECT historial FROM {self.schema}egresados_archivados WHERE matricula = ?",
+                (matricula,)
+            ).fetchone()
+        return json.loads(zlib.decompress(bytes(row[0]))) if row else None
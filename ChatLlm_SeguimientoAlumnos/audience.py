@@ -0,0 +1,170 @@
+import csv
+import io
+import tempfile
+
+# Situación vigente: el último registro laboral/académico de cada egresado (búsqueda por índice matricula, id)
+CURRENT_LABORAL_JOIN = '''
+    LEFT JOIN situacion_laboral sl ON sl.id = (
+        SELECT MAX(id) FROM situacion_laboral WHERE matricula = ae.matricula
+    )
+'''
+CURRENT_ACADEMICA_JOIN = '''
+    LEFT JOIN situacion_academica sa ON sa.id = (
+        SELECT MAX(id) FROM situacion_academica WHERE matricula = ae.matricula
+    )
+'''
+
+EXPORT_COLUMNS = ['matricula', 'nombre', 'apellidos', 'email', 'nombre_carrera', 'anio_egreso', 'promedio']
+EXPORT_SQL_COLUMNS = ('ae.matricula', 'ae.nombre', 'ae.apellidos', 'ae.email', 'c.nombre_carrera', 'ae.anio_egreso', 'ae.promedio')
+EXPORT_BATCH_SIZE = 1000
+
+
+class Audience:
+    """Conjunto de egresados definido por filtros combinables, compilado a una sola consulta"""
+    def __init__(self, db, carreras=None, facultades=None, anio_desde=None, anio_hasta=None,
+                 trabaja=None, estudia=None, relacionado=None, promedio_min=None, promedio_max=None,
+                 titulado=None):
+        self.db = db
+        self.carreras = list(carreras or [])
+        self.facultades = list(facultades or [])
+        self.anio_desde = anio_desde
+        self.anio_hasta = anio_hasta
+        self.trabaja = trabaja
+        self.estudia = estudia
+        self.relacionado = relacionado
+        self.promedio_min = promedio_min
+        self.promedio_max = promedio_max
+        self.titulado = titulado
+
+    def filters(self):
+        """Filtros activos como diccionario serializable (para guardar la audiencia y reconstruirla)"""
+        return {
+            name: value for name, value in vars(self).items()
+            if name != 'db' and value is not None and value != []
+        }
+
+    def compile(self, with_carrera=False, extra_conditions=None):
+        """(FROM ... WHERE ..., parámetros); solo une las tablas que los filtros o columnas necesitan.
+
+        extra_conditions: [(condición sobre ae, parámetros)] que se agregan al final del WHERE"""
+        joins = []
+        conditions = []
+        params = []
+
+        if self.carreras:
+            conditions.append(f"ae.carrera_id IN ({', '.join('?' for _ in self.carreras)})")
+            params.extend(self.carreras)
+        if self.facultades:
+            joins.append("JOIN carreras c ON ae.carrera_id = c.id")
+            conditions.append(f"c.facultad IN ({', '.join('?' for _ in self.facultades)})")
+            params.extend(self.facultades)
+        if self.anio_desde is not None:
+            conditions.append("ae.anio_egreso >= ?")
+            params.append(int(self.anio_desde))
+        if self.anio_hasta is not None:
+            conditions.append("ae.anio_egreso <= ?")
+            params.append(int(self.anio_hasta))
+        if self.promedio_min is not None:
+            conditions.append("ae.promedio >= ?")
+            params.append(float(self.promedio_min))
+        if self.promedio_max is not None:
+            conditions.append("ae.promedio <= ?")
+            params.append(float(self.promedio_max))
+        if self.titulado is not None:
+            conditions.append("ae.titulo_obtenido = ?")
+            params.append(int(self.titulado))
+
+        if self.trabaja is not None or self.relacionado is not None:
+            joins.append(CURRENT_LABORAL_JOIN)
+            if self.trabaja is not None:
+                # Sin registro laboral se considera que no trabaja
+                conditions.append("COALESCE(sl.trabaja_actualmente, 0) = ?")
+                params.append(int(self.trabaja))
+            if self.relacionado is not None:
+                conditions.append("sl.relacionado_carrera = ?")
+                params.append(int(self.relacionado))
+        if with_carrera and not self.facultades:
+            joins.append("LEFT JOIN carreras c ON ae.carrera_id = c.id")
+        if self.estudia is not None:
+            joins.append(CURRENT_ACADEMICA_JOIN)
+            conditions.append("COALESCE(sa.estudia_actualmente, 0) = ?")
+            params.append(int(self.estudia))
+
+        for condition, condition_params in extra_conditions or ():
+            conditions.append(condition)
+            params.extend(condition_params)
+
+        sql = "FROM alumnos_egresados ae " + ' '.join(joins)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql, tuple(params)
+
+    def count(self):
+        """Número de egresados en la audiencia"""
+        sql, params = self.compile()
+        result = self.db.fetch_one(f"SELECT COUNT(*) {sql}", params)
+        return result[0] if result else 0
+
+    def iter_batches(self, columns=('ae.matricula',), batch_size=EXPORT_BATCH_SIZE):
+        """Recorre la audiencia en lotes de fetchmany, sin cargarla completa en memoria"""
+        sql, params = self.compile(with_carrera=any(column.startswith('c.') for column in columns))
+        with self.db.read_connection() as conn:
+            cursor = conn.execute(f"SELECT {', '.join(columns)} {sql} ORDER BY ae.matricula", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def iter_rows(self, columns=('ae.matricula',), batch_size=EXPORT_BATCH_SIZE):
+        """Recorre la audiencia fila por fila (leída por lotes desde el cursor)"""
+        for rows in self.iter_batches(columns, batch_size):
+            yield from rows
+
+    def send_notification(self, titulo, mensaje, oferta_id=None):
+        """Inserta la notificación para toda la audiencia con un solo INSERT ... SELECT"""
+        sql, params = self.compile()
+        with self.db.transaction() as tx:
+            return tx.execute(
+                f"INSERT INTO notificaciones (matricula, titulo, mensaje, oferta_id) SELECT ae.matricula, ?, ?, ? {sql}",
+                (titulo, mensaje, oferta_id) + params
+            )
+
+    def iter_csv(self, batch_size=EXPORT_BATCH_SIZE):
+        """CSV de la audiencia en trozos UTF-8: el encabezado y luego un trozo por lote del cursor"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in self.iter_batches(EXPORT_SQL_COLUMNS, batch_size):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            # Audiencia vacía: solo el encabezado
+            yield buffer.getvalue().encode('utf-8')
+
+    def write_csv(self, output):
+        """Escribe la audiencia como CSV en un archivo de texto abierto, lote por lote"""
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        total = 0
+        for rows in self.iter_batches(EXPORT_SQL_COLUMNS):
+            writer.writerows(rows)
+            total += len(rows)
+        return total
+
+    def to_csv_file(self):
+        """CSV de la audiencia en UTF-8 escrito lote por lote en un archivo temporal, listo para leer.
+
+        En memoria solo hay un lote a la vez. El archivo no tiene búfer (io.RawIOBase) porque
+        st.download_button de Streamlit 1.31 no acepta SpooledTemporaryFile; se borra al cerrarlo"""
+        output = tempfile.TemporaryFile(buffering=0)
+        try:
+            for chunk in self.iter_csv():
+                output.write(chunk)
+            output.seek(0)
+        except Exception:
+            output.close()
+            raise
+        return output
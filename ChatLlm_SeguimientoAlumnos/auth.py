@@ -1,9 +1,55 @@
 import streamlit as st
 from database import DatabaseManager
+from rate_limit import LoginGuard, client_address
+from session_store import SessionManager
+
+# Parámetro de la URL que lleva el token firmado de la sesión: cualquier proceso detrás
+# del balanceador puede restaurarla (Streamlit no permite escribir cookies).
+# Riesgo: la URL queda en el historial, en la cabecera Referer y en los registros de los proxies.
+# Por eso el token solo vale desde el cliente que inició sesión (dirección y navegador) y vence
+# en minutos (SESSION_TOKEN_TTL_SECONDS); se renueva con el uso. No compartir enlaces con sesión.
+SESSION_PARAM = "sesion"
+
+
+def _session_request():
+    """Petición HTTP de la conexión websocket de la sesión (API interna de Streamlit) o None"""
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        from tornado.httputil import HTTPServerRequest
+        ctx = get_script_run_ctx()
+        client = get_instance().get_client(ctx.session_id) if ctx else None
+        request = getattr(client, 'request', None)
+        # Fuera del servidor (AppTest) el cliente es un simulacro sin petición real
+        return request if isinstance(request, HTTPServerRequest) else None
+    except Exception:
+        # Sin servidor (pruebas) o una versión de Streamlit con otra estructura interna
+        return None
+
+
+def request_headers():
+    """Cabeceras de la conexión: st.context (Streamlit >= 1.37) o la petición del websocket"""
+    context = getattr(st, 'context', None)
+    if context is not None:
+        return context.headers
+    request = _session_request()
+    return request.headers if request is not None else {}
+
+
+def remote_address():
+    """IP del otro extremo de la conexión (el navegador o el proxy), o None fuera del servidor"""
+    address = getattr(getattr(st, 'context', None), 'ip_address', None)
+    if address:
+        return address
+    request = _session_request()
+    return getattr(request, 'remote_ip', None)
+
 
 class AuthManager:
     def __init__(self):
         self.db = DatabaseManager()
+        self.sessions = SessionManager.for_database(self.db)
+        self.guard = LoginGuard.for_database(self.db)
     
     def login_page(self):
         """Página de login principal"""
@@ -32,10 +78,11 @@ class AuthManager:
             
             if submit:
                 if matricula and password:
-                    user = self.db.authenticate_user(matricula, password)
-                    if user and user['tipo_usuario'] == 'alumno':
-                        st.session_state.user = user
-                        st.session_state.logged_in = True
+                    user, retry_after = self.guard.authenticate(matricula, password, self.client_id())
+                    if retry_after:
+                        st.error(f"Demasiados intentos. Intente de nuevo en {int(retry_after) + 1} segundos")
+                    elif user and user['tipo_usuario'] == 'alumno':
+                        self.start_session(user)
                         st.success("¡Bienvenido!")
                         st.rerun()
                     else:
@@ -54,10 +101,11 @@ class AuthManager:
             
             if submit:
                 if matricula and password:
-                    user = self.db.authenticate_user(matricula, password)
-                    if user and user['tipo_usuario'] == 'admin':
-                        st.session_state.user = user
-                        st.session_state.logged_in = True
+                    user, retry_after = self.guard.authenticate(matricula, password, self.client_id())
+                    if retry_after:
+                        st.error(f"Demasiados intentos. Intente de nuevo en {int(retry_after) + 1} segundos")
+                    elif user and user['tipo_usuario'] == 'admin':
+                        self.start_session(user)
                         st.success("¡Bienvenido Administrador!")
                         st.rerun()
                     else:
@@ -98,16 +146,61 @@ class AuthManager:
                 else:
                     st.error("Por favor complete los campos obligatorios (*)")
     
+    def client_id(self):
+        """Cliente para el límite de intentos: IP que agregó nuestro proxy (LOGIN_TRUSTED_PROXIES)
+        o la dirección de la conexión.
+
+        Nunca un identificador de la sesión: bastaría con abrir otra para reiniciar el contador"""
+        return client_address(request_headers().get("X-Forwarded-For")) or remote_address()
+    
+    def client_fingerprint(self):
+        """Huella a la que se ata el token de sesión: dirección del cliente y navegador"""
+        return " ".join(filter(None, [self.client_id(), request_headers().get("User-Agent")]))
+    
+    def start_session(self, user):
+        """Registra la sesión en el almacén compartido y deja su token (atado al cliente) en la URL"""
+        token = self.sessions.create(user, self.client_fingerprint())
+        st.query_params[SESSION_PARAM] = token
+        st.session_state.session_token = token
+        st.session_state.user = user
+        st.session_state.logged_in = True
+    
+    def restore_session(self):
+        """Valida el token de la URL en cada ejecución; restaura la sesión si la abrió otro proceso
+        y renueva el token antes de que venza"""
+        token = st.query_params.get(SESSION_PARAM)
+        client = self.client_fingerprint()
+        user = self.sessions.resolve(token, client) if token else None
+        if user is None:
+            for key in ['user', 'logged_in', 'session_token']:
+                if key in st.session_state:
+                    del st.session_state[key]
+            return None
+        renewed = self.sessions.renew(token, client)
+        if renewed != token:
+            st.query_params[SESSION_PARAM] = renewed
+            token = renewed
+        if st.session_state.get('session_token') != token:
+            st.session_state.session_token = token
+            st.session_state.user = user
+            st.session_state.logged_in = True
+        return user
+    
     def logout(self):
         """Cerrar sesión"""
-        for key in ['user', 'logged_in']:
+        token = st.session_state.get('session_token') or st.query_params.get(SESSION_PARAM)
+        if token:
+            self.sessions.revoke(token, self.client_fingerprint())
+        if SESSION_PARAM in st.query_params:
+            del st.query_params[SESSION_PARAM]
+        for key in ['user', 'logged_in', 'session_token']:
             if key in st.session_state:
                 del st.session_state[key]
         st.rerun()
     
     def is_logged_in(self):
         """Verifica si hay una sesión activa"""
-        return st.session_state.get('logged_in', False)
+        return self.restore_session() is not None
     
     def get_current_user(self):
         """Obtiene el usuario actual"""
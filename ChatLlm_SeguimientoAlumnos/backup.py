@@ -0,0 +1,397 @@
+"""Respaldos en caliente de la base SQLite: copias comprimidas, verificadas y rotadas.
+
+La copia usa la API de backup de SQLite por bloques de páginas, con una pausa entre bloques,
+así que la aplicación sigue escribiendo mientras se respalda. Cada respaldo se comprime,
+se verifica restaurándolo en una base temporal y queda con un manifiesto JSON al lado.
+La base adjunta de archivo (egresados archivados y particiones de notificaciones, que ya no
+están en la principal) se respalda, verifica y restaura junto con ella.
+
+Uso:
+    python backup.py                                  # crear un respaldo ahora
+    python backup.py --lista                          # respaldos disponibles
+    python backup.py --verificar                      # verificar el más reciente
+    python backup.py --restaurar                      # restaurar el más reciente
+    python backup.py --restaurar --hasta "2026-10-19 12:00"   # el último tomado antes de esa hora
+    python backup.py --restaurar --archivo ruta.db.gz
+
+Conviene detener la aplicación antes de restaurar: la restauración reemplaza todo el contenido
+de la base y las cachés de los procesos en marcha no saben que los datos retrocedieron.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import scheduler
+from archive_manager import archive_path
+
+logger = logging.getLogger(__name__)
+
+BACKUP_INTERVAL_SECONDS = int(os.getenv("BACKUP_INTERVAL_SECONDS", "3600"))
+# Páginas copiadas por paso y pausa entre pasos (el escritor de la aplicación no espera a la copia)
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+BACKUP_STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.01"))
+# Si otra conexión escribe, SQLite reinicia la copia; después de estos reinicios se copia en un solo paso
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+# Se conservan los respaldos más recientes y, además, el último de cada día
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "30"))
+BACKUP_DIR = os.getenv("BACKUP_DIR")
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class BackupRestarted(Exception):
+    """La base cambió demasiadas veces durante la copia por pasos"""
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def table_counts(conn):
+    """Filas por tabla, para comparar la copia restaurada con lo que se respaldó"""
+    tablas = [nombre for nombre, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {tabla: conn.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0] for tabla in tablas}
+
+
+class BackupManager:
+    """Respaldos comprimidos de un archivo SQLite, con manifiesto, verificación y rotación"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_name, directory=None, supported=True):
+        root, ext = os.path.splitext(db_name)
+        self.db_name = db_name
+        self.archive_name = archive_path(db_name)
+        self.directory = directory or BACKUP_DIR or f"{root}_respaldos"
+        self.prefix = os.path.basename(root)
+        self.ext = ext or '.db'
+        # Otros motores (PostgreSQL, réplica remota de libSQL) tienen sus propios respaldos
+        self.supported = supported
+        self.last_result = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Instancia compartida por proceso, con un respaldo periódico en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                manager = cls(db.db_name, supported=db.engine.backend.supports_pragmas)
+                if manager.supported:
+                    scheduler.schedule(f"respaldos:{key}", BACKUP_INTERVAL_SECONDS, manager.run)
+                cls._instances[key] = manager
+            return cls._instances[key]
+
+    def _copy(self, source_name, path):
+        """Copia la base con la API de backup por pasos; devuelve (páginas, reinicios)"""
+        source = sqlite3.connect(source_name)
+        target = sqlite3.connect(path)
+        progress = {'remaining': None, 'pages': 0, 'restarts': 0}
+
+        def step(status, remaining, total):
+            # Si quedan más páginas que en el paso anterior, otra conexión escribió y la copia empezó de nuevo
+            if progress['remaining'] is not None and remaining > progress['remaining']:
+                progress['restarts'] += 1
+                if progress['restarts'] > BACKUP_MAX_RESTARTS:
+                    raise BackupRestarted()
+            progress['remaining'] = remaining
+            progress['pages'] = total
+            time.sleep(BACKUP_STEP_PAUSE)
+
+        try:
+            if source.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                # Transacción de lectura abierta: todos los pasos leen la misma instantánea y la copia
+                # no se reinicia con cada escritura de la aplicación (en WAL el lector no frena al escritor)
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            try:
+                source.backup(target, pages=BACKUP_PAGES, progress=step)
+            except BackupRestarted:
+                # Un solo paso lee una instantánea consistente; en modo WAL tampoco bloquea al escritor
+                source.backup(target)
+            target.execute("PRAGMA journal_mode = DELETE")
+            progress['pages'] = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        return progress['pages'], progress['restarts']
+
+    def _path(self, stamp):
+        return os.path.join(self.directory, f"{self.prefix}_{stamp}{self.ext}.gz")
+
+    def _archive_copy(self, path):
+        """Ruta de la copia de la base de archivo que acompaña al respaldo"""
+        return f"{path[:-len(f'{self.ext}.gz')]}.archivo{self.ext}.gz"
+
+    def _capture(self, source_name, path):
+        """Copia (lectura fijada), cuenta y comprime una base; devuelve su parte del manifiesto"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            pages, restarts = self._copy(source_name, tmp_path)
+            conn = sqlite3.connect(tmp_path)
+            try:
+                counts = table_counts(conn)
+            finally:
+                conn.close()
+            size = os.path.getsize(tmp_path)
+            with open(tmp_path, 'rb') as raw, gzip.open(f"{path}.tmp", 'wb', compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, 1 << 20)
+            os.replace(f"{path}.tmp", path)
+        finally:
+            for leftover in (tmp_path, f"{path}.tmp"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        return {
+            'archivo': os.path.basename(path),
+            'bytes_base': size,
+            'bytes_comprimido': os.path.getsize(path),
+            'sha256': sha256(path),
+            'paginas': pages,
+            'reinicios': restarts,
+            'tablas': counts
+        }
+
+    def snapshot(self):
+        """Crea, comprime y verifica un respaldo (con la base de archivo); devuelve su manifiesto"""
+        if not self.supported:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        created = datetime.now().replace(microsecond=0)
+        while os.path.exists(self._path(created.strftime(TIMESTAMP_FORMAT))):
+            created += timedelta(seconds=1)
+        path = self._path(created.strftime(TIMESTAMP_FORMAT))
+        start = time.perf_counter()
+        manifest = self._capture(self.db_name, path)
+        manifest['creado'] = created.isoformat(timespec='seconds')
+        if os.path.exists(self.archive_name):
+            # Después de la principal: el archivado copia y confirma antes de borrar de la principal,
+            # así que todo lo que falta en la copia principal ya está en esta (a lo sumo, repetido)
+            manifest['base_archivo'] = self._capture(self.archive_name, self._archive_copy(path))
+        manifest['segundos_copia'] = round(time.perf_counter() - start, 3)
+        ok, detalle = self.verify(path, manifest)
+        manifest['verificado'] = ok
+        manifest['verificacion'] = detalle
+        with open(f"{path}.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        if not ok:
+            logger.error("Respaldo %s no superó la verificación: %s", path, detalle)
+        elif manifest.get('filas_huerfanas'):
+            logger.warning("Respaldo %s: %s", path, detalle)
+        return manifest
+
+    def _extract(self, path, target):
+        with gzip.open(path, 'rb') as packed, open(target, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, 1 << 20)
+
+    def _check(self, path, parte):
+        """Revisa una copia comprimida contra su parte del manifiesto; devuelve (ok, detalle, filas huérfanas)"""
+        if parte and parte.get('sha256') and sha256(path) != parte['sha256']:
+            return False, "el archivo comprimido no coincide con su sha256", 0
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.directory) as workdir:
+            restored = os.path.join(workdir, "verificacion.db")
+            try:
+                self._extract(path, restored)
+                conn = sqlite3.connect(restored)
+                try:
+                    integrity = [fila for fila, in conn.execute("PRAGMA integrity_check")]
+                    if integrity != ['ok']:
+                        return False, "integrity_check: " + "; ".join(integrity[:5]), 0
+                    if parte and parte.get('tablas') and table_counts(conn) != parte['tablas']:
+                        return False, "los conteos por tabla no coinciden con el manifiesto", 0
+                    return True, "ok", len(conn.execute("PRAGMA foreign_key_check").fetchall())
+                finally:
+                    conn.close()
+            except (OSError, EOFError, sqlite3.DatabaseError) as e:
+                return False, str(e), 0
+
+    def verify(self, path, manifest=None):
+        """Restaura el respaldo (y su base de archivo) en bases temporales y revisa integridad y conteos;
+        devuelve (ok, detalle).
+
+        Las filas huérfanas (foreign_key_check) vienen de la base original y el respaldo las conserva
+        fielmente: no lo invalidan, se anotan en el manifiesto (filas_huerfanas) como advertencia"""
+        manifest = manifest or self._manifest(path)
+        ok, detalle, huerfanas = self._check(path, manifest)
+        if not ok:
+            return False, detalle
+        if manifest and manifest.get('base_archivo'):
+            ok, detalle, _ = self._check(self._archive_copy(path), manifest['base_archivo'])
+            if not ok:
+                return False, f"base de archivo: {detalle}"
+        if manifest is not None:
+            manifest['filas_huerfanas'] = huerfanas
+        if huerfanas:
+            return True, f"ok (advertencia: {huerfanas} filas huérfanas en foreign_key_check)"
+        return True, "ok"
+
+    def _manifest(self, path):
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def snapshots(self):
+        """Respaldos disponibles del más antiguo al más reciente, como (ruta, manifiesto)"""
+        if not os.path.isdir(self.directory):
+            return []
+        encontrados = []
+        for nombre in os.listdir(self.directory):
+            if not (nombre.startswith(f"{self.prefix}_") and nombre.endswith(f"{self.ext}.gz")):
+                continue
+            stamp = nombre[len(self.prefix) + 1:-len(f"{self.ext}.gz")]
+            try:
+                created = datetime.strptime(stamp, TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, nombre)
+            encontrados.append((created, path, self._manifest(path)))
+        return [(path, manifest) for _, path, manifest in sorted(encontrados)]
+
+    def rotate(self, keep=BACKUP_KEEP, keep_daily=BACKUP_KEEP_DAILY):
+        """Elimina los respaldos que no están entre los más recientes ni son el último de un día reciente"""
+        disponibles = self.snapshots()
+        conservar = {path for path, _ in disponibles[-keep:]} if keep else set()
+        limite = (datetime.now() - timedelta(days=keep_daily)).strftime(TIMESTAMP_FORMAT)
+        por_dia = {}
+        for path, _ in disponibles:
+            stamp = os.path.basename(path)[len(self.prefix) + 1:-len(f"{self.ext}.gz")]
+            if stamp >= limite:
+                por_dia[stamp[:8]] = path
+        conservar.update(por_dia.values())
+        eliminados = 0
+        for path, _ in disponibles:
+            if path not in conservar:
+                for archivo in (path, f"{path}.json", self._archive_copy(path)):
+                    if os.path.exists(archivo):
+                        os.remove(archivo)
+                eliminados += 1
+        return eliminados
+
+    def find(self, hasta=None):
+        """Respaldo verificado más reciente, o el último tomado antes de la fecha indicada"""
+        elegidos = [
+            path for path, manifest in self.snapshots()
+            if manifest and manifest.get('verificado')
+            and (hasta is None or datetime.fromisoformat(manifest['creado']) <= hasta)
+        ]
+        return elegidos[-1] if elegidos else None
+
+    def _restore_file(self, path, target_name):
+        """Reescribe target_name con la copia comprimida usando la API de backup"""
+        with tempfile.TemporaryDirectory(dir=self.directory) as workdir:
+            restored = os.path.join(workdir, "restauracion.db")
+            self._extract(path, restored)
+            source = sqlite3.connect(restored)
+            # Con la API de backup el destino se reescribe bajo su propio candado (WAL incluido)
+            target = sqlite3.connect(target_name, timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+
+    def restore(self, path):
+        """Reemplaza el contenido de la base (y de la de archivo) con el respaldo; antes se respalda el estado actual"""
+        manifest = self._manifest(path)
+        ok, detalle = self.verify(path, manifest)
+        if not ok:
+            raise ValueError(f"El respaldo no superó la verificación: {detalle}")
+        previo = None
+        if os.path.exists(self.db_name):
+            try:
+                previo = self.snapshot()
+            except sqlite3.DatabaseError as e:
+                # Base ilegible (el caso típico para restaurar): se aparta tal cual en lugar de respaldarla
+                apartada = f"{self.db_name}.danada_{datetime.now().strftime(TIMESTAMP_FORMAT)}"
+                logger.warning("No se pudo respaldar la base actual (%s); se mueve a %s", e, apartada)
+                for sufijo in ('', '-wal', '-shm'):
+                    if os.path.exists(self.db_name + sufijo):
+                        os.replace(self.db_name + sufijo, apartada + sufijo)
+        self._restore_file(path, self.db_name)
+        if manifest and manifest.get('base_archivo'):
+            self._restore_file(self._archive_copy(path), self.archive_name)
+        return previo
+
+    def run(self):
+        """Tarea programada: respalda si el último respaldo ya tiene al menos medio intervalo, y rota"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            disponibles = self.snapshots()
+            if disponibles and disponibles[-1][1]:
+                # Con varios procesos, el primero en llegar respalda y los demás lo encuentran reciente
+                edad = datetime.now() - datetime.fromisoformat(disponibles[-1][1]['creado'])
+                if edad.total_seconds() < BACKUP_INTERVAL_SECONDS / 2:
+                    return None
+            manifest = self.snapshot()
+            self.rotate()
+            self.last_result = manifest
+            return manifest
+        finally:
+            self._lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respaldos en caliente de la base SQLite")
+    parser.add_argument("--db", default="nova_universitas.db", help="archivo de base de datos")
+    parser.add_argument("--dir", help="carpeta de respaldos (por omisión <base>_respaldos)")
+    accion = parser.add_mutually_exclusive_group()
+    accion.add_argument("--lista", action="store_true", help="mostrar los respaldos disponibles")
+    accion.add_argument("--verificar", action="store_true", help="verificar un respaldo (el más reciente por omisión)")
+    accion.add_argument("--restaurar", action="store_true", help="restaurar un respaldo sobre la base")
+    parser.add_argument("--archivo", help="respaldo a verificar o restaurar")
+    parser.add_argument("--hasta", type=datetime.fromisoformat,
+                        help="usar el último respaldo tomado antes de esta fecha (AAAA-MM-DD HH:MM)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    manager = BackupManager(args.db, args.dir)
+
+    if args.lista:
+        for path, manifest in manager.snapshots():
+            if manifest:
+                estado = "verificado" if manifest.get('verificado') else f"FALLÓ: {manifest.get('verificacion')}"
+                print(f"{manifest['creado']}  {manifest['bytes_comprimido'] / 1024:>10.0f} KiB  {estado}  {path}")
+            else:
+                print(f"{'sin manifiesto':<19}  {os.path.getsize(path) / 1024:>10.0f} KiB  {path}")
+        return
+
+    if args.verificar or args.restaurar:
+        path = args.archivo or manager.find(args.hasta)
+        if path is None:
+            raise SystemExit("No hay un respaldo verificado que cumpla el criterio")
+        if args.verificar:
+            ok, detalle = manager.verify(path)
+            print(f"{path}: {detalle}")
+            raise SystemExit(0 if ok else 1)
+        previo = manager.restore(path)
+        print(f"Restaurado {path} sobre {args.db}")
+        if previo:
+            print(f"Estado anterior respaldado en {previo['archivo']}")
+        return
+
+    manifest = manager.snapshot()
+    print(f"{manifest['archivo']}: {manifest['bytes_base'] / 1024:.0f} KiB -> {manifest['bytes_comprimido'] / 1024:.0f} KiB "
+          f"en {manifest['segundos_copia']} s ({manifest['reinicios']} reinicios), verificación: {manifest['verificacion']}")
+    print(f"Respaldos eliminados por rotación: {manager.rotate()}")
+
+
+if __name__ == "__main__":
+    main()
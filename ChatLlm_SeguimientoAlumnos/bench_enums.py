@@ -0,0 +1,142 @@
+"""Tamaño de la base y velocidad de agregación antes y después de codificar las etiquetas como enteros.
+
+Copia la base actual (con columnas de texto), le agrega registros de situación sintéticos,
+mide, aplica la migración 1 de migrations.py (codigos_catalogo) y vuelve a medir.
+
+Uso:
+    python bench_enums.py                     # 200000 registros laborales y académicos
+    python bench_enums.py --rows 500000 --repeat 7
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_cache import ReferenceCatalog
+from database import ENUM_LABELS, DatabaseManager
+from migrations import MigrationRunner
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nova_universitas.db")
+
+# Agregaciones equivalentes sobre texto y sobre códigos (escenario -> (consulta texto, consulta código, dominios))
+AGGREGATES = {
+    'laboral por sector y salario': (
+        "SELECT sector, salario_rango, COUNT(*) FROM situacion_laboral GROUP BY sector, salario_rango",
+        "SELECT sector_id, salario_rango_id, COUNT(*) FROM situacion_laboral GROUP BY sector_id, salario_rango_id",
+        ('sector', 'salario_rango')
+    ),
+    'académica por tipo de estudios': (
+        "SELECT tipo_estudios, COUNT(*) FROM situacion_academica GROUP BY tipo_estudios",
+        "SELECT tipo_estudios_id, COUNT(*) FROM situacion_academica GROUP BY tipo_estudios_id",
+        ('tipo_estudios',)
+    )
+}
+# Índices para comparar también su tamaño (texto y código)
+BENCH_INDEXES = {
+    'situacion_laboral': (('sector', 'salario_rango'), ('sector_id', 'salario_rango_id')),
+    'situacion_academica': (('tipo_estudios',), ('tipo_estudios_id',))
+}
+
+
+def populate(path, rows):
+    """Agrega registros con etiquetas de texto, como los guardaba la versión anterior"""
+    rnd = random.Random(7)
+    conn = sqlite3.connect(path)
+    matriculas = [m for m, in conn.execute("SELECT matricula FROM usuarios WHERE tipo_usuario = 'alumno'")]
+    conn.executemany('''
+        INSERT INTO situacion_laboral (matricula, trabaja_actualmente, empresa, cargo, sector, salario_rango, relacionado_carrera)
+        VALUES (?, 1, 'Empresa de prueba', 'Analista', ?, ?, 1)
+    ''', ((rnd.choice(matriculas), rnd.choice(ENUM_LABELS['sector']), rnd.choice(ENUM_LABELS['salario_rango'])) for _ in range(rows)))
+    conn.executemany('''
+        INSERT INTO situacion_academica (matricula, estudia_actualmente, institucion_actual, tipo_estudios, nombre_programa)
+        VALUES (?, 1, 'Universidad de prueba', ?, 'Programa')
+    ''', ((rnd.choice(matriculas), rnd.choice(ENUM_LABELS['tipo_estudios'])) for _ in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def measure(path, version, repeat, catalog=None):
+    """Tamaños (bytes por tabla e índice) y mejor tiempo de cada agregación"""
+    conn = sqlite3.connect(path)
+    for tabla, columnas in BENCH_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS bench_{tabla}_{version} ON {tabla} ({', '.join(columnas[version])})")
+    conn.commit()
+    conn.execute("VACUUM")
+    sizes = dict(conn.execute('''
+        SELECT name, SUM(pgsize) FROM dbstat
+        WHERE name IN ('situacion_laboral', 'situacion_academica') OR name LIKE 'bench_%'
+        GROUP BY name
+    '''))
+    timings = {}
+    for nombre, (texto, codigo, dominios) in AGGREGATES.items():
+        query = texto if version == 0 else codigo
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = conn.execute(query).fetchall()
+            if catalog is not None:
+                # El decodificador en memoria es parte del costo de mostrar etiquetas
+                etiquetas = [catalog.etiquetas(dominio) for dominio in dominios]
+                rows = [tuple(e.get(v) for e, v in zip(etiquetas, row)) + row[len(dominios):] for row in rows]
+            best = min(best, time.perf_counter() - start)
+        timings[nombre] = best
+    conn.execute(f"DROP INDEX IF EXISTS bench_situacion_laboral_{version}")
+    conn.execute(f"DROP INDEX IF EXISTS bench_situacion_academica_{version}")
+    conn.commit()
+    conn.close()
+    return sizes, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamaño y agregaciones con etiquetas de texto y con códigos enteros")
+    parser.add_argument("--rows", type=int, default=200000, help="registros sintéticos por tabla de situación")
+    parser.add_argument("--repeat", type=int, default=5, help="repeticiones por agregación (se reporta la mejor)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "bench_enums.db")
+        shutil.copy(SOURCE_DB, path)
+        conn = sqlite3.connect(path)
+        columnas = {columna[1] for columna in conn.execute("PRAGMA table_info(situacion_laboral)")}
+        conn.close()
+        if 'sector' not in columnas:
+            sys.exit("La base de origen ya usa códigos; se necesita una base con columnas de texto")
+        populate(path, args.rows)
+        before_sizes, before_times = measure(path, 0, args.repeat)
+
+        db = DatabaseManager(path)
+        start = time.perf_counter()
+        MigrationRunner(db, pause=0).run()
+        migration = time.perf_counter() - start
+        catalog = ReferenceCatalog.for_database(db)
+        after_sizes, after_times = measure(path, 1, args.repeat, catalog)
+
+        print(f"{args.rows} registros por tabla; migración en {migration:.2f} s")
+        print(f"{'Objeto':<34}{'Texto (KiB)':>14}{'Código (KiB)':>14}{'Ahorro':>9}")
+        objetos = [
+            ('situacion_laboral', 'situacion_laboral', 'situacion_laboral'),
+            ('situacion_academica', 'situacion_academica', 'situacion_academica'),
+            ('índice laboral', 'bench_situacion_laboral_0', 'bench_situacion_laboral_1'),
+            ('índice académico', 'bench_situacion_academica_0', 'bench_situacion_academica_1')
+        ]
+        filas = [(nombre, before_sizes.get(antes, 0), after_sizes.get(despues, 0)) for nombre, antes, despues in objetos]
+        filas.append(('total', sum(a for _, a, _ in filas), sum(d for _, _, d in filas)))
+        for nombre, a, d in filas:
+            print(f"{nombre:<34}{a / 1024:>14.0f}{d / 1024:>14.0f}{(1 - d / a) * 100 if a else 0:>8.1f}%")
+        print(f"{'Agregación':<34}{'Texto (ms)':>14}{'Código (ms)':>14}{'Aceleración':>13}")
+        for nombre in AGGREGATES:
+            a, d = before_times[nombre] * 1000, after_times[nombre] * 1000
+            print(f"{nombre:<34}{a:>14.1f}{d:>14.1f}{a / d:>12.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Prueba de carga del inicio de sesión bajo un ataque de fuerza bruta / relleno de credenciales.
+
+Compara authenticate_user directo contra LoginGuard y reporta el CPU consumido:
+con el límite de intentos y el semáforo de bcrypt el uso de CPU queda acotado.
+
+Uso:
+    python bench_login.py                          # 10 s por escenario, 16 hilos atacantes
+    python bench_login.py --duration 30 --threads 32 --clients 1000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+from rate_limit import LOGIN_MAX_ATTEMPTS_CLIENT, LOGIN_MAX_ATTEMPTS_MATRICULA, LOGIN_MAX_CONCURRENT_CHECKS, LoginGuard
+
+
+def attack(authenticate, duration, threads, matriculas, clients, pause):
+    """Lanza intentos fallidos desde varios hilos; devuelve intentos, segundos de CPU y de reloj.
+
+    El CPU se mide por hilo solo dentro de authenticate: es lo que pagaría el servidor,
+    sin contar el ciclo de los propios atacantes."""
+    stop = time.monotonic() + duration
+    attempts = [0] * threads
+    cpu = [0.0] * threads
+
+    def worker(index):
+        rnd = random.Random(index)
+        while time.monotonic() < stop:
+            start = time.thread_time()
+            authenticate(rnd.choice(matriculas), "contrasena-incorrecta", rnd.choice(clients))
+            cpu[index] += time.thread_time() - start
+            attempts[index] += 1
+            # Latencia de red entre peticiones del atacante
+            time.sleep(pause)
+
+    wall_start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(attempts), sum(cpu), time.perf_counter() - wall_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU del inicio de sesión bajo ataque, con y sin LoginGuard")
+    parser.add_argument("--duration", type=float, default=10, help="segundos por escenario")
+    parser.add_argument("--threads", type=int, default=16, help="hilos atacantes simultáneos")
+    parser.add_argument("--users", type=int, default=5, help="usuarios reales en la base de prueba")
+    parser.add_argument("--clients", type=int, default=4, help="clientes (IP) desde los que se ataca")
+    parser.add_argument("--pause", type=float, default=0.005, help="segundos entre peticiones de cada hilo (latencia de red)")
+    parser.add_argument("--max-cliente", type=int, default=LOGIN_MAX_ATTEMPTS_CLIENT, help="intentos por cliente en la ventana")
+    parser.add_argument("--max-matricula", type=int, default=LOGIN_MAX_ATTEMPTS_MATRICULA, help="intentos por matrícula en la ventana")
+    parser.add_argument("--max-checks", type=int, default=LOGIN_MAX_CONCURRENT_CHECKS, help="verificaciones bcrypt simultáneas")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db = DatabaseManager(os.path.join(workdir, "bench_login.db"))
+        existing = []
+        with db.transaction() as tx:
+            for i in range(args.users):
+                matricula = f"BENCH{i:04d}"
+                tx.execute(
+                    "INSERT INTO usuarios (matricula, password, tipo_usuario, nombre, apellidos) VALUES (?, ?, 'alumno', 'Prueba', 'Carga')",
+                    (matricula, db.hash_password(f"clave-{i}"))
+                )
+                existing.append(matricula)
+        # Relleno de credenciales: mayoría de matrículas inexistentes y algunas reales
+        matriculas = existing + [f"X{i:07d}" for i in range(len(existing) * 9)]
+        clients = [f"10.0.{i // 256}.{i % 256}" for i in range(args.clients)]
+
+        guard = LoginGuard(db, args.max_matricula, args.max_cliente, args.max_checks)
+        # Ningún intento pasa del límite por cliente ni del límite por matrícula dentro de la ventana
+        techo = min(args.clients * args.max_cliente, len(matriculas) * args.max_matricula)
+        escenarios = [
+            ("sin protección", lambda matricula, password, client: db.authenticate_user(matricula, password)),
+            ("LoginGuard", guard.authenticate)
+        ]
+
+        print(f"{args.threads} hilos, {args.clients} clientes, {len(matriculas)} matrículas, "
+              f"{os.cpu_count()} núcleos, máximo {args.max_checks} verificaciones bcrypt simultáneas")
+        print(f"Techo de verificaciones bcrypt por ventana con LoginGuard: {techo}")
+        print(f"{'Escenario':<16}{'Intentos':>10}{'Intentos/s':>12}{'CPU (s)':>10}{'Núcleos usados':>16}")
+        for nombre, authenticate in escenarios:
+            attempts, cpu, wall = attack(authenticate, args.duration, args.threads, matriculas, clients, args.pause)
+            print(f"{nombre:<16}{attempts:>10}{attempts / wall:>12.1f}{cpu:>10.2f}{cpu / wall:>16.2f}")
+
+        stats = guard.stats()
+        print("Métricas de LoginGuard:", stats)
+        print(f"Verificaciones bcrypt con LoginGuard: {stats['verificaciones_bcrypt'] + stats['verificaciones_simuladas']} (techo {techo})")
+
+        # Un usuario que no fue atacado sigue entrando desde otro cliente después del ataque
+        start = time.perf_counter()
+        user, retry_after = guard.authenticate("ADMIN001", "admin123", "192.168.1.10")
+        print(f"Inicio de sesión legítimo de otro cliente: {'aceptado' if user else f'rechazado (espera {retry_after:.0f} s)'} "
+              f"en {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Mide el tiempo de importación de cada ruta de arranque con python -X importtime.
+
+Uso:
+    python bench_startup.py              # tabla por ruta y módulos más costosos
+    python bench_startup.py --repeat 5   # mejor de 5 ejecuciones
+    python bench_startup.py --strict     # sale con código 1 si alguna ruta excede su presupuesto
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ruta de arranque -> (módulo, presupuesto en ms de importación propia de la aplicación)
+# Streamlit se importa antes de medir: el presupuesto cubre solo lo que agrega la aplicación
+STARTUP_PATHS = {
+    'login': ('auth', int(os.getenv("IMPORT_BUDGET_LOGIN_MS", "60"))),
+    'alumno': ('student_module', int(os.getenv("IMPORT_BUDGET_ALUMNO_MS", "120"))),
+    'administrador': ('admin_module', int(os.getenv("IMPORT_BUDGET_ADMIN_MS", "200")))
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def measure(module):
+    """(ms acumulados del módulo, [(ms propios, nombre)]) para un proceso nuevo"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import streamlit; import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    entries = []
+    recording = False
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        # Solo cuenta lo importado después de streamlit
+        if name == 'streamlit' and len(indent) == 1:
+            recording = True
+            continue
+        if recording:
+            entries.append((self_us / 1000, name))
+            if name == module and len(indent) == 1:
+                total_us = cumulative_us
+    return total_us / 1000, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación por ruta de arranque")
+    parser.add_argument("--repeat", type=int, default=3, help="ejecuciones por ruta (se toma la mejor)")
+    parser.add_argument("--top", type=int, default=8, help="módulos más costosos que se muestran por ruta")
+    parser.add_argument("--strict", action="store_true", help="código de salida 1 si se excede algún presupuesto")
+    args = parser.parse_args()
+
+    exceeded = False
+    print(f"{'Ruta':<15}{'Módulo':<18}{'Importación (ms)':>18}{'Presupuesto (ms)':>18}")
+    for ruta, (module, budget) in STARTUP_PATHS.items():
+        runs = [measure(module) for _ in range(args.repeat)]
+        total, entries = min(runs, key=lambda run: run[0])
+        status = "OK" if total <= budget else "EXCEDIDO"
+        exceeded |= total > budget
+        print(f"{ruta:<15}{module:<18}{total:>18.1f}{budget:>18}  {status}")
+        for self_ms, name in sorted(entries, reverse=True)[:args.top]:
+            print(f"{'':<15}  {self_ms:>8.1f} ms  {name}")
+
+    if args.strict and exceeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
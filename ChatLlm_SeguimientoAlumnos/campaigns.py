@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+import scheduler
+from audience import Audience
+from catalog_cache import ReferenceCatalog
+from notification_hub import NotificationHub
+
+logger = logging.getLogger(__name__)
+
+SURVEY_REMINDER_CHECK_SECONDS = int(os.getenv("SURVEY_REMINDER_CHECK_SECONDS", "3600"))
+# Cola acotada de respuestas: con picos, los envíos esperan turno en lugar de saturar al escritor
+SURVEY_QUEUE_SIZE = int(os.getenv("SURVEY_QUEUE_SIZE", "2000"))
+SURVEY_BATCH_SIZE = int(os.getenv("SURVEY_BATCH_SIZE", "200"))
+SURVEY_FLUSH_SECONDS = float(os.getenv("SURVEY_FLUSH_SECONDS", "0.05"))
+SURVEY_SUBMIT_TIMEOUT = float(os.getenv("SURVEY_SUBMIT_TIMEOUT", "10"))
+
+# Registro de situación que envía el alumno (tipo -> INSERT con todas sus columnas)
+SITUATION_INSERTS = {
+    'laboral': '''
+        INSERT INTO situacion_laboral
+        (matricula, trabaja_actualmente, empresa, cargo, sector_id,
+         salario_rango_id, anos_experiencia, fecha_inicio_trabajo, relacionado_carrera)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'academica': '''
+        INSERT INTO situacion_academica
+        (matricula, estudia_actualmente, institucion_actual, tipo_estudios_id,
+         nombre_programa, fecha_inicio, fecha_fin_estimada)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+}
+# Posición de las etiquetas que se guardan como código (posición -> dominio)
+SITUATION_CODES = {
+    'laboral': {4: 'sector', 5: 'salario_rango'},
+    'academica': {3: 'tipo_estudios'}
+}
+
+# Un egresado respondió si registró cualquier situación dentro de la ventana de la campaña
+RESPONDED_CONDITION = '''(
+    EXISTS (SELECT 1 FROM situacion_laboral rl WHERE rl.matricula = ae.matricula
+            AND rl.fecha_actualizacion >= ? AND rl.fecha_actualizacion < ?)
+    OR EXISTS (SELECT 1 FROM situacion_academica ra WHERE ra.matricula = ae.matricula
+               AND ra.fecha_actualizacion >= ? AND ra.fecha_actualizacion < ?)
+)'''
+
+
+class SubmissionWriter:
+    """Escritura agrupada (group commit) de las respuestas: un hilo junta lotes de la cola y los confirma juntos"""
+    _writers = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.catalog = ReferenceCatalog.for_database(db)
+        self.queue = queue.Queue(maxsize=SURVEY_QUEUE_SIZE)
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.max_batch = 0
+        self._thread = threading.Thread(target=self._loop, name="respuestas-encuesta", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_database(cls, db):
+        key = os.path.abspath(db.db_name)
+        with cls._writers_lock:
+            if key not in cls._writers:
+                cls._writers[key] = cls(db)
+            return cls._writers[key]
+
+    def submit(self, tipo, params, timeout=SURVEY_SUBMIT_TIMEOUT):
+        """Encola una respuesta (con sus etiquetas ya codificadas) y espera a que su lote se confirme"""
+        params = list(params)
+        for posicion, dominio in SITUATION_CODES[tipo].items():
+            params[posicion] = self.catalog.codigo(dominio, params[posicion])
+        item = {'tipo': tipo, 'params': tuple(params), 'done': threading.Event(), 'error': None}
+        try:
+            self.queue.put(item, timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise RuntimeError("El sistema está recibiendo muchas respuestas; intente de nuevo en unos segundos")
+        self.submitted += 1
+        if not item['done'].wait(timeout):
+            raise RuntimeError("La respuesta sigue en espera de guardarse; revise su situación en unos segundos")
+        if item['error'] is not None:
+            raise item['error']
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + SURVEY_FLUSH_SECONDS
+            while len(batch) < SURVEY_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        """Un commit por lote; si falla, se reintenta respuesta por respuesta para aislar la inválida"""
+        try:
+            with self.db.transaction() as tx:
+                for tipo in SITUATION_INSERTS:
+                    rows = [item['params'] for item in batch if item['tipo'] == tipo]
+                    if rows:
+                        tx.executemany(SITUATION_INSERTS[tipo], rows)
+        except Exception:
+            logger.exception("Lote de %s respuestas rechazado; se guardan una por una", len(batch))
+            for item in batch:
+                try:
+                    with self.db.transaction() as tx:
+                        tx.execute(SITUATION_INSERTS[item['tipo']], item['params'])
+                except Exception as e:
+                    item['error'] = e
+        self.written += sum(1 for item in batch if item['error'] is None)
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        for item in batch:
+            item['done'].set()
+
+    def stats(self):
+        return {
+            'en_cola': self.queue.qsize(),
+            'recibidas': self.submitted,
+            'guardadas': self.written,
+            'lotes': self.batches,
+            'lote_maximo': self.max_batch,
+            'rechazadas': self.rejected
+        }
+
+
+class SurveyCampaigns:
+    """Campañas de encuesta: ventana, audiencia, recordatorios a quienes no han respondido y tasas por cohorte"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+
+    @classmethod
+    def for_database(cls, db):
+        """Campañas compartidas por proceso, con envío programado de recordatorios"""
+        key = os.path.abspath(db.db_name)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                campaigns = cls(db)
+                scheduler.schedule(f"campanas:{key}", SURVEY_REMINDER_CHECK_SECONDS, campaigns.send_due_reminders)
+                cls._instances[key] = campaigns
+            return cls._instances[key]
+
+    def create(self, nombre, titulo, mensaje, fecha_inicio, fecha_fin, audience, recordatorio_dias=7):
+        """Registra la campaña; el primer aviso sale con la revisión programada (o al enviarlo manualmente)"""
+        with self.db.transaction() as tx:
+            tx.execute('''
+                INSERT INTO campanas_encuesta (nombre, titulo, mensaje, filtros, fecha_inicio, fecha_fin, recordatorio_dias)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (nombre, titulo, mensaje, json.dumps(audience.filters()), str(fecha_inicio), str(fecha_fin), int(recordatorio_dias)))
+            return tx.lastrowid
+
+    def list(self):
+        return self.db.execute_query('''
+            SELECT id, nombre, titulo, mensaje, filtros, fecha_inicio, fecha_fin, recordatorio_dias,
+                   ultimo_recordatorio, recordatorios_enviados, activa, fecha_creacion
+            FROM campanas_encuesta
+            ORDER BY fecha_inicio DESC, id DESC
+        ''')
+
+    def get(self, campana_id):
+        campanas = self.db.execute_query(
+            "SELECT * FROM campanas_encuesta WHERE id = ?",
+            (int(campana_id),)
+        )
+        return None if campanas.empty else campanas.iloc[0]
+
+    def close(self, campana_id):
+        self.db.execute_query("UPDATE campanas_encuesta SET activa = 0 WHERE id = ?", (int(campana_id),))
+
+    def audience(self, campana):
+        return Audience(self.db, **json.loads(campana['filtros']))
+
+    def _window_params(self, campana):
+        """Inicio y fin exclusivo de la ventana, comparables con fecha_actualizacion"""
+        fin = date.fromisoformat(str(campana['fecha_fin'])[:10]) + timedelta(days=1)
+        inicio = str(campana['fecha_inicio'])[:10]
+        return (inicio, fin.isoformat()) * 2
+
+    def send_reminders(self, campana_id):
+        """Avisa con un solo INSERT ... SELECT a quienes aún no responden; devuelve cuántos avisos se enviaron"""
+        campana = self.get(campana_id)
+        if campana is None:
+            return 0
+        sql, params = self.audience(campana).compile(
+            extra_conditions=[(f"NOT {RESPONDED_CONDITION}", self._window_params(campana))]
+        )
+        with self.db.transaction() as tx:
+            enviados = tx.execute(
+                f"INSERT INTO notificaciones (matricula, titulo, mensaje) SELECT ae.matricula, ?, ? {sql}",
+                (campana['titulo'], campana['mensaje']) + params
+            )
+            tx.execute('''
+                UPDATE campanas_encuesta
+                SET ultimo_recordatorio = ?, recordatorios_enviados = recordatorios_enviados + ?
+                WHERE id = ?
+            ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), enviados, int(campana_id)))
+        if enviados:
+            # Los destinatarios salen del INSERT ... SELECT: el canal los toma de las notificaciones nuevas
+            NotificationHub.for_database(self.db).poll()
+        return enviados
+
+    def send_due_reminders(self):
+        """Envía el aviso a las campañas vigentes cuyo último recordatorio tiene más de recordatorio_dias"""
+        hoy = date.today().isoformat()
+        ahora = datetime.now()
+        enviados = {}
+        campanas = self.list()
+        for _, campana in campanas.iterrows():
+            if not campana['activa'] or not (str(campana['fecha_inicio'])[:10] <= hoy <= str(campana['fecha_fin'])[:10]):
+                continue
+            ultimo = campana['ultimo_recordatorio']
+            if ultimo and ahora - datetime.fromisoformat(str(ultimo)) < timedelta(days=int(campana['recordatorio_dias'])):
+                continue
+            enviados[int(campana['id'])] = self.send_reminders(campana['id'])
+        return enviados
+
+    def response_rates(self, campana_id):
+        """Audiencia, respuestas y porcentaje de respuesta por año de egreso"""
+        campana = self.get(campana_id)
+        if campana is None:
+            return None
+        sql, params = self.audience(campana).compile()
+        return self.db.execute_query(f'''
+            SELECT ae.anio_egreso AS "Año de egreso",
+                   COUNT(*) AS "Audiencia",
+                   SUM(CASE WHEN {RESPONDED_CONDITION} THEN 1 ELSE 0 END) AS "Respuestas"
+            {sql}
+            GROUP BY ae.anio_egreso
+            ORDER BY ae.anio_egreso DESC
+        ''', self._window_params(campana) + params, query_class='listado')
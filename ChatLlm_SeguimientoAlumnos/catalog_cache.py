@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from database import ENCODED_COLUMNS
+
+# Intervalo mínimo entre revisiones del contador de versión de cada catálogo
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "2"))
+
+# Catálogo -> (tablas que lo invalidan, consulta que lo carga)
+CATALOG_QUERIES = {
+    'carreras': (
+        ('carreras',),
+        "SELECT id, nombre_carrera, activa, facultad FROM carreras ORDER BY nombre_carrera"
+    ),
+    'empresas': (
+        ('empresas',),
+        "SELECT id, nombre_empresa, activa FROM empresas ORDER BY nombre_empresa"
+    ),
+    'sectores_ofertas': (
+        ('ofertas_trabajo', 'empresas'),
+        '''
+            SELECT DISTINCT e.sector
+            FROM empresas e
+            JOIN ofertas_trabajo ot ON e.id = ot.empresa_id
+            WHERE ot.activa = 1 AND e.sector IS NOT NULL
+            ORDER BY e.sector
+        '''
+    ),
+    'codigos': (
+        ('codigos_catalogo',),
+        "SELECT id, dominio, etiqueta FROM codigos_catalogo"
+    )
+}
+
+# Columna de código -> dominio (nombre de la columna de texto que reemplaza)
+CODE_COLUMNS = {codigo: dominio for columnas in ENCODED_COLUMNS.values() for dominio, codigo in columnas.items()}
+
+
+class ReferenceCatalog:
+    """Tablas de referencia pequeñas en memoria, compartidas por todas las sesiones del proceso"""
+    _catalogs = {}
+    _catalogs_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.reloads = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        key = os.path.abspath(db.db_name)
+        with cls._catalogs_lock:
+            if key not in cls._catalogs:
+                cls._catalogs[key] = cls(db)
+            return cls._catalogs[key]
+
+    def _rows(self, name):
+        """Filas del catálogo; solo se recargan si cambió la versión de sus tablas"""
+        entry = self._entries.get(name)
+        if entry is None or time.monotonic() - entry['checked_at'] >= CATALOG_CHECK_SECONDS:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None or time.monotonic() - entry['checked_at'] >= CATALOG_CHECK_SECONDS:
+                    tablas, query = CATALOG_QUERIES[name]
+                    version = self.db.get_table_version(*tablas)
+                    if entry is None or entry['version'] != version or not self.db.engine.backend.supports_triggers:
+                        entry = {'version': version, 'rows': self.db.fetch_all(query)}
+                        self.reloads += 1
+                    entry['checked_at'] = time.monotonic()
+                    self._entries[name] = entry
+        return entry['rows']
+
+    def carreras_activas(self):
+        """Carreras activas como {nombre: id}"""
+        return {nombre: id_ for id_, nombre, activa, _ in self._rows('carreras') if activa}
+
+    def ids_carreras(self):
+        """Todas las carreras como {nombre: id}"""
+        return {nombre: id_ for id_, nombre, _, _ in self._rows('carreras')}
+
+    def nombres_carreras(self, solo_activas=False):
+        """Nombres de carreras en orden alfabético"""
+        return [nombre for _, nombre, activa, _ in self._rows('carreras') if activa or not solo_activas]
+
+    def facultades(self):
+        """Facultades con al menos una carrera registrada"""
+        return sorted({facultad for _, _, _, facultad in self._rows('carreras') if facultad})
+
+    def empresas_activas(self):
+        """Empresas activas como {nombre: id}"""
+        return {nombre: id_ for id_, nombre, activa in self._rows('empresas') if activa}
+
+    def sectores_ofertas(self):
+        """Sectores de las empresas con ofertas activas"""
+        return [sector for sector, in self._rows('sectores_ofertas')]
+
+    def etiquetas(self, dominio):
+        """Etiquetas de un dominio codificado como {código: etiqueta}"""
+        return {id_: etiqueta for id_, dom, etiqueta in self._rows('codigos') if dom == dominio}
+
+    def codigo(self, dominio, etiqueta):
+        """Código entero de una etiqueta (se registra si es nueva)"""
+        if etiqueta is None or etiqueta == '':
+            return None
+        for id_, dom, valor in self._rows('codigos'):
+            if dom == dominio and valor == etiqueta:
+                return id_
+        codigo = self.db.encode_label(dominio, etiqueta)
+        # Etiqueta nueva: la siguiente lectura recarga el diccionario sin esperar la revisión de versión
+        self._entries.pop('codigos', None)
+        return codigo
+
+    def decode(self, frame):
+        """Agrega al DataFrame las etiquetas de sus columnas codificadas, con el nombre de columna original"""
+        for columna, dominio in CODE_COLUMNS.items():
+            if columna in frame.columns:
+                etiquetas = frame[columna].map(self.etiquetas(dominio))
+                if dominio in frame.columns:
+                    # Base aún en migración: las filas sin código conservan su etiqueta de texto
+                    etiquetas = etiquetas.fillna(frame[dominio])
+                frame[dominio] = etiquetas
+        return frame
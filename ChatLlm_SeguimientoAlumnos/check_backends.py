@@ -0,0 +1,263 @@
+"""Prueba de humo de cada motor de almacenamiento contra una base nueva.
+
+Prepara el esquema (init_database), recorre las rutas principales de lectura y escritura
+(autenticación, egresados, situaciones, ofertas, notificaciones, campañas, sesiones, búsquedas,
+agregaciones, borrado en cascada) y después dibuja cada página de la aplicación con
+streamlit.testing, reportando cualquier excepción.
+
+Motores de prueba locales:
+    sqlite    archivo temporal
+    libsql    archivo temporal con libsql-experimental (sin LIBSQL_SYNC_URL)
+    postgres  servidor de DATABASE_URL, p. ej.
+              docker run --rm -e POSTGRES_HOST_AUTH_METHOD=trust -p 5432:5432 postgres:16
+              DATABASE_URL=postgresql://postgres@localhost/postgres
+              (todo se crea en el esquema check_backends, que se borra al empezar)
+
+Uso:
+    python check_backends.py                       # sqlite
+    python check_backends.py --backend postgres
+    python check_backends.py --backend todos       # cada motor en su propio proceso
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ('sqlite', 'libsql', 'postgres')
+PG_SCHEMA = "check_backends"
+
+ADMIN_PAGES = [
+    "📊 Dashboard Principal", "👨‍🎓 Gestión de Alumnos Egresados", "🔍 Búsqueda de Alumnos", "🔎 Búsqueda Global",
+    "📝 Registro de Nuevos Egresados", "🎓 Gestión de Carreras", "🏢 Gestión de Empresas",
+    "💼 Gestión de Ofertas de Trabajo", "📧 Gestión de Notificaciones", "📋 Campañas de Encuesta", "👥 Gestión de Usuarios"
+]
+STUDENT_PAGES = [
+    "📊 Mi Dashboard", "👤 Mi Perfil", "🎓 Situación Académica", "💼 Situación Laboral",
+    "📧 Mis Notificaciones", "💼 Ofertas de Trabajo", "🔐 Cambiar Contraseña"
+]
+
+MATRICULAS = ['CHK001', 'CHK002', 'CHK003']
+
+
+def prepare_postgres():
+    """Esquema propio y vacío; las conexiones de la aplicación lo usan por PGOPTIONS"""
+    import psycopg2
+    conn = psycopg2.connect(os.getenv("DATABASE_URL", "postgresql://localhost/nova_universitas"))
+    conn.autocommit = True
+    conn.cursor().execute(f"DROP SCHEMA IF EXISTS {PG_SCHEMA} CASCADE; CREATE SCHEMA {PG_SCHEMA}")
+    conn.close()
+    os.environ["PGOPTIONS"] = f"-c search_path={PG_SCHEMA}"
+
+
+def seed(db):
+    """Escrituras principales: carrera, usuarios y egresados, empresa y oferta"""
+    with db.transaction() as tx:
+        tx.execute("INSERT INTO carreras (nombre_carrera, facultad, duracion_semestres) VALUES (?, ?, ?)",
+                   ("Ingeniería de Prueba", "Ingeniería", 9))
+        carrera_id = tx.fetch_one("SELECT id FROM carreras WHERE nombre_carrera = ?", ("Ingeniería de Prueba",))[0]
+        for i, matricula in enumerate(MATRICULAS):
+            tx.execute('''
+                INSERT INTO usuarios (matricula, password, tipo_usuario, nombre, apellidos, email)
+                VALUES (?, ?, 'alumno', ?, 'Prueba', ?)
+            ''', (matricula, db.hash_password("clave123"), f"Alumno{i}", f"{matricula.lower()}@prueba.mx"))
+            tx.execute('''
+                INSERT INTO alumnos_egresados (matricula, nombre, apellidos, carrera_id, fecha_egreso, promedio, titulo_obtenido)
+                VALUES (?, ?, 'Prueba', ?, ?, ?, ?)
+            ''', (matricula, f"Alumno{i}", carrera_id, f"{2021 + i}-06-30", 8.5 + i / 2, i % 2))
+        tx.execute("INSERT INTO empresas (nombre_empresa, sector) VALUES (?, ?)", ("Empresa de Prueba S.A. de C.V.", "Tecnología"))
+        empresa_id = tx.fetch_one("SELECT id FROM empresas WHERE nombre_empresa = ?", ("Empresa de Prueba S.A. de C.V.",))[0]
+        tx.execute('''
+            INSERT INTO ofertas_trabajo (empresa_id, titulo_puesto, descripcion, modalidad, fecha_vencimiento)
+            VALUES (?, 'Desarrollador', 'Oferta de prueba', 'remoto', ?)
+        ''', (empresa_id, (date.today() + timedelta(days=30)).isoformat()))
+    return db.fetch_one("SELECT anio_egreso FROM alumnos_egresados WHERE matricula = ?", (MATRICULAS[0],))[0] == 2021
+
+
+def check_auth(db):
+    return db.authenticate_user("ADMIN001", "admin123") is not None and db.authenticate_user(MATRICULAS[0], "clave123") is not None
+
+
+def check_situations(db):
+    from campaigns import SubmissionWriter
+    writer = SubmissionWriter.for_database(db)
+    writer.submit('laboral', (MATRICULAS[0], 1, 'Empresa de Prueba', 'Analista', 'Tecnología', '$10,000 - $20,000', 2, '2022-01-01', 1))
+    writer.submit('academica', (MATRICULAS[1], 1, 'Universidad de Prueba', 'maestria', 'Maestría', '2022-08-01', '2024-06-30'))
+    from catalog_cache import ReferenceCatalog
+    laboral = ReferenceCatalog.for_database(db).decode(db.execute_query("SELECT * FROM situacion_laboral"))
+    return list(laboral['sector']) == ['Tecnología']
+
+
+def check_offers(db):
+    from offer_feed import OfferFeed
+    feed = OfferFeed.for_database(db)
+    nuevas = feed.new_offer_ids(MATRICULAS[0])
+    feed.mark_seen(MATRICULAS[0])
+    return len(feed.get_offers()) == 1 and len(nuevas) == 1 and not feed.new_offer_ids(MATRICULAS[0])
+
+
+def check_notifications(db):
+    from notification_hub import NotificationHub
+    from recipient_sets import RecipientSets
+    RecipientSets.for_database(db).send(MATRICULAS, "Aviso", "Mensaje de prueba")
+    no_leidas, _ = db.get_notification_counter(MATRICULAS[0])
+    ids = [id_ for id_, in db.fetch_all("SELECT id FROM notificaciones WHERE matricula = ?", (MATRICULAS[0],))]
+    affected, _, _ = db.apply_notification_action(MATRICULAS[0], ids, 'leer')
+    nuevas = NotificationHub.for_database(db).new_notifications(MATRICULAS[1], 0)
+    return no_leidas == 1 and affected == 1 and db.get_notification_counter(MATRICULAS[0])[0] == 0 and len(nuevas) == 1
+
+
+def check_campaigns(db):
+    from audience import Audience
+    from campaigns import SurveyCampaigns
+    campaigns = SurveyCampaigns.for_database(db)
+    audience = Audience(db, anio_desde=2021)
+    campana_id = campaigns.create("Prueba", "Encuesta", "Actualiza tus datos", date.today() - timedelta(days=1),
+                                  date.today() + timedelta(days=10), audience)
+    enviados = campaigns.send_reminders(campana_id)
+    rates = campaigns.response_rates(campana_id)
+    # Los dos primeros ya registraron su situación: solo el tercero recibe recordatorio
+    return audience.count() == len(MATRICULAS) and enviados == 1 and len(list(audience.iter_rows())) == len(MATRICULAS) and rates is not None
+
+
+def check_sessions(db):
+    from session_store import SessionManager
+    sessions = SessionManager.for_database(db)
+    token = sessions.create({'matricula': MATRICULAS[0], 'tipo_usuario': 'alumno', 'nombre': 'A', 'apellidos': 'P'})
+    ok = sessions.resolve(token)['matricula'] == MATRICULAS[0]
+    # El token solo vale desde el cliente al que se emitió
+    ok = ok and sessions.resolve(token, "otro cliente") is None
+    sessions.revoke(token)
+    return ok and sessions.resolve(token) is None
+
+
+def check_search(db):
+    from search_index import MatriculaIndex, SearchIndex
+    search = SearchIndex.for_database(db)
+    search.sync()
+    return bool(search.search("Alumno1")) and bool(MatriculaIndex.for_database(db).suggest("CHK"))
+
+
+def check_aggregates(db):
+    from analytics_cache import AnalyticsCache
+    from employer_index import EmployerNormalizer
+    from trend_rollup import TrendRollup
+    analytics = AnalyticsCache.for_database(db)
+    career = analytics.career_stats()
+    analytics.cohort_stats()
+    TrendRollup.for_database(db).run()
+    TrendRollup.for_database(db).series('laboral')
+    employers = EmployerNormalizer.for_database(db)
+    employers.run()
+    return not career.empty and not employers.top_employers().empty
+
+
+def check_delete(db):
+    db.delete_graduates([MATRICULAS[2]])
+    restantes = db.fetch_one("SELECT COUNT(*) FROM notificaciones WHERE matricula = ?", (MATRICULAS[2],))[0]
+    return restantes == 0 and db.fetch_one("SELECT COUNT(*) FROM usuarios WHERE matricula = ?", (MATRICULAS[2],))[0] == 0
+
+
+CHECKS = [
+    ("autenticación", check_auth),
+    ("situaciones (group commit y códigos)", check_situations),
+    ("feed de ofertas", check_offers),
+    ("notificaciones", check_notifications),
+    ("campañas y audiencias", check_campaigns),
+    ("sesiones", check_sessions),
+    ("búsquedas", check_search),
+    ("agregaciones", check_aggregates),
+    ("borrado en cascada", check_delete),
+]
+
+
+def render_pages(workdir):
+    """Dibuja cada página como administrador y como alumno; devuelve [(página, error)]"""
+    from streamlit.testing.v1 import AppTest
+    from database import DatabaseManager
+    from session_store import SessionManager
+    sessions = SessionManager.for_database(DatabaseManager())
+    results = []
+
+    def run(user, page=None, student_page=None):
+        at = AppTest.from_file(os.path.join(workdir, "app.py"), default_timeout=60)
+        at.query_params['sesion'] = sessions.create(user)
+        if student_page:
+            at.session_state['student_menu_selection'] = student_page
+        at.run()
+        if page:
+            at.sidebar.selectbox[0].select(page).run()
+        return [e.value for e in at.exception]
+
+    admin = {'matricula': 'ADMIN001', 'tipo_usuario': 'admin', 'nombre': 'S', 'apellidos': 'E'}
+    alumno = {'matricula': MATRICULAS[0], 'tipo_usuario': 'alumno', 'nombre': 'Alumno0', 'apellidos': 'Prueba'}
+    for page in ADMIN_PAGES:
+        results.append((f"admin {page}", run(admin, page=page)))
+    for page in STUDENT_PAGES:
+        results.append((f"alumno {page}", run(alumno, student_page=page)))
+    return results
+
+
+def run_backend(backend, pages):
+    """Ejecuta las pruebas con un motor en una carpeta temporal; devuelve el número de fallas"""
+    os.environ["DB_BACKEND"] = backend
+    # Cada prueba lee lo que acaba de escribir: sin réplica con desfase
+    os.environ["DB_STALENESS_LISTADO"] = "0"
+    os.environ["DB_STALENESS_ANALITICA"] = "0"
+    workdir = tempfile.mkdtemp(prefix=f"check_{backend}_")
+    for nombre in os.listdir(APP_DIR):
+        if nombre.endswith(".py"):
+            shutil.copy(os.path.join(APP_DIR, nombre), workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    fallas = 0
+    try:
+        if backend == 'postgres':
+            prepare_postgres()
+        start = time.perf_counter()
+        from database import DatabaseManager
+        db = DatabaseManager()
+        print(f"[{backend}] init_database en {time.perf_counter() - start:.2f} s")
+        for nombre, check in [("datos iniciales", seed)] + CHECKS:
+            try:
+                ok = check(db)
+                detalle = "" if ok else "resultado inesperado"
+            except Exception as e:
+                ok, detalle = False, f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+            fallas += not ok
+            print(f"[{backend}] {'ok   ' if ok else 'FALLA'} {nombre} {detalle}")
+        if pages:
+            for pagina, errores in render_pages(workdir):
+                fallas += bool(errores)
+                print(f"[{backend}] {'FALLA' if errores else 'ok   '} {pagina} {errores[0][:200] if errores else ''}")
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"[{backend}] {'sin fallas' if not fallas else f'{fallas} fallas'}")
+    return fallas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de humo de los motores de almacenamiento")
+    parser.add_argument("--backend", default="sqlite", choices=BACKENDS + ('todos',))
+    parser.add_argument("--sin-paginas", action="store_true", help="omitir el dibujo de las páginas de Streamlit")
+    args = parser.parse_args()
+
+    if args.backend == 'todos':
+        # Cada motor en un proceso nuevo: DB_BACKEND se lee al importar db_backends
+        codigos = [
+            subprocess.run([sys.executable, __file__, "--backend", backend] + (["--sin-paginas"] if args.sin_paginas else [])).returncode
+            for backend in BACKENDS
+        ]
+        sys.exit(1 if any(codigos) else 0)
+    sys.exit(1 if run_backend(args.backend, not args.sin_paginas) else 0)
+
+
+if __name__ == "__main__":
+    main()
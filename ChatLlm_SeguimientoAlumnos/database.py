@@ -1,160 +1,693 @@
-import sqlite3
+import os
+import queue
+import threading
+import time
 import bcrypt
+import logging
+from contextlib import contextmanager
 from datetime import datetime
-import pandas as pd
+import scheduler
+from db_backends import READ_POOL_SIZE, WAL_AUTOCHECKPOINT, create_backend
+
+logger = logging.getLogger(__name__)
+
+# Desfase máximo (segundos) tolerado por cada clase de consulta; 0 = siempre el primario
+QUERY_CLASSES = {
+    'transaccional': 0,
+    'listado': int(os.getenv("DB_STALENESS_LISTADO", "60")),
+    'analitica': int(os.getenv("DB_STALENESS_ANALITICA", "300"))
+}
+SNAPSHOT_REFRESH_SECONDS = int(os.getenv("DB_SNAPSHOT_REFRESH_SECONDS", "60"))
+
+# Tablas cuyo número de versión se incrementa con cada cambio (invalidación de cachés)
+VERSIONED_TABLES = ['ofertas_trabajo', 'empresas', 'carreras', 'usuarios', 'alumnos_egresados', 'empleadores', 'codigos_catalogo']
+
+# Año de egreso derivado de fecha_egreso, para filtrar por índice en lugar de strftime
+# (SQLite solo permite agregar con ALTER TABLE columnas generadas VIRTUAL, no STORED)
+ANIO_EGRESO_COLUMN = "INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y', fecha_egreso) AS INTEGER)) VIRTUAL"
+
+# Etiquetas repetidas en cada registro de situación, guardadas como código entero de codigos_catalogo
+# (tabla -> columna de texto original -> columna con el código; el dominio es el nombre de la columna)
+ENCODED_COLUMNS = {
+    'situacion_laboral': {'sector': 'sector_id', 'salario_rango': 'salario_rango_id'},
+    'situacion_academica': {'tipo_estudios': 'tipo_estudios_id'}
+}
+
+# Etiquetas conocidas de cada dominio (en este orden reciben sus códigos)
+ENUM_LABELS = {
+    'tipo_estudios': ['maestria', 'doctorado', 'especialidad', 'diplomado', 'otro'],
+    'sector': [
+        "Tecnología", "Salud", "Educación", "Finanzas", "Manufactura",
+        "Servicios", "Gobierno", "Construcción", "Comercio", "Otro"
+    ],
+    'salario_rango': [
+        "Menos de $10,000", "$10,000 - $20,000", "$20,000 - $30,000",
+        "$30,000 - $50,000", "$50,000 - $75,000", "Más de $75,000"
+    ]
+}
+# Dominios que no aceptan etiquetas nuevas (antes restringidos con CHECK)
+CLOSED_DOMAINS = {'tipo_estudios'}
+
+# Empleador reservado para los registros cuyo nombre no deja clave (solo puntuación o razón social):
+# quedan marcados con él y la normalización no los vuelve a leer como pendientes
+UNRESOLVED_EMPLOYER_ID = 0
+UNRESOLVED_EMPLOYER_NAME = "(sin nombre reconocible)"
+
+
+# Definición de las tablas (en orden de creación por sus llaves foráneas)
+TABLE_DEFINITIONS = {
+    # Tabla de usuarios (servicios escolares y alumnos)
+    'usuarios': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        matricula TEXT UNIQUE,
+        password BLOB NOT NULL,
+        tipo_usuario TEXT NOT NULL CHECK (tipo_usuario IN ('admin', 'alumno')),
+        nombre TEXT NOT NULL,
+        apellidos TEXT NOT NULL,
+        email TEXT,
+        telefono TEXT,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activo BOOLEAN DEFAULT 1
+    ''',
+    # Tabla de carreras
+    'carreras': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_carrera TEXT NOT NULL UNIQUE,
+        facultad TEXT NOT NULL,
+        duracion_semestres INTEGER,
+        activa BOOLEAN DEFAULT 1
+    ''',
+    # Diccionario de etiquetas: código entero por (dominio, etiqueta)
+    'codigos_catalogo': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dominio TEXT NOT NULL,
+        etiqueta TEXT NOT NULL,
+        UNIQUE (dominio, etiqueta)
+    ''',
+    # Tabla de empresas/bolsas de trabajo
+    'empresas': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_empresa TEXT NOT NULL,
+        sector TEXT,
+        descripcion TEXT,
+        email_contacto TEXT,
+        telefono TEXT,
+        sitio_web TEXT,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activa BOOLEAN DEFAULT 1
+    ''',
+    # Empleadores normalizados a partir del texto libre de situacion_laboral.empresa
+    'empleadores': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        sector TEXT,
+        empresa_id INTEGER,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (empresa_id) REFERENCES empresas (id) ON DELETE SET NULL
+    ''',
+    # Variantes escritas por los alumnos (clave normalizada) y el empleador al que corresponden
+    'empleadores_alias': '''
+        clave TEXT PRIMARY KEY,
+        empleador_id INTEGER NOT NULL,
+        FOREIGN KEY (empleador_id) REFERENCES empleadores (id) ON DELETE CASCADE
+    ''',
+    # Tabla de alumnos egresados
+    'alumnos_egresados': f'''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        matricula TEXT UNIQUE NOT NULL,
+        nombre TEXT NOT NULL,
+        apellidos TEXT NOT NULL,
+        email TEXT,
+        telefono TEXT,
+        carrera_id INTEGER,
+        fecha_ingreso DATE,
+        fecha_egreso DATE NOT NULL,
+        promedio REAL,
+        cedula_profesional TEXT,
+        titulo_obtenido BOOLEAN DEFAULT 0,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        anio_egreso {ANIO_EGRESO_COLUMN},
+        FOREIGN KEY (carrera_id) REFERENCES carreras (id),
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE
+    ''',
+    # Tabla de situación académica actual
+    'situacion_academica': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        matricula TEXT NOT NULL,
+        estudia_actualmente BOOLEAN NOT NULL,
+        institucion_actual TEXT,
+        tipo_estudios_id INTEGER,
+        nombre_programa TEXT,
+        fecha_inicio DATE,
+        fecha_fin_estimada DATE,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE,
+        FOREIGN KEY (tipo_estudios_id) REFERENCES codigos_catalogo (id)
+    ''',
+    # Tabla de situación laboral
+    'situacion_laboral': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        matricula TEXT NOT NULL,
+        trabaja_actualmente BOOLEAN NOT NULL,
+        empresa TEXT,
+        cargo TEXT,
+        sector_id INTEGER,
+        salario_rango_id INTEGER,
+        anos_experiencia INTEGER,
+        fecha_inicio_trabajo DATE,
+        relacionado_carrera BOOLEAN,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        empleador_id INTEGER,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE,
+        FOREIGN KEY (empleador_id) REFERENCES empleadores (id) ON DELETE SET NULL,
+        FOREIGN KEY (sector_id) REFERENCES codigos_catalogo (id),
+        FOREIGN KEY (salario_rango_id) REFERENCES codigos_catalogo (id)
+    ''',
+    # Tabla de ofertas de trabajo
+    'ofertas_trabajo': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        empresa_id INTEGER,
+        titulo_puesto TEXT NOT NULL,
+        descripcion TEXT,
+        requisitos TEXT,
+        salario_ofrecido TEXT,
+        modalidad TEXT CHECK (modalidad IN ('presencial', 'remoto', 'hibrido')),
+        ubicacion TEXT,
+        fecha_publicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_vencimiento DATE,
+        activa BOOLEAN DEFAULT 1,
+        FOREIGN KEY (empresa_id) REFERENCES empresas (id)
+    ''',
+    # Tabla de notificaciones
+    'notificaciones': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        matricula TEXT,
+        oferta_id INTEGER,
+        titulo TEXT NOT NULL,
+        mensaje TEXT NOT NULL,
+        leida BOOLEAN DEFAULT 0,
+        fecha_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        archivada BOOLEAN DEFAULT 0,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE,
+        FOREIGN KEY (oferta_id) REFERENCES ofertas_trabajo (id)
+    ''',
+    # Contadores de versión por tabla para invalidar cachés compartidas
+    'versiones_tablas': '''
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ''',
+    # Última oferta vista por cada alumno (cursor del feed de ofertas)
+    'ofertas_vistas': '''
+        matricula TEXT PRIMARY KEY,
+        ultima_fecha TIMESTAMP,
+        ultimo_id INTEGER,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE
+    ''',
+    # Notificaciones no leídas por alumno, mantenido por triggers sobre notificaciones
+    'contadores_notificaciones': '''
+        matricula TEXT PRIMARY KEY,
+        no_leidas INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE
+    ''',
+    # Campañas de encuesta para actualizar la situación de los egresados
+    'campanas_encuesta': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        titulo TEXT NOT NULL,
+        mensaje TEXT NOT NULL,
+        filtros TEXT NOT NULL DEFAULT '{}',
+        fecha_inicio DATE NOT NULL,
+        fecha_fin DATE NOT NULL,
+        recordatorio_dias INTEGER NOT NULL DEFAULT 7,
+        ultimo_recordatorio TIMESTAMP,
+        recordatorios_enviados INTEGER NOT NULL DEFAULT 0,
+        activa BOOLEAN DEFAULT 1,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ''',
+    # Último id procesado por cada agregación incremental
+    'marcas_agregacion': '''
+        proceso TEXT PRIMARY KEY,
+        ultimo_id INTEGER NOT NULL DEFAULT 0,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ''',
+    # Situación vigente de cada egresado según la agregación de tendencias (y dónde se contó)
+    'estados_vigentes': '''
+        matricula TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        estado INTEGER NOT NULL,
+        carrera_id INTEGER NOT NULL,
+        anio_egreso INTEGER NOT NULL,
+        PRIMARY KEY (matricula, dimension)
+    ''',
+    # Cambios netos de egresados por mes, carrera, cohorte y situación (la suma acumulada da la serie)
+    'tendencias_mensuales': '''
+        periodo TEXT NOT NULL,
+        carrera_id INTEGER NOT NULL,
+        anio_egreso INTEGER NOT NULL,
+        dimension TEXT NOT NULL,
+        estado INTEGER NOT NULL,
+        cambio INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, carrera_id, anio_egreso, estado, periodo)
+    ''',
+    # Sesiones iniciadas, compartidas por todos los procesos de la aplicación
+    'sesiones': '''
+        id TEXT PRIMARY KEY,
+        matricula TEXT NOT NULL,
+        datos TEXT NOT NULL,
+        expira INTEGER NOT NULL,
+        FOREIGN KEY (matricula) REFERENCES usuarios (matricula) ON DELETE CASCADE
+    ''',
+    # Migraciones aplicadas en segundo plano (migrations.py): paso actual y último id procesado
+    'schema_migrations': '''
+        version INTEGER PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        paso INTEGER NOT NULL DEFAULT 0,
+        progreso INTEGER,
+        intentos INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        fecha_inicio TIMESTAMP,
+        fecha_fin TIMESTAMP
+    '''
+}
+
+# Columnas agregadas después de la creación original de las tablas (ALTER TABLE en bases existentes)
+ADDED_COLUMNS = {
+    'alumnos_egresados': {'anio_egreso': ANIO_EGRESO_COLUMN},
+    'notificaciones': {'archivada': 'BOOLEAN DEFAULT 0'},
+    'situacion_laboral': {
+        'empleador_id': 'INTEGER REFERENCES empleadores (id) ON DELETE SET NULL',
+        'sector_id': 'INTEGER REFERENCES codigos_catalogo (id)',
+        'salario_rango_id': 'INTEGER REFERENCES codigos_catalogo (id)'
+    },
+    'situacion_academica': {'tipo_estudios_id': 'INTEGER REFERENCES codigos_catalogo (id)'},
+    'schema_migrations': {'intentos': 'INTEGER NOT NULL DEFAULT 0', 'error': 'TEXT'}
+}
+
+# Acciones en bloque sobre notificaciones propias: una sola sentencia por lote de ids
+NOTIFICATION_ACTIONS = {
+    'leer': "UPDATE notificaciones SET leida = 1 WHERE matricula = ? AND leida = 0 AND id IN ({ids})",
+    'archivar': "UPDATE notificaciones SET leida = 1, archivada = 1 WHERE matricula = ? AND archivada = 0 AND id IN ({ids})",
+    'eliminar': "DELETE FROM notificaciones WHERE matricula = ? AND id IN ({ids})"
+}
+# Ids por sentencia (por debajo del límite de parámetros de SQLite)
+NOTIFICATION_ACTION_BATCH = 500
+
+# Índices secundarios
+INDEX_DEFINITIONS = {
+    # Feed de ofertas activas ordenado por publicación
+    'idx_ofertas_activas_fecha': "ofertas_trabajo (activa, fecha_publicacion, id)",
+    # Notificaciones de un alumno por estado y fecha
+    'idx_notificaciones_matricula': "notificaciones (matricula, leida, fecha_envio)",
+    # Destinatarios por año de egreso y por carrera (cubren la matrícula)
+    'idx_egresados_anio': "alumnos_egresados (anio_egreso, matricula)",
+    'idx_egresados_carrera': "alumnos_egresados (carrera_id, matricula)",
+    # Último registro de situación de cada egresado (MAX(id) por matrícula)
+    'idx_situacion_laboral_matricula': "situacion_laboral (matricula, id)",
+    'idx_situacion_academica_matricula': "situacion_academica (matricula, id)",
+    # Egresados por empleador y registros aún sin normalizar (empleador_id IS NULL)
+    'idx_situacion_laboral_empleador': "situacion_laboral (empleador_id)",
+    'idx_empleadores_alias_empleador': "empleadores_alias (empleador_id)",
+    # Depuración de sesiones vencidas y cierre de las sesiones de un usuario
+    'idx_sesiones_expira': "sesiones (expira)",
+    'idx_sesiones_matricula': "sesiones (matricula)"
+}
+
+
+class WriterConnection:
+    """Conexión única de escritura; los escritores esperan su turno en un candado"""
+    def __init__(self, backend):
+        self.backend = backend
+        self.conn = backend.connect_writer()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.writes = 0
+        self.commits = 0
+        self.lock_wait_total = 0.0
+        self.lock_wait_max = 0.0
+
+    @contextmanager
+    def acquire(self):
+        """Obtiene la conexión de escritura registrando la espera en la cola"""
+        with self._stats_lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        start = time.perf_counter()
+        self._lock.acquire()
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.pending -= 1
+            self.writes += 1
+            self.lock_wait_total += waited
+            self.lock_wait_max = max(self.lock_wait_max, waited)
+        try:
+            yield self.conn
+        finally:
+            self._lock.release()
+
+    def commit(self):
+        """Confirma la transacción en curso de la conexión de escritura"""
+        self.conn.commit()
+        with self._stats_lock:
+            self.commits += 1
+
+
+class ReaderPool:
+    """Pool de conexiones de solo lectura (réplica local o archivo en modo WAL)"""
+    def __init__(self, backend, size):
+        self.backend = backend
+        self.size = size
+        self.created = 0
+        self.waits = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión de lectura y la devuelve al pool al terminar"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self.created < self.size
+                if can_create:
+                    self.created += 1
+            if can_create:
+                conn = self.backend.connect_reader()
+            else:
+                with self._lock:
+                    self.waits += 1
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+class UnitOfWork:
+    """Varias sentencias sobre la conexión de escritura, confirmadas con un único commit"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.statements = 0
+        self._last_cursor = None
+
+    def execute(self, query, params=None):
+        """Ejecuta una sentencia dentro de la transacción y devuelve las filas afectadas"""
+        cursor = self.conn.execute(query, params)
+        self.statements += 1
+        self._last_cursor = cursor
+        return cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        """Id generado por el último INSERT de execute (se consulta solo si se pide)"""
+        return self._last_cursor.lastrowid if self._last_cursor is not None else None
+
+    def executemany(self, query, seq_of_params):
+        """Ejecuta la misma sentencia para cada juego de parámetros"""
+        cursor = self.conn.executemany(query, seq_of_params)
+        self.statements += 1
+        return cursor.rowcount
+
+    def fetch_one(self, query, params=None):
+        """Lectura dentro de la transacción (ve los cambios aún no confirmados)"""
+        return self.conn.execute(query, params).fetchone()
+
+
+class SnapshotReplica:
+    """Copia de solo lectura del primario para consultas analíticas y listados"""
+    def __init__(self, engine):
+        root, ext = os.path.splitext(engine.backend.db_name)
+        self.engine = engine
+        # Un solo archivo compartido por todos los procesos: cada uno lo reescribe en su lugar con la
+        # API de backup (se turnan con el candado del archivo) y sus lectores ven la versión confirmada
+        self.path = f"{root}.snapshot{ext or '.db'}"
+        self.readers = None
+        self.refreshed_at = 0.0
+        self.last_read_at = 0.0
+        self.refreshes = 0
+        self.skipped = 0
+        self.data_version = None
+        # Conexión propia para PRAGMA data_version (el valor es relativo a cada conexión)
+        self._monitor = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def age(self):
+        """Segundos transcurridos desde la última actualización"""
+        return time.time() - self.refreshed_at if self.readers else float('inf')
+
+    def _changed(self):
+        """El primario recibió escrituras desde la última copia (siempre True si el motor no lo puede saber)"""
+        if self._monitor is None:
+            self._monitor = self.engine.backend.connect_reader()
+        version = self.engine.backend.data_version(self._monitor)
+        changed = version is None or version != self.data_version
+        self.data_version = version
+        return changed
+
+    def refresh(self, max_staleness=None):
+        """Actualiza la copia (backup de SQLite o sincronización de la réplica libsql) si el primario cambió"""
+        with self._lock:
+            if max_staleness is not None and self.age() <= max_staleness:
+                return
+            # La versión se lee antes de copiar: lo que se confirme durante la copia provoca la siguiente
+            if not self._changed() and self.readers is not None:
+                self.refreshed_at = time.time()
+                self.skipped += 1
+                return
+            backend = self.engine.backend
+            snapshot_backend = backend.create_snapshot(self.path)
+            if snapshot_backend is None:
+                with self.engine.writer.acquire() as conn:
+                    backend.sync(conn)
+                self.readers = self.engine.readers
+            elif self.readers is None:
+                # La copia se actualiza en su lugar: el pool se crea una sola vez
+                self.readers = ReaderPool(snapshot_backend, READ_POOL_SIZE)
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+
+    def maintain(self):
+        """Tarea programada: solo actualiza la réplica si alguien la leyó desde la última copia"""
+        if self.last_read_at > self.refreshed_at:
+            self.refresh()
+
+    def _refresh_in_background(self):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._background_refresh, name=f"replica-{self.path}", daemon=True)
+            self._thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Error al actualizar la réplica %s", self.path)
+
+    def readers_for(self, max_staleness):
+        """Pool de lectura que cumple el desfase máximo indicado"""
+        self.last_read_at = time.time()
+        if self.age() > max_staleness:
+            # La copia se actualiza en segundo plano; mientras tanto la consulta va al primario
+            self._refresh_in_background()
+            return self.engine.readers
+        return self.readers
+
+
+class StorageEngine:
+    """Un escritor y un pool de lectores compartidos por todos los managers del proceso"""
+    _engines = {}
+    _engines_lock = threading.Lock()
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.writer = WriterConnection(backend)
+        self.readers = ReaderPool(backend, READ_POOL_SIZE)
+        self.replica = SnapshotReplica(self)
+        self.schema_ready = False
+        self.schema_lock = threading.Lock()
+
+    def start_replica_refresh(self):
+        """Programa la actualización periódica de la réplica de lectura"""
+        scheduler.schedule(f"replica:{self.replica.path}", SNAPSHOT_REFRESH_SECONDS, self.replica.maintain)
+
+    @classmethod
+    def for_database(cls, db_name, backend_name=None):
+        backend = create_backend(db_name, backend_name)
+        key = (backend.name, os.path.abspath(db_name))
+        with cls._engines_lock:
+            if key not in cls._engines:
+                engine = cls(backend)
+                engine.start_replica_refresh()
+                cls._engines[key] = engine
+            return cls._engines[key]
+
 
 class DatabaseManager:
-    def __init__(self, db_name="nova_universitas.db"):
+    def __init__(self, db_name="nova_universitas.db", backend=None):
         self.db_name = db_name
-        self.init_database()
+        self.engine = StorageEngine.for_database(db_name, backend)
+        # El esquema se prepara una vez por proceso, no en cada manager
+        with self.engine.schema_lock:
+            if not self.engine.schema_ready:
+                self.init_database()
+                self.engine.schema_ready = True
     
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        """Conexión nueva e independiente del pool (uso puntual)"""
+        return self.engine.backend.connect_writer()
+    
+    @contextmanager
+    def write_connection(self):
+        """Conexión de escritura única; confirma al final o revierte si hay error"""
+        with self.engine.writer.acquire() as conn:
+            try:
+                yield conn
+                self.engine.writer.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self.engine.backend.sync(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """Unidad de trabajo: todo se confirma en un solo commit o se revierte completo"""
+        with self.write_connection() as conn:
+            yield UnitOfWork(conn)
+    
+    @contextmanager
+    def read_connection(self, query_class='transaccional'):
+        """Conexión de solo lectura; las clases con desfase tolerado van a la réplica"""
+        if query_class not in QUERY_CLASSES:
+            raise ValueError(f"Clase de consulta desconocida: {query_class}")
+        max_staleness = QUERY_CLASSES[query_class]
+        pool = self.engine.replica.readers_for(max_staleness) if max_staleness else self.engine.readers
+        with pool.connection() as conn:
+            yield conn
     
     def init_database(self):
         """Inicializa todas las tablas de la base de datos"""
-        conn = self.get_connection()
+        with self.write_connection() as conn:
+            # Con varios procesos, el primero prepara el esquema y los demás esperan su turno
+            self.engine.backend.lock_schema(conn)
+            self._create_tables(conn)
+            # Crear usuario administrador por defecto
+            self.create_default_admin(conn)
+    
+    def _create_tables(self, conn):
+        """Crea las tablas si no existen"""
         cursor = conn.cursor()
         
-        # Tabla de usuarios (servicios escolares y alumnos)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricula TEXT UNIQUE,
-                password TEXT NOT NULL,
-                tipo_usuario TEXT NOT NULL CHECK (tipo_usuario IN ('admin', 'alumno')),
-                nombre TEXT NOT NULL,
-                apellidos TEXT NOT NULL,
-                email TEXT,
-                telefono TEXT,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                activo BOOLEAN DEFAULT 1
-            )
-        ''')
+        for tabla, columnas in TABLE_DEFINITIONS.items():
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {tabla} ({columnas})")
         
-        # Tabla de carreras
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS carreras (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_carrera TEXT NOT NULL UNIQUE,
-                facultad TEXT NOT NULL,
-                duracion_semestres INTEGER,
-                activa BOOLEAN DEFAULT 1
-            )
-        ''')
+        for tabla, columnas in ADDED_COLUMNS.items():
+            existentes = {description[0] for description in cursor.execute(f"SELECT * FROM {tabla} LIMIT 0").description}
+            for columna, definicion in columnas.items():
+                if columna not in existentes:
+                    cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
         
-        # Tabla de alumnos egresados
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alumnos_egresados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricula TEXT UNIQUE NOT NULL,
-                nombre TEXT NOT NULL,
-                apellidos TEXT NOT NULL,
-                email TEXT,
-                telefono TEXT,
-                carrera_id INTEGER,
-                fecha_ingreso DATE,
-                fecha_egreso DATE NOT NULL,
-                promedio REAL,
-                cedula_profesional TEXT,
-                titulo_obtenido BOOLEAN DEFAULT 0,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (carrera_id) REFERENCES carreras (id),
-                FOREIGN KEY (matricula) REFERENCES usuarios (matricula)
-            )
-        ''')
+        cursor.executemany(
+            "INSERT INTO codigos_catalogo (dominio, etiqueta) VALUES (?, ?) ON CONFLICT (dominio, etiqueta) DO NOTHING",
+            [(dominio, etiqueta) for dominio, etiquetas in ENUM_LABELS.items() for etiqueta in etiquetas]
+        )
+        cursor.execute(
+            "INSERT INTO empleadores (id, nombre) VALUES (?, ?) ON CONFLICT (id) DO NOTHING",
+            (UNRESOLVED_EMPLOYER_ID, UNRESOLVED_EMPLOYER_NAME)
+        )
+        
+        for indice, definicion in INDEX_DEFINITIONS.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {definicion}")
         
-        # Tabla de situación académica actual
+        if self.engine.backend.supports_triggers:
+            self._create_version_triggers(cursor)
+            self._create_notification_counter_triggers(cursor)
+            self._create_employer_triggers(cursor)
+    
+    def _create_version_triggers(self, cursor):
+        """Triggers que incrementan la versión de las tablas versionadas"""
+        for tabla in VERSIONED_TABLES:
+            for operacion in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_version_{tabla}_{operacion.lower()}
+                    AFTER {operacion} ON {tabla}
+                    BEGIN
+                        INSERT INTO versiones_tablas (tabla, version) VALUES ('{tabla}', 1)
+                        ON CONFLICT (tabla) DO UPDATE SET version = version + 1;
+                    END
+                ''')
+
+    def _create_employer_triggers(self, cursor):
+        """Si cambia la empresa capturada, el registro vuelve a quedar pendiente de normalizar"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS situacion_academica (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricula TEXT NOT NULL,
-                estudia_actualmente BOOLEAN NOT NULL,
-                institucion_actual TEXT,
-                tipo_estudios TEXT CHECK (tipo_estudios IN ('maestria', 'doctorado', 'especialidad', 'diplomado', 'otro')),
-                nombre_programa TEXT,
-                fecha_inicio DATE,
-                fecha_fin_estimada DATE,
-                fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (matricula) REFERENCES usuarios (matricula)
-            )
+            CREATE TRIGGER IF NOT EXISTS trg_empleador_empresa_update
+            AFTER UPDATE OF empresa ON situacion_laboral
+            WHEN NEW.empresa IS NOT OLD.empresa
+            BEGIN
+                UPDATE situacion_laboral SET empleador_id = NULL WHERE id = NEW.id;
+            END
         ''')
+
+    def _create_notification_counter_triggers(self, cursor):
+        """Triggers que mantienen contadores_notificaciones; la primera vez recalcula los contadores"""
+        existing = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_contador_notificaciones_insert'"
+        ).fetchone()
+        if existing:
+            return
         
-        # Tabla de situación laboral
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS situacion_laboral (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricula TEXT NOT NULL,
-                trabaja_actualmente BOOLEAN NOT NULL,
-                empresa TEXT,
-                cargo TEXT,
-                sector TEXT,
-                salario_rango TEXT,
-                anos_experiencia INTEGER,
-                fecha_inicio_trabajo DATE,
-                relacionado_carrera BOOLEAN,
-                fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (matricula) REFERENCES usuarios (matricula)
-            )
+            CREATE TRIGGER trg_contador_notificaciones_insert
+            AFTER INSERT ON notificaciones
+            BEGIN
+                INSERT INTO contadores_notificaciones (matricula, no_leidas, version)
+                VALUES (NEW.matricula, NEW.leida = 0, 1)
+                ON CONFLICT (matricula) DO UPDATE
+                SET no_leidas = no_leidas + excluded.no_leidas, version = version + 1;
+            END
         ''')
-        
-        # Tabla de empresas/bolsas de trabajo
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS empresas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_empresa TEXT NOT NULL,
-                sector TEXT,
-                descripcion TEXT,
-                email_contacto TEXT,
-                telefono TEXT,
-                sitio_web TEXT,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                activa BOOLEAN DEFAULT 1
-            )
+            CREATE TRIGGER trg_contador_notificaciones_update
+            AFTER UPDATE OF leida ON notificaciones
+            WHEN OLD.leida <> NEW.leida
+            BEGIN
+                UPDATE contadores_notificaciones
+                SET no_leidas = no_leidas + CASE WHEN NEW.leida = 0 THEN 1 ELSE -1 END,
+                    version = version + 1
+                WHERE matricula = NEW.matricula;
+            END
         ''')
-        
-        # Tabla de ofertas de trabajo
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ofertas_trabajo (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                empresa_id INTEGER,
-                titulo_puesto TEXT NOT NULL,
-                descripcion TEXT,
-                requisitos TEXT,
-                salario_ofrecido TEXT,
-                modalidad TEXT CHECK (modalidad IN ('presencial', 'remoto', 'hibrido')),
-                ubicacion TEXT,
-                fecha_publicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                fecha_vencimiento DATE,
-                activa BOOLEAN DEFAULT 1,
-                FOREIGN KEY (empresa_id) REFERENCES empresas (id)
-            )
+            CREATE TRIGGER trg_contador_notificaciones_delete
+            AFTER DELETE ON notificaciones
+            BEGIN
+                UPDATE contadores_notificaciones
+                SET no_leidas = no_leidas - (OLD.leida = 0), version = version + 1
+                WHERE matricula = OLD.matricula;
+            END
         ''')
         
-        # Tabla de notificaciones
+        # Contadores iniciales a partir de las notificaciones existentes
+        cursor.execute("DELETE FROM contadores_notificaciones")
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notificaciones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricula TEXT,
-                oferta_id INTEGER,
-                titulo TEXT NOT NULL,
-                mensaje TEXT NOT NULL,
-                leida BOOLEAN DEFAULT 0,
-                fecha_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (matricula) REFERENCES usuarios (matricula),
-                FOREIGN KEY (oferta_id) REFERENCES ofertas_trabajo (id)
-            )
+            INSERT INTO contadores_notificaciones (matricula, no_leidas, version)
+            SELECT n.matricula, SUM(n.leida = 0), 1
+            FROM notificaciones n
+            JOIN usuarios u ON u.matricula = n.matricula
+            GROUP BY n.matricula
         ''')
-        
-        conn.commit()
-        conn.close()
-        
-        # Crear usuario administrador por defecto
-        self.create_default_admin()
-    
-    def create_default_admin(self):
+
+    def create_default_admin(self, conn=None):
         """Crea un usuario administrador por defecto"""
-        conn = self.get_connection()
+        if conn is None:
+            with self.write_connection() as conn:
+                return self.create_default_admin(conn)
         cursor = conn.cursor()
         
         # Verificar si ya existe un admin
@@ -166,9 +699,6 @@ class DatabaseManager:
                 INSERT INTO usuarios (matricula, password, tipo_usuario, nombre, apellidos, email)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', ("ADMIN001", password_hash, "admin", "Servicios", "Escolares", "servicios@novauniversitas.edu"))
-            conn.commit()
-        
-        conn.close()
     
     def hash_password(self, password):
         """Hashea una contraseña"""
@@ -176,42 +706,157 @@ class DatabaseManager:
     
     def verify_password(self, password, hashed):
         """Verifica una contraseña"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return bcrypt.checkpw(password.encode('utf-8'), bytes(hashed))
+    
+    def get_login_record(self, matricula):
+        """Hash de la contraseña y datos del usuario activo, o None si no existe"""
+        result = self.fetch_one(
+            "SELECT password, tipo_usuario, nombre, apellidos FROM usuarios WHERE matricula = ? AND activo = 1",
+            (matricula,)
+        )
+        if result is None:
+            return None
+        return {
+            'matricula': matricula,
+            'tipo_usuario': result[1],
+            'nombre': result[2],
+            'apellidos': result[3],
+            'password': result[0]
+        }
     
     def authenticate_user(self, matricula, password):
         """Autentica un usuario"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        record = self.get_login_record(matricula)
         
-        cursor.execute("SELECT password, tipo_usuario, nombre, apellidos FROM usuarios WHERE matricula = ? AND activo = 1", (matricula,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and self.verify_password(password, result[0]):
-            return {
-                'matricula': matricula,
-                'tipo_usuario': result[1],
-                'nombre': result[2],
-                'apellidos': result[3]
-            }
+        if record and self.verify_password(password, record.pop('password')):
+            return record
         return None
     
-    def execute_query(self, query, params=None):
-        """Ejecuta una consulta SQL"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+    def delete_graduates(self, matriculas, tx=None):
+        """Elimina egresados en bloque; ON DELETE CASCADE limpia su historial relacionado"""
+        if tx is None:
+            with self.transaction() as tx:
+                return self.delete_graduates(matriculas, tx)
+        matriculas = list(matriculas)
+        placeholders = ', '.join('?' for _ in matriculas)
+        deleted = tx.execute(f"DELETE FROM alumnos_egresados WHERE matricula IN ({placeholders})", matriculas)
+        tx.execute(f"DELETE FROM usuarios WHERE matricula IN ({placeholders})", matriculas)
+        return deleted
+    
+    def encode_label(self, dominio, etiqueta):
+        """Código de una etiqueta; las nuevas se agregan al diccionario salvo en dominios cerrados"""
+        if etiqueta is None or etiqueta == '':
+            return None
+        consulta = "SELECT id FROM codigos_catalogo WHERE dominio = ? AND etiqueta = ?"
+        result = self.fetch_one(consulta, (dominio, etiqueta))
+        if result:
+            return result[0]
+        if dominio in CLOSED_DOMAINS:
+            raise ValueError(f"Valor no válido para {dominio}: {etiqueta}")
+        with self.transaction() as tx:
+            tx.execute(
+                "INSERT INTO codigos_catalogo (dominio, etiqueta) VALUES (?, ?) ON CONFLICT (dominio, etiqueta) DO NOTHING",
+                (dominio, etiqueta)
+            )
+            return tx.fetch_one(consulta, (dominio, etiqueta))[0]
+    
+    def get_table_version(self, *tablas):
+        """Versión combinada de las tablas indicadas (cambia con cada escritura en ellas)"""
+        placeholders = ', '.join('?' for _ in tablas)
+        result = self.fetch_one(
+            f"SELECT COALESCE(SUM(version), 0) FROM versiones_tablas WHERE tabla IN ({placeholders})",
+            tablas
+        )
+        return int(result[0]) if result else 0
+    
+    def get_notification_counter(self, matricula):
+        """(no leídas, versión) de un alumno; la versión cambia con cada cambio en sus notificaciones"""
+        if not self.engine.backend.supports_triggers:
+            # Sin triggers no hay contador mantenido: se cuenta directamente y no hay versión
+            result = self.fetch_one(
+                "SELECT COUNT(*) FROM notificaciones WHERE matricula = ? AND leida = 0",
+                (matricula,)
+            )
+            return (int(result[0]) if result else 0), None
+        result = self.fetch_one(
+            "SELECT no_leidas, version FROM contadores_notificaciones WHERE matricula = ?",
+            (matricula,)
+        )
+        return (int(result[0]), int(result[1])) if result else (0, 0)
+    
+    def apply_notification_action(self, matricula, ids, accion):
+        """Aplica una acción a varias notificaciones del alumno en una transacción.
         
+        Devuelve (filas afectadas, versión del contador antes, versión después); la versión es None sin triggers."""
+        ids = [int(notification_id) for notification_id in ids]
+        version_query = "SELECT version FROM contadores_notificaciones WHERE matricula = ?"
+        with self.transaction() as tx:
+            if self.engine.backend.supports_triggers:
+                before = tx.fetch_one(version_query, (matricula,))
+            affected = 0
+            for start in range(0, len(ids), NOTIFICATION_ACTION_BATCH):
+                batch = ids[start:start + NOTIFICATION_ACTION_BATCH]
+                query = NOTIFICATION_ACTIONS[accion].format(ids=', '.join('?' for _ in batch))
+                affected += tx.execute(query, [matricula] + batch)
+            if not self.engine.backend.supports_triggers:
+                return affected, None, None
+            after = tx.fetch_one(version_query, (matricula,))
+        return affected, (before[0] if before else 0), (after[0] if after else 0)
+    
+    def fetch_one(self, query, params=None):
+        """Ejecuta una consulta de lectura y devuelve la primera fila (o None)"""
+        with self.read_connection() as conn:
+            return conn.execute(query, params).fetchone()
+    
+    def fetch_all(self, query, params=None):
+        """Ejecuta una consulta de lectura y devuelve todas las filas como tuplas"""
+        with self.read_connection() as conn:
+            return conn.execute(query, params).fetchall()
+    
+    def execute_query(self, query, params=None, query_class='transaccional'):
+        """Ejecuta una consulta SQL (lecturas en el pool o la réplica, escrituras en el escritor único)"""
         if query.strip().upper().startswith('SELECT'):
-            result = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            conn.close()
+            # pandas se carga hasta la primera consulta tabular (no lo paga la página de login)
+            import pandas as pd
+            with self.read_connection(query_class) as conn:
+                cursor = conn.execute(query, params)
+                result = cursor.fetchall()
+                columns = [description[0] for description in cursor.description]
             return pd.DataFrame(result, columns=columns) if result else pd.DataFrame()
-        else:
-            conn.commit()
-            conn.close()
-            return cursor.rowcount
\ No newline at end of file
+        
+        with self.write_connection() as conn:
+            cursor = conn.execute(query, params)
+        return cursor.rowcount
+    
+    def checkpoint(self, mode="PASSIVE"):
+        """Fuerza un checkpoint del WAL (PASSIVE, FULL, RESTART o TRUNCATE)"""
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Modo de checkpoint no válido: {mode}")
+        if not self.engine.backend.supports_pragmas:
+            return None
+        with self.engine.writer.acquire() as conn:
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+    
+    def get_metrics(self):
+        """Métricas del escritor único y del pool de lectura"""
+        writer = self.engine.writer
+        readers = self.engine.readers
+        return {
+            'backend': self.engine.backend.name,
+            'writer_queue_depth': writer.pending,
+            'writer_queue_max': writer.max_pending,
+            'writes': writer.writes,
+            'commits': writer.commits,
+            'lock_wait_total_s': round(writer.lock_wait_total, 4),
+            'lock_wait_max_s': round(writer.lock_wait_max, 4),
+            'lock_wait_avg_s': round(writer.lock_wait_total / writer.writes, 4) if writer.writes else 0.0,
+            'read_connections': readers.created,
+            'read_pool_waits': readers.waits,
+            'replica_age_s': round(self.engine.replica.age(), 1) if self.engine.replica.readers else None,
+            'replica_refreshes': self.engine.replica.refreshes,
+            'replica_skipped': self.engine.replica.skipped,
+            'wal_autocheckpoint': WAL_AUTOCHECKPOINT
+        }
@@ -0,0 +1,291 @@
+import os
+import re
+import sqlite3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Selección del motor de almacenamiento: sqlite (por defecto), libsql o postgres
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").lower()
+
+# Parámetros de concurrencia de SQLite (se pueden ajustar por variables de entorno)
+WAL_AUTOCHECKPOINT = int(os.getenv("DB_WAL_AUTOCHECKPOINT", "1000"))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+SNAPSHOT_BACKUP_PAGES = int(os.getenv("DB_SNAPSHOT_BACKUP_PAGES", "1024"))
+
+
+class SQLiteDialect:
+    """Dialecto nativo: el SQL de la aplicación ya está escrito para SQLite"""
+    def translate(self, sql, has_params=False):
+        return sql
+
+    def last_insert_id(self, raw_cursor):
+        return raw_cursor.lastrowid
+
+
+class PostgresDialect:
+    """Traduce el SQL escrito para SQLite al dialecto de PostgreSQL"""
+    _YEAR = re.compile(r"CAST\(\s*strftime\(\s*'%Y'\s*,\s*([^()]+?)\s*\)\s+AS\s+INTEGER\s*\)", re.IGNORECASE)
+    _STRFTIME = re.compile(r"strftime\(\s*'([^']*)'\s*,\s*([^()]+?)\s*\)", re.IGNORECASE)
+    _DATE_NOW = re.compile(
+        r"date\(\s*'now'\s*(?:,\s*'([+-]?)(\d+)\s+(days?|months?|years?)'\s*)?\)", re.IGNORECASE
+    )
+    _FORMATS = {'%Y': 'YYYY', '%m': 'MM', '%d': 'DD', '%H': 'HH24', '%M': 'MI', '%S': 'SS'}
+    _TYPES = [
+        (re.compile(r"INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT", re.IGNORECASE), "SERIAL PRIMARY KEY"),
+        (re.compile(r"\bBOOLEAN\b", re.IGNORECASE), "SMALLINT"),
+        (re.compile(r"\bBLOB\b", re.IGNORECASE), "BYTEA"),
+        (re.compile(r"\bLIKE\b", re.IGNORECASE), "ILIKE"),
+        # PostgreSQL solo tiene columnas generadas almacenadas
+        (re.compile(r"\bVIRTUAL\b", re.IGNORECASE), "STORED"),
+    ]
+
+    def _strftime(self, match):
+        fmt = match.group(1)
+        for sqlite_fmt, pg_fmt in self._FORMATS.items():
+            fmt = fmt.replace(sqlite_fmt, pg_fmt)
+        return f"to_char({match.group(2)}, '{fmt}')"
+
+    def _date_now(self, match):
+        sign, amount, unit = match.groups()
+        if amount is None:
+            return "CURRENT_DATE"
+        operator = '-' if sign == '-' else '+'
+        return f"(CURRENT_DATE {operator} INTERVAL '{amount} {unit}')"
+
+    def _placeholders(self, sql, has_params):
+        """Cambia '?' por '%s' fuera de literales y escapa '%' si hay parámetros"""
+        result = []
+        in_string = False
+        for char in sql:
+            if char == "'":
+                in_string = not in_string
+            if has_params and char == '%':
+                result.append('%%')
+            elif char == '?' and not in_string:
+                result.append('%s')
+            else:
+                result.append(char)
+        return ''.join(result)
+
+    def translate(self, sql, has_params=False):
+        # El año como entero con EXTRACT (inmutable, válido también en columnas generadas)
+        sql = self._YEAR.sub(r"CAST(EXTRACT(YEAR FROM \1) AS INTEGER)", sql)
+        sql = self._STRFTIME.sub(self._strftime, sql)
+        sql = self._DATE_NOW.sub(self._date_now, sql)
+        for pattern, replacement in self._TYPES:
+            sql = pattern.sub(replacement, sql)
+        return self._placeholders(sql, has_params)
+
+    def last_insert_id(self, raw_cursor):
+        """lastrowid de psycopg2 es el OID: el id es el último valor SERIAL de la sesión"""
+        with raw_cursor.connection.cursor() as cursor:
+            cursor.execute("SELECT lastval()")
+            return cursor.fetchone()[0]
+
+
+class BackendCursor:
+    """Cursor que traduce cada sentencia antes de enviarla al motor"""
+    def __init__(self, raw, dialect):
+        self.raw = raw
+        self.dialect = dialect
+
+    def execute(self, sql, params=None):
+        if params:
+            self.raw.execute(self.dialect.translate(sql, True), tuple(params))
+        else:
+            self.raw.execute(self.dialect.translate(sql))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.raw.executemany(self.dialect.translate(sql, True), seq_of_params)
+        return self
+
+    @property
+    def lastrowid(self):
+        return self.dialect.last_insert_id(self.raw)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class BackendConnection:
+    """Conexión independiente del motor con la interfaz mínima que usa la aplicación"""
+    def __init__(self, raw, dialect):
+        self.raw = raw
+        self.dialect = dialect
+
+    def cursor(self):
+        return BackendCursor(self.raw.cursor(), self.dialect)
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class SQLiteBackend:
+    """Archivo SQLite local en modo WAL"""
+    name = "sqlite"
+    supports_pragmas = True
+    supports_triggers = True
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.dialect = SQLiteDialect()
+
+    def connect_writer(self):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        # Solo tiene efecto en bases nuevas; las existentes se convierten con un VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT}")
+        return BackendConnection(conn, self.dialect)
+
+    def lock_schema(self, conn):
+        """Toma el candado de escritura antes de revisar el esquema (varios procesos pueden arrancar a la vez)"""
+        conn.execute("BEGIN IMMEDIATE")
+
+    def connect_reader(self):
+        uri = f"file:{os.path.abspath(self.db_name)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return BackendConnection(conn, self.dialect)
+
+    def sync(self, conn):
+        """Los archivos locales no necesitan sincronizarse"""
+        pass
+
+    def create_snapshot(self, path):
+        """Copia en caliente con la API de backup sobre la réplica existente, por bloques de páginas.
+
+        La copia queda en modo WAL: sus lectores abiertos siguen leyendo la versión anterior y ven
+        la nueva al confirmarse, sin reabrir conexiones. Varios procesos se turnan con el candado del archivo."""
+        source = sqlite3.connect(self.db_name)
+        target = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            # Todos los pasos leen la misma instantánea del primario: sus escrituras no reinician la copia
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=SNAPSHOT_BACKUP_PAGES)
+        finally:
+            target.close()
+            source.close()
+        return SQLiteBackend(path)
+
+    def data_version(self, conn):
+        """Cambia cada vez que otra conexión (de cualquier proceso) confirma escrituras"""
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+class LibSQLBackend(SQLiteBackend):
+    """libSQL/Turso: réplica embebida local con escrituras enviadas al primario"""
+    name = "libsql"
+
+    def __init__(self, db_name):
+        super().__init__(db_name)
+        import libsql_experimental as libsql
+        self.libsql = libsql
+        self.sync_url = os.getenv("LIBSQL_SYNC_URL")
+        self.auth_token = os.getenv("LIBSQL_AUTH_TOKEN", "")
+        # Con réplica remota el WAL lo administra el servidor
+        self.supports_pragmas = not self.sync_url
+
+    def connect_writer(self):
+        if self.sync_url:
+            conn = self.libsql.connect(self.db_name, sync_url=self.sync_url, auth_token=self.auth_token)
+            conn.sync()
+        else:
+            conn = self.libsql.connect(self.db_name)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT}")
+        return BackendConnection(conn, self.dialect)
+
+    def connect_reader(self):
+        # Las lecturas se sirven desde la copia local de la réplica
+        return BackendConnection(self.libsql.connect(self.db_name), self.dialect)
+
+    def lock_schema(self, conn):
+        """Con réplica remota el primario serializa las escrituras"""
+        if not self.sync_url:
+            super().lock_schema(conn)
+
+    def sync(self, conn):
+        """Trae los cambios del primario a la réplica local"""
+        if self.sync_url:
+            conn.sync()
+
+    def create_snapshot(self, path):
+        """La réplica embebida ya es la copia de lectura; basta con sincronizarla"""
+        return None
+
+    def data_version(self, conn):
+        """Los cambios llegan del primario remoto: no se detectan localmente"""
+        return None
+
+
+class PostgresBackend:
+    """Servidor PostgreSQL (DATABASE_URL) a través de psycopg2"""
+    name = "postgres"
+    supports_pragmas = False
+    # Los triggers de la aplicación usan la sintaxis de SQLite
+    supports_triggers = False
+
+    def __init__(self, db_name):
+        import psycopg2
+        self.db_name = db_name
+        from psycopg2.extensions import AsIs, register_adapter
+        self.psycopg2 = psycopg2
+        self.dsn = os.getenv("DATABASE_URL", "postgresql://localhost/nova_universitas")
+        self.dialect = PostgresDialect()
+        # Las columnas BOOLEAN se crean como SMALLINT para conservar las comparaciones "= 1"
+        register_adapter(bool, lambda value: AsIs(int(value)))
+
+    def connect_writer(self):
+        return BackendConnection(self.psycopg2.connect(self.dsn), self.dialect)
+
+    def lock_schema(self, conn):
+        """Candado consultivo que se libera al confirmar la transacción del esquema"""
+        conn.execute("SELECT pg_advisory_xact_lock(hashtext('esquema'))")
+
+    def connect_reader(self):
+        conn = self.psycopg2.connect(self.dsn)
+        conn.set_session(readonly=True, autocommit=True)
+        return BackendConnection(conn, self.dialect)
+
+    def sync(self, conn):
+        pass
+
+    def create_snapshot(self, path):
+        """Las lecturas analíticas usan el mismo servidor"""
+        return None
+
+    def data_version(self, conn):
+        return None
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'libsql': LibSQLBackend,
+    'postgres': PostgresBackend
+}
+
+
+def create_backend(db_name, backend_name=None):
+    """Crea el backend configurado en DB_BACKEND (o el indicado explícitamente)"""
+    backend_name = (backend_name or DB_BACKEND).lower()
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Backend de base de datos no soportado: {backend_name}")
+    return BACKENDS[backend_name](db_name)
@@ -0,0 +1,360 @@
+import os
+import random
+import re
+import threading
+import zlib
+import scheduler
+from catalog_cache import ReferenceCatalog
+from database import UNRESOLVED_EMPLOYER_ID
+from search_index import normalize, trigrams
+
+EMPLOYER_SYNC_SECONDS = int(os.getenv("EMPLOYER_SYNC_SECONDS", "300"))
+EMPLOYER_BATCH_SIZE = int(os.getenv("EMPLOYER_BATCH_SIZE", "2000"))
+# Similitud mínima (Jaccard de trigramas) para considerar dos nombres el mismo empleador
+EMPLOYER_MATCH_THRESHOLD = float(os.getenv("EMPLOYER_MATCH_THRESHOLD", "0.6"))
+# Último id de situacion_laboral ya normalizado (tabla marcas_agregacion)
+EMPLOYER_WATERMARK = "empleadores"
+
+# Firma MinHash de 32 permutaciones en 8 bandas de 4: dos nombres con Jaccard 0.6
+# comparten al menos una banda con probabilidad ~0.65 y con Jaccard 0.8 con ~0.99
+MINHASH_BANDS = 8
+MINHASH_ROWS = 4
+MINHASH_PRIME = (1 << 61) - 1
+_rnd = random.Random(20240601)
+MINHASH_PERMUTATIONS = [
+    (_rnd.randrange(1, MINHASH_PRIME), _rnd.randrange(0, MINHASH_PRIME))
+    for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+# Razón social que se descarta al final del nombre ("S.A. de C.V.", "S. de R.L.", "Inc.", ...)
+LEGAL_SUFFIX_TOKENS = {
+    's', 'a', 'b', 'de', 'c', 'v', 'r', 'l', 'sa', 'sab', 'sapi', 'cv', 'rl', 'srl', 'sc', 'ac',
+    'sas', 'inc', 'ltd', 'llc', 'corp', 'co', 'gmbh', 'plc'
+}
+
+
+def employer_key(nombre):
+    """Clave de comparación: minúsculas, sin acentos, sin puntuación ni razón social"""
+    tokens = re.sub(r'[^0-9a-zñ]+', ' ', normalize(nombre)).split()
+    while tokens and tokens[-1] in LEGAL_SUFFIX_TOKENS:
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+def shingles(clave):
+    return trigrams(f" {clave} ")
+
+
+def similarity(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class MinHashIndex:
+    """Bloqueo por bandas de MinHash: solo se comparan las claves que comparten alguna banda"""
+    def __init__(self):
+        self.buckets = {}
+        self.shingles = {}
+
+    def _bands(self, conjunto):
+        hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in conjunto]
+        firma = [min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in MINHASH_PERMUTATIONS]
+        return [(banda, tuple(firma[banda * MINHASH_ROWS:(banda + 1) * MINHASH_ROWS])) for banda in range(MINHASH_BANDS)]
+
+    def add(self, clave):
+        if clave in self.shingles:
+            return
+        conjunto = shingles(clave)
+        self.shingles[clave] = conjunto
+        for banda in self._bands(conjunto):
+            self.buckets.setdefault(banda, set()).add(clave)
+
+    def best(self, clave, threshold=EMPLOYER_MATCH_THRESHOLD):
+        """(clave más parecida, similitud) entre los candidatos del bloqueo, o (None, 0)"""
+        conjunto = shingles(clave)
+        candidatos = set()
+        for banda in self._bands(conjunto):
+            candidatos |= self.buckets.get(banda, set())
+        mejor, puntaje = None, 0.0
+        for candidato in candidatos:
+            valor = similarity(conjunto, self.shingles[candidato])
+            if valor > puntaje:
+                mejor, puntaje = candidato, valor
+        return (mejor, puntaje) if puntaje >= threshold else (None, 0.0)
+
+    def __len__(self):
+        return len(self.shingles)
+
+
+class EmployerNormalizer:
+    """Asigna a cada registro de situacion_laboral un empleador canónico (empleador_id).
+
+    Las variantes ya vistas se resuelven por clave exacta; las nuevas se comparan solo contra los
+    candidatos del bloqueo MinHash. Se recorren los registros posteriores a la marca de agua y luego
+    los que quedaron sin empleador debajo de ella (empresa editada: un trigger borra su empleador_id).
+    Los que no dejan clave (empresa vacía) quedan con el empleador reservado UNRESOLVED_EMPLOYER_ID."""
+    _normalizers = {}
+    _normalizers_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.aliases = {}
+        self.index = MinHashIndex()
+        self.empresas = {}
+        self.empresas_index = MinHashIndex()
+        self.version = None
+        self.processed = 0
+        self.fuzzy_matches = 0
+        self.created = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Normalizador compartido por proceso, con los registros nuevos procesados en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._normalizers_lock:
+            if key not in cls._normalizers:
+                normalizer = cls(db)
+                scheduler.schedule(f"empleadores:{key}", EMPLOYER_SYNC_SECONDS, normalizer.run)
+                cls._normalizers[key] = normalizer
+            return cls._normalizers[key]
+
+    def _sync(self):
+        """Recarga variantes y empresas cuando cambian los empleadores (otro proceso, fusiones) o las empresas"""
+        version = self.db.get_table_version('empleadores', 'empresas')
+        if version == self.version and self.db.engine.backend.supports_triggers:
+            return
+        self.aliases = dict(self.db.fetch_all("SELECT clave, empleador_id FROM empleadores_alias"))
+        for clave in self.aliases:
+            self.index.add(clave)
+        self.empresas = {}
+        self.empresas_index = MinHashIndex()
+        for empresa_id, nombre, sector in self.db.fetch_all("SELECT id, nombre_empresa, sector FROM empresas"):
+            clave = employer_key(nombre)
+            if clave:
+                self.empresas.setdefault(clave, (empresa_id, nombre, sector))
+                self.empresas_index.add(clave)
+        if self._link_companies():
+            # Los vínculos propios ya están en memoria: no obligan a recargar en la siguiente ejecución
+            version = self.db.get_table_version('empleadores', 'empresas')
+        self.version = version
+
+    def _match_company(self, clave):
+        """Empresa registrada que corresponde a la clave (exacta o parecida)"""
+        if clave not in self.empresas:
+            clave, _ = self.empresas_index.best(clave)
+        return self.empresas.get(clave)
+
+    def _link_companies(self):
+        """Vincula con la tabla empresas a los empleadores que aún no lo están; devuelve cuántos"""
+        pendientes = self.db.fetch_all('''
+            SELECT e.id, MIN(a.clave) FROM empleadores e
+            JOIN empleadores_alias a ON a.empleador_id = e.id
+            WHERE e.empresa_id IS NULL
+            GROUP BY e.id
+        ''')
+        vinculos = []
+        for empleador_id, clave in pendientes:
+            empresa = self._match_company(clave)
+            if empresa:
+                vinculos.append((empresa[0], empresa[1], empresa[2], empleador_id))
+        if vinculos:
+            with self.db.transaction() as tx:
+                tx.executemany(
+                    "UPDATE empleadores SET empresa_id = ?, nombre = ?, sector = COALESCE(?, sector) WHERE id = ? AND empresa_id IS NULL",
+                    vinculos
+                )
+        return len(vinculos)
+
+    def _resolve(self, tx, empresa, sector, nuevos):
+        """empleador_id para el texto capturado; crea el empleador si no se parece a ninguno"""
+        clave = employer_key(empresa)
+        if not clave:
+            return UNRESOLVED_EMPLOYER_ID
+        empleador_id = self.aliases.get(clave) or nuevos.get(clave)
+        if empleador_id:
+            return empleador_id
+
+        parecida, _ = self.index.best(clave)
+        empleador_id = self.aliases.get(parecida) or nuevos.get(parecida)
+        if empleador_id:
+            self.fuzzy_matches += 1
+        else:
+            # Otro proceso pudo registrar la misma variante después de la última recarga
+            existente = tx.fetch_one("SELECT empleador_id FROM empleadores_alias WHERE clave = ?", (clave,))
+            if existente:
+                empleador_id = existente[0]
+            else:
+                registrada = self._match_company(clave)
+                if registrada:
+                    empresa_id, nombre, sector = registrada[0], registrada[1], registrada[2] or sector
+                else:
+                    empresa_id, nombre = None, ' '.join(str(empresa).split())
+                tx.execute(
+                    "INSERT INTO empleadores (nombre, sector, empresa_id) VALUES (?, ?, ?)",
+                    (nombre, (sector or '').strip() or None, empresa_id)
+                )
+                empleador_id = tx.lastrowid
+                self.created += 1
+        tx.execute(
+            "INSERT INTO empleadores_alias (clave, empleador_id) VALUES (?, ?) ON CONFLICT (clave) DO NOTHING",
+            (clave, empleador_id)
+        )
+        nuevos[clave] = empleador_id
+        self.index.add(clave)
+        return empleador_id
+
+    def watermark(self):
+        result = self.db.fetch_one("SELECT ultimo_id FROM marcas_agregacion WHERE proceso = ?", (EMPLOYER_WATERMARK,))
+        return int(result[0]) if result else 0
+
+    def _assign(self, tx, rows, nuevos):
+        """Resuelve y guarda el empleador de cada registro (id, empresa, sector_id) sin empleador"""
+        sectores = ReferenceCatalog.for_database(self.db).etiquetas('sector')
+        asignaciones = [
+            (self._resolve(tx, empresa, sectores.get(sector_id), nuevos), registro_id)
+            for registro_id, empresa, sector_id in rows
+        ]
+        tx.executemany(
+            "UPDATE situacion_laboral SET empleador_id = ? WHERE id = ? AND empleador_id IS NULL",
+            asignaciones
+        )
+        # Nombre mostrado: la forma más capturada por los egresados (salvo si está vinculado a una empresa)
+        tx.executemany('''
+            UPDATE empleadores SET nombre = (
+                SELECT TRIM(empresa) FROM situacion_laboral WHERE empleador_id = empleadores.id
+                GROUP BY TRIM(empresa) ORDER BY COUNT(*) DESC, TRIM(empresa) LIMIT 1
+            )
+            WHERE id = ? AND empresa_id IS NULL
+        ''', [(empleador_id,) for empleador_id in {empleador_id for empleador_id, _ in asignaciones}
+              if empleador_id != UNRESOLVED_EMPLOYER_ID])
+
+    def _normalize_batch(self, desde):
+        """Normaliza un lote de registros posteriores a la marca; devuelve (registros leídos, último id)"""
+        rows = self.db.fetch_all('''
+            SELECT id, empresa, sector_id FROM situacion_laboral
+            WHERE id > ? AND empleador_id IS NULL
+            ORDER BY id
+            LIMIT ?
+        ''', (desde, EMPLOYER_BATCH_SIZE))
+        if not rows:
+            return 0, desde
+        nuevos = {}
+        with self.db.transaction() as tx:
+            tx.execute(
+                "INSERT INTO marcas_agregacion (proceso, ultimo_id) VALUES (?, 0) ON CONFLICT (proceso) DO NOTHING",
+                (EMPLOYER_WATERMARK,)
+            )
+            # Avance condicional de la marca: si otro proceso ya tomó este lote, no se normaliza dos veces
+            avanzada = tx.execute(
+                "UPDATE marcas_agregacion SET ultimo_id = ?, fecha_actualizacion = CURRENT_TIMESTAMP WHERE proceso = ? AND ultimo_id = ?",
+                (rows[-1][0], EMPLOYER_WATERMARK, desde)
+            )
+            if not avanzada:
+                return 0, desde
+            self._assign(tx, rows, nuevos)
+        # Solo después de confirmar: si el lote se revierte, las variantes nuevas no quedan en memoria
+        self.aliases.update(nuevos)
+        self.processed += len(rows)
+        return len(rows), rows[-1][0]
+
+    def _normalize_pending(self, hasta):
+        """Normaliza un lote de registros sin empleador en o debajo de la marca (empresa editada o
+        confirmados después de que la marca los pasó); devuelve cuántos se leyeron"""
+        rows = self.db.fetch_all('''
+            SELECT id, empresa, sector_id FROM situacion_laboral
+            WHERE empleador_id IS NULL AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        ''', (hasta, EMPLOYER_BATCH_SIZE))
+        if not rows:
+            return 0
+        nuevos = {}
+        with self.db.transaction() as tx:
+            # Toma la fila de la marca: otro proceso espera y después ve las variantes de este lote
+            tx.execute(
+                "UPDATE marcas_agregacion SET fecha_actualizacion = CURRENT_TIMESTAMP WHERE proceso = ?",
+                (EMPLOYER_WATERMARK,)
+            )
+            self._assign(tx, rows, nuevos)
+        self.aliases.update(nuevos)
+        self.processed += len(rows)
+        return len(rows)
+
+    def run(self):
+        """Normaliza todos los registros pendientes; devuelve cuántos se procesaron"""
+        with self._lock:
+            self._sync()
+            total, desde = 0, self.watermark()
+            created = self.created
+            while True:
+                count, desde = self._normalize_batch(desde)
+                total += count
+                if count < EMPLOYER_BATCH_SIZE:
+                    break
+            while True:
+                count = self._normalize_pending(desde)
+                total += count
+                if count < EMPLOYER_BATCH_SIZE:
+                    break
+            if self.created != created:
+                # Los empleadores creados por este proceso ya están en memoria
+                self.version = self.db.get_table_version('empleadores', 'empresas')
+            return total
+
+    def merge(self, origen_id, destino_id):
+        """Fusiona un empleador en otro (corrección manual): registros y variantes pasan al destino"""
+        origen_id, destino_id = int(origen_id), int(destino_id)
+        if origen_id == destino_id:
+            return 0
+        with self._lock:
+            with self.db.transaction() as tx:
+                movidos = tx.execute(
+                    "UPDATE situacion_laboral SET empleador_id = ? WHERE empleador_id = ?",
+                    (destino_id, origen_id)
+                )
+                tx.execute("UPDATE empleadores_alias SET empleador_id = ? WHERE empleador_id = ?", (destino_id, origen_id))
+                tx.execute("DELETE FROM empleadores WHERE id = ?", (origen_id,))
+            for clave, empleador_id in self.aliases.items():
+                if empleador_id == origen_id:
+                    self.aliases[clave] = destino_id
+            return movidos
+
+    def top_employers(self, limit=10, carrera_id=None):
+        """Empleadores con más egresados trabajando (última situación de cada egresado), agrupados por id"""
+        query = '''
+            SELECT e.nombre AS "Empleador", COUNT(*) AS "Egresados"
+            FROM alumnos_egresados ae
+            JOIN situacion_laboral sl ON sl.id = (
+                SELECT MAX(id) FROM situacion_laboral WHERE matricula = ae.matricula
+            )
+            JOIN empleadores e ON e.id = sl.empleador_id
+            WHERE sl.trabaja_actualmente = 1 AND sl.empleador_id != ?
+        '''
+        params = [UNRESOLVED_EMPLOYER_ID]
+        if carrera_id is not None:
+            query += " AND ae.carrera_id = ?"
+            params.append(carrera_id)
+        query += " GROUP BY sl.empleador_id, e.nombre ORDER BY COUNT(*) DESC, e.nombre LIMIT ?"
+        params.append(int(limit))
+        return self.db.execute_query(query, tuple(params), query_class='analitica')
+
+    def employers(self):
+        """Empleadores con su empresa vinculada, número de variantes y de registros"""
+        return self.db.execute_query('''
+            SELECT e.id, e.nombre, e.sector, em.nombre_empresa AS empresa_registrada,
+                   (SELECT COUNT(*) FROM empleadores_alias a WHERE a.empleador_id = e.id) AS variantes,
+                   (SELECT COUNT(*) FROM situacion_laboral sl WHERE sl.empleador_id = e.id) AS registros
+            FROM empleadores e
+            LEFT JOIN empresas em ON em.id = e.empresa_id
+            WHERE e.id != ?
+            ORDER BY registros DESC, e.nombre
+        ''', (UNRESOLVED_EMPLOYER_ID,), query_class='listado')
+
+    def stats(self):
+        return {
+            'empleadores': len(set(self.aliases.values())),
+            'variantes': len(self.aliases),
+            'procesados': self.processed,
+            'coincidencias_aproximadas': self.fuzzy_matches,
+            'creados': self.created
+        }
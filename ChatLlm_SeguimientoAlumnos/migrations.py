@@ -0,0 +1,476 @@
+"""Migraciones numeradas del esquema, aplicadas en segundo plano sin detener la aplicación.
+
+Cada migración es una lista de pasos. Los pasos largos (rellenar columnas, reconstruir tablas)
+trabajan por lotes con transacciones cortas y guardan su avance en schema_migrations, así que
+se reanudan donde quedaron si el proceso se reinicia.
+
+Uso:
+    python migrations.py             # aplica lo pendiente hasta terminar
+    python migrations.py --estado    # muestra el avance de cada migración
+    python migrations.py --reintentar 2   # vuelve a intentar una migración marcada como fallida
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scheduler
+from database import ENCODED_COLUMNS, TABLE_DEFINITIONS, DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CHECK_SECONDS = int(os.getenv("MIGRATION_CHECK_SECONDS", "10"))
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "2000"))
+# Pausa entre lotes; mientras haya escritores de la aplicación esperando se cede el turno hasta MIGRATION_MAX_YIELD_SECONDS
+MIGRATION_PAUSE_SECONDS = float(os.getenv("MIGRATION_PAUSE_SECONDS", "0.05"))
+MIGRATION_MAX_YIELD_SECONDS = float(os.getenv("MIGRATION_MAX_YIELD_SECONDS", "2"))
+# Fallas de un mismo paso antes de marcar la migración como fallida y dejar de reintentarla
+MIGRATION_MAX_ATTEMPTS = int(os.getenv("MIGRATION_MAX_ATTEMPTS", "3"))
+
+# Triggers que mantienen la copia al día mientras se reconstruye una tabla
+COPY_TRIGGER_PREFIX = "trg_migracion_"
+
+
+def table_columns(conn, tabla):
+    """Columnas almacenadas (sin las generadas) y las de la llave primaria"""
+    info = conn.execute(f"PRAGMA table_info({tabla})").fetchall()
+    return [columna[1] for columna in info], [columna[1] for columna in sorted(info, key=lambda c: c[5]) if columna[5]]
+
+
+def has_columns(conn, tabla, columnas):
+    existentes = {description[0] for description in conn.execute(f"SELECT * FROM {tabla} LIMIT 0").description}
+    return any(columna in existentes for columna in columnas)
+
+
+class EncodeLabels:
+    """Llena la columna de código a partir de la etiqueta de texto, por rangos de id"""
+    def __init__(self, tabla, columna):
+        self.tabla = tabla
+        self.columna = columna
+        self.codigo = ENCODED_COLUMNS[tabla][columna]
+
+    def __str__(self):
+        return f"codificar {self.tabla}.{self.columna}"
+
+    def needed(self, db, conn):
+        return has_columns(conn, self.tabla, [self.columna])
+
+    def start(self, db, conn):
+        conn.execute(f'''
+            INSERT INTO codigos_catalogo (dominio, etiqueta)
+            SELECT DISTINCT ?, {self.columna} FROM {self.tabla} WHERE {self.columna} IS NOT NULL
+            ON CONFLICT (dominio, etiqueta) DO NOTHING
+        ''', (self.columna,))
+
+    def batch(self, db, conn, desde, size):
+        """Procesa el siguiente rango; devuelve el último id o None si ya no quedan"""
+        hasta = conn.execute(
+            f"SELECT MAX(id) FROM (SELECT id FROM {self.tabla} WHERE id > ? ORDER BY id LIMIT ?) lote",
+            (desde, size)
+        ).fetchone()[0]
+        if hasta is None:
+            return None
+        conn.execute(f'''
+            UPDATE {self.tabla} SET {self.codigo} = (
+                SELECT id FROM codigos_catalogo WHERE dominio = ? AND etiqueta = {self.tabla}.{self.columna}
+            )
+            WHERE id > ? AND id <= ? AND {self.columna} IS NOT NULL AND {self.codigo} IS NULL
+        ''', (self.columna, desde, hasta))
+        return hasta
+
+    def finish(self, db, marcar):
+        with db.write_connection() as conn:
+            marcar(conn)
+
+    def abort(self, db):
+        """Cada lote se confirma solo: no hay nada que deshacer"""
+
+
+class OnlineRebuild:
+    """Reconstruye una tabla con su definición actual mientras la aplicación sigue escribiendo.
+
+    Se crea la tabla nueva y triggers que le replican cada cambio; las filas existentes se copian
+    por lotes de rowid. Al final, en una transacción corta, la nueva reemplaza a la original
+    y los índices se recrean uno por uno.
+
+    Las filas huérfanas (llave foránea sin fila padre, de antes de activar foreign_keys) no se
+    copian: quedan en {tabla}__huerfanas para revisarlas."""
+    def __init__(self, tabla, condition):
+        self.tabla = tabla
+        self.nueva = f"{tabla}__nueva"
+        self.huerfanas = f"{tabla}__huerfanas"
+        self.condition = condition
+
+    def __str__(self):
+        return f"reconstruir {self.tabla}"
+
+    def needed(self, db, conn):
+        return db.engine.backend.supports_pragmas and self.condition(conn, self.tabla)
+
+    def start(self, db, conn):
+        conn.execute(f"DROP TABLE IF EXISTS {self.nueva}")
+        conn.execute(f"CREATE TABLE {self.nueva} ({TABLE_DEFINITIONS[self.tabla]})")
+        actuales, _ = table_columns(conn, self.tabla)
+        nuevas, llave = table_columns(conn, self.nueva)
+        comunes = [columna for columna in actuales if columna in nuevas]
+        lista = ', '.join(comunes)
+        valores = ', '.join(f"NEW.{columna}" for columna in comunes)
+        donde = ' AND '.join(f"{columna} = OLD.{columna}" for columna in llave)
+        conn.execute(f'''
+            CREATE TRIGGER {COPY_TRIGGER_PREFIX}{self.tabla}_insert AFTER INSERT ON {self.tabla}
+            BEGIN INSERT OR REPLACE INTO {self.nueva} ({lista}) VALUES ({valores}); END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER {COPY_TRIGGER_PREFIX}{self.tabla}_update AFTER UPDATE ON {self.tabla}
+            BEGIN
+                DELETE FROM {self.nueva} WHERE {donde};
+                INSERT OR REPLACE INTO {self.nueva} ({lista}) VALUES ({valores});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER {COPY_TRIGGER_PREFIX}{self.tabla}_delete AFTER DELETE ON {self.tabla}
+            BEGIN DELETE FROM {self.nueva} WHERE {donde}; END
+        ''')
+
+    def _orphan_condition(self, conn, columnas):
+        """Condición SQL (sobre la tabla original, alias t) de las filas que violarían alguna llave foránea de la nueva"""
+        # Filas de foreign_key_list: (id, seq, tabla, desde, hacia, on_update, on_delete, match)
+        llaves = {}
+        for fk in conn.execute(f"PRAGMA foreign_key_list({self.nueva})").fetchall():
+            llaves.setdefault(fk[0], []).append(fk)
+        condiciones = []
+        for fks in llaves.values():
+            padre = fks[0][2]
+            if any(fk[3] not in columnas for fk in fks):
+                continue
+            hacia = [fk[4] for fk in fks]
+            if None in hacia:
+                hacia = table_columns(conn, padre)[1]
+            presentes = ' AND '.join(f"t.{fk[3]} IS NOT NULL" for fk in fks)
+            iguales = ' AND '.join(f"p.{columna} = t.{fk[3]}" for fk, columna in zip(fks, hacia))
+            condiciones.append(f"({presentes} AND NOT EXISTS (SELECT 1 FROM {padre} p WHERE {iguales}))")
+        return ' OR '.join(condiciones) or None
+
+    def _quarantine(self, conn, condicion, lista, llave, desde, hasta):
+        """Guarda las huérfanas del rango en {tabla}__huerfanas (sin duplicar reintentos); devuelve cuántas"""
+        rango = f"FROM {self.tabla} t WHERE t.rowid > ? AND t.rowid <= ? AND ({condicion})"
+        if not conn.execute(f"SELECT EXISTS (SELECT 1 {rango})", (desde, hasta)).fetchone()[0]:
+            return 0
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.huerfanas} AS SELECT {lista} FROM {self.tabla} WHERE 0")
+        repetida = ' AND '.join(f"h.{columna} = t.{columna}" for columna in llave)
+        nuevas = f"AND NOT EXISTS (SELECT 1 FROM {self.huerfanas} h WHERE {repetida})" if llave else ""
+        return conn.execute(f'''
+            INSERT INTO {self.huerfanas} ({lista})
+            SELECT {lista} {rango} {nuevas}
+        ''', (desde, hasta)).rowcount
+
+    def batch(self, db, conn, desde, size):
+        """Copia el siguiente rango de rowid sin pisar lo que ya replicaron los triggers ni copiar huérfanas"""
+        hasta = conn.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {self.tabla} WHERE rowid > ? ORDER BY rowid LIMIT ?) lote",
+            (desde, size)
+        ).fetchone()[0]
+        if hasta is None:
+            return None
+        actuales, llave = table_columns(conn, self.tabla)
+        nuevas, _ = table_columns(conn, self.nueva)
+        comunes = [columna for columna in actuales if columna in nuevas]
+        lista = ', '.join(comunes)
+        condicion = self._orphan_condition(conn, comunes)
+        filtro = ""
+        if condicion:
+            filtro = f"AND NOT ({condicion})"
+            apartadas = self._quarantine(conn, condicion, lista, llave, desde, hasta)
+            if apartadas:
+                logger.warning("%s: %s filas huérfanas apartadas en %s", self, apartadas, self.huerfanas)
+        conn.execute(f'''
+            INSERT OR IGNORE INTO {self.nueva} ({lista})
+            SELECT {lista} FROM {self.tabla} t
+            WHERE t.rowid > ? AND t.rowid <= ? {filtro}
+        ''', (desde, hasta))
+        return hasta
+
+    def finish(self, db, marcar):
+        """Intercambia las tablas (transacción corta) y después recrea los índices"""
+        with db.write_connection() as conn:
+            extras = conn.execute(
+                "SELECT type, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL AND name NOT LIKE ?",
+                (self.tabla, f"{COPY_TRIGGER_PREFIX}%")
+            ).fetchall()
+            # foreign_keys no se puede cambiar dentro de una transacción: se confirma lo pendiente
+            conn.commit()
+            conn.execute("PRAGMA foreign_keys = OFF")
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if not marcar(conn):
+                    conn.rollback()
+                    return
+                secuencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.tabla,)).fetchone()
+                conn.execute(f"DROP TABLE {self.tabla}")
+                conn.execute(f"ALTER TABLE {self.nueva} RENAME TO {self.tabla}")
+                for tipo, sql in extras:
+                    if tipo == 'trigger':
+                        conn.execute(sql)
+                if secuencia:
+                    # AUTOINCREMENT no reutiliza ids de filas que se borraron antes de la copia
+                    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (secuencia[0], self.tabla))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("PRAGMA foreign_keys = ON")
+        for tipo, sql in extras:
+            if tipo == 'index':
+                with db.write_connection() as conn:
+                    conn.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)
+                                 .replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX IF NOT EXISTS", 1))
+
+    def abort(self, db):
+        """Retira los triggers de copia y la tabla nueva: la original queda como estaba"""
+        with db.write_connection() as conn:
+            for operacion in ('insert', 'update', 'delete'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {COPY_TRIGGER_PREFIX}{self.tabla}_{operacion}")
+            conn.execute(f"DROP TABLE IF EXISTS {self.nueva}")
+
+
+class DropColumns(OnlineRebuild):
+    """Elimina columnas: en SQLite reconstruyendo la tabla (no admite DROP COLUMN con CHECK), en los demás con ALTER"""
+    def __init__(self, tabla, columnas):
+        super().__init__(tabla, lambda conn, tabla: has_columns(conn, tabla, columnas))
+        self.columnas = columnas
+
+    def __str__(self):
+        return f"eliminar {', '.join(self.columnas)} de {self.tabla}"
+
+    def needed(self, db, conn):
+        return self.condition(conn, self.tabla)
+
+    def start(self, db, conn):
+        if db.engine.backend.supports_pragmas:
+            super().start(db, conn)
+
+    def batch(self, db, conn, desde, size):
+        if db.engine.backend.supports_pragmas:
+            return super().batch(db, conn, desde, size)
+        return None
+
+    def finish(self, db, marcar):
+        if db.engine.backend.supports_pragmas:
+            return super().finish(db, marcar)
+        with db.write_connection() as conn:
+            if marcar(conn):
+                for columna in self.columnas:
+                    conn.execute(f"ALTER TABLE {self.tabla} DROP COLUMN IF EXISTS {columna}")
+
+    def abort(self, db):
+        if db.engine.backend.supports_pragmas:
+            super().abort(db)
+
+
+def lacks_cascade(conn, tabla):
+    """La tabla fue creada antes de usar ON DELETE CASCADE hacia usuarios"""
+    # Filas de foreign_key_list: (id, seq, tabla, desde, hacia, on_update, on_delete, match)
+    foreign_keys = conn.execute(f"PRAGMA foreign_key_list({tabla})").fetchall()
+    return any(fk[2] == 'usuarios' and fk[6] != 'CASCADE' for fk in foreign_keys)
+
+
+# Migraciones en orden: (versión, descripción, pasos). Una versión publicada no se modifica;
+# los cambios nuevos se agregan como una versión nueva al final.
+MIGRATIONS = [
+    (1, "Etiquetas de situación como códigos enteros", [
+        EncodeLabels('situacion_laboral', 'sector'),
+        EncodeLabels('situacion_laboral', 'salario_rango'),
+        EncodeLabels('situacion_academica', 'tipo_estudios'),
+        DropColumns('situacion_laboral', ['sector', 'salario_rango']),
+        DropColumns('situacion_academica', ['tipo_estudios'])
+    ]),
+    (2, "Borrado en cascada de los datos de cada usuario", [
+        OnlineRebuild(tabla, lacks_cascade)
+        for tabla in ('alumnos_egresados', 'situacion_academica', 'situacion_laboral', 'notificaciones',
+                      'ofertas_vistas', 'contadores_notificaciones', 'sesiones')
+    ])
+]
+
+
+class MigrationRunner:
+    """Aplica las migraciones pendientes por lotes, con pausas y avance persistente"""
+    _runners = {}
+    _runners_lock = threading.Lock()
+
+    def __init__(self, db, batch_size=MIGRATION_BATCH_SIZE, pause=MIGRATION_PAUSE_SECONDS):
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Ejecutor compartido por proceso; revisa periódicamente si hay migraciones pendientes"""
+        key = os.path.abspath(db.db_name)
+        with cls._runners_lock:
+            if key not in cls._runners:
+                runner = cls(db)
+                scheduler.schedule(f"migraciones:{key}", MIGRATION_CHECK_SECONDS, runner.run)
+                cls._runners[key] = runner
+            return cls._runners[key]
+
+    def _register(self):
+        with self.db.transaction() as tx:
+            tx.executemany(
+                "INSERT INTO schema_migrations (version, nombre) VALUES (?, ?) ON CONFLICT (version) DO NOTHING",
+                [(version, nombre) for version, nombre, _ in MIGRATIONS]
+            )
+
+    def _state(self, version):
+        return self.db.fetch_one("SELECT estado, paso, progreso FROM schema_migrations WHERE version = ?", (version,))
+
+    def _fail_step(self, version, indice, step, error):
+        """Deshace lo parcial del paso; tras MIGRATION_MAX_ATTEMPTS fallas la migración queda como fallida"""
+        logger.exception("Migración %s: falló %s", version, step)
+        try:
+            step.abort(self.db)
+        except Exception:
+            logger.exception("Migración %s: no se pudo deshacer %s", version, step)
+        with self.db.transaction() as tx:
+            # Sin progreso: el siguiente intento empieza el paso desde cero
+            tx.execute('''
+                UPDATE schema_migrations
+                SET progreso = NULL, intentos = intentos + 1, error = ?,
+                    estado = CASE WHEN intentos + 1 >= ? THEN 'fallida' ELSE estado END
+                WHERE version = ? AND paso = ?
+            ''', (f"{step}: {error}"[:500], MIGRATION_MAX_ATTEMPTS, version, indice))
+
+    def _throttle(self):
+        """Pausa entre lotes; se alarga mientras la aplicación tenga escrituras esperando turno"""
+        time.sleep(self.pause)
+        limite = time.monotonic() + MIGRATION_MAX_YIELD_SECONDS
+        while self.db.engine.writer.pending and time.monotonic() < limite:
+            time.sleep(self.pause or 0.01)
+
+    def _advance(self, conn, version, paso, progreso, nuevo_paso, nuevo_progreso):
+        """Avance condicional: si otro proceso ya movió este paso, no se repite el trabajo"""
+        return conn.execute('''
+            UPDATE schema_migrations
+            SET estado = 'en_curso', paso = ?, progreso = ?, fecha_inicio = COALESCE(fecha_inicio, CURRENT_TIMESTAMP)
+            WHERE version = ? AND paso = ? AND progreso IS ?
+        ''', (nuevo_paso, nuevo_progreso, version, paso, progreso)).rowcount == 1
+
+    def _run_step(self, version, indice, step, progreso):
+        """Ejecuta un paso desde su avance guardado; False si otro proceso lo está aplicando o si falló"""
+        try:
+            return self._apply_step(version, indice, step, progreso)
+        except Exception as error:
+            self._fail_step(version, indice, step, error)
+            return False
+
+    def _apply_step(self, version, indice, step, progreso):
+        if progreso is None:
+            with self.db.write_connection() as conn:
+                if not self._advance(conn, version, indice, None, indice, 0):
+                    return False
+                if not step.needed(self.db, conn):
+                    self._advance(conn, version, indice, 0, indice + 1, None)
+                    return True
+                step.start(self.db, conn)
+            progreso = 0
+            logger.info("Migración %s: %s", version, step)
+
+        while True:
+            with self.db.write_connection() as conn:
+                hasta = step.batch(self.db, conn, progreso, self.batch_size)
+                if hasta is None:
+                    break
+                if not self._advance(conn, version, indice, progreso, indice, hasta):
+                    conn.rollback()
+                    return False
+            progreso = hasta
+            self.batches += 1
+            self._throttle()
+
+        step.finish(self.db, lambda conn: self._advance(conn, version, indice, progreso, indice + 1, None))
+        return True
+
+    def run(self):
+        """Aplica lo pendiente; devuelve las versiones completadas en esta ejecución"""
+        with self._lock:
+            self._register()
+            completadas = []
+            for version, nombre, pasos in MIGRATIONS:
+                estado, paso, progreso = self._state(version)
+                if estado == 'completa':
+                    continue
+                if estado == 'fallida':
+                    # Las siguientes pueden depender de esta: se espera a que se reintente
+                    return completadas
+                while paso < len(pasos):
+                    if not self._run_step(version, paso, pasos[paso], progreso):
+                        # Otro proceso avanzó este paso o falló: se retoma en la siguiente revisión
+                        return completadas
+                    estado, paso, progreso = self._state(version)
+                with self.db.transaction() as tx:
+                    tx.execute(
+                        "UPDATE schema_migrations SET estado = 'completa', fecha_fin = CURRENT_TIMESTAMP WHERE version = ? AND estado != 'completa'",
+                        (version,)
+                    )
+                logger.info("Migración %s completa: %s", version, nombre)
+                completadas.append(version)
+            return completadas
+
+    def retry(self, version):
+        """Vuelve a habilitar una migración fallida (por ejemplo, tras corregir los datos)"""
+        with self.db.transaction() as tx:
+            return tx.execute(
+                "UPDATE schema_migrations SET estado = 'en_curso', intentos = 0, error = NULL WHERE version = ? AND estado = 'fallida'",
+                (int(version),)
+            )
+
+    def failed(self):
+        """Migraciones fallidas: [(versión, error)]"""
+        return self.db.fetch_all("SELECT version, error FROM schema_migrations WHERE estado = 'fallida' ORDER BY version")
+
+    def pending(self):
+        """Versiones que aún no se completan"""
+        completas = {version for version, in self.db.fetch_all("SELECT version FROM schema_migrations WHERE estado = 'completa'")}
+        return [version for version, _, _ in MIGRATIONS if version not in completas]
+
+    def status(self):
+        """Avance de cada migración (con el paso actual y el último id copiado)"""
+        import pandas as pd
+        registradas = {fila[0]: fila for fila in self.db.fetch_all(
+            "SELECT version, nombre, estado, paso, progreso, intentos, error, fecha_inicio, fecha_fin FROM schema_migrations"
+        )}
+        return pd.DataFrame(
+            [registradas.get(version, (version, nombre, 'pendiente', 0, None, 0, None, None, None)) for version, nombre, _ in MIGRATIONS],
+            columns=['version', 'nombre', 'estado', 'paso', 'progreso', 'intentos', 'error', 'fecha_inicio', 'fecha_fin']
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema")
+    parser.add_argument("--db", default="nova_universitas.db", help="archivo de base de datos")
+    parser.add_argument("--batch", type=int, default=MIGRATION_BATCH_SIZE, help="filas por lote")
+    parser.add_argument("--pause", type=float, default=MIGRATION_PAUSE_SECONDS, help="segundos de pausa entre lotes")
+    parser.add_argument("--estado", action="store_true", help="solo mostrar el avance")
+    parser.add_argument("--reintentar", type=int, metavar="VERSION", help="habilitar de nuevo una migración fallida")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    db = DatabaseManager(args.db)
+    runner = MigrationRunner(db, args.batch, args.pause)
+    if args.reintentar is not None and not runner.retry(args.reintentar):
+        print(f"La migración {args.reintentar} no está marcada como fallida")
+    if not args.estado:
+        start = time.perf_counter()
+        completadas = runner.run()
+        print(f"Completadas: {completadas or 'ninguna'} en {time.perf_counter() - start:.2f} s ({runner.batches} lotes)")
+    print(runner.status().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
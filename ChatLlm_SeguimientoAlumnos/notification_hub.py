@@ -0,0 +1,85 @@
+import os
+import threading
+import scheduler
+
+# Intervalo con el que se revisa la secuencia de notificaciones escritas por otros procesos
+NOTIFICATION_POLL_SECONDS = float(os.getenv("NOTIFICATION_POLL_SECONDS", "2"))
+# Tiempo máximo que una sesión se mantiene escuchando cambios sin interacción
+LIVE_WINDOW_SECONDS = int(os.getenv("LIVE_WINDOW_SECONDS", "300"))
+
+
+class NotificationHub:
+    """Canal de cambios de notificaciones por matrícula, compartido por las sesiones del proceso"""
+    _hubs = {}
+    _hubs_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.sequence = None
+        self.etags = {}
+        self.published = 0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def for_database(cls, db):
+        """Canal compartido por proceso, con revisión periódica de la secuencia en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._hubs_lock:
+            if key not in cls._hubs:
+                hub = cls(db)
+                hub.poll()
+                scheduler.schedule(f"notificaciones-vivo:{key}", NOTIFICATION_POLL_SECONDS, hub.poll)
+                cls._hubs[key] = hub
+            return cls._hubs[key]
+
+    def poll(self):
+        """Publica las notificaciones con id mayor al último visto (incluye las de otros procesos)"""
+        if self.sequence is None:
+            self.sequence = self.last_id()
+            return
+        rows = self.db.fetch_all(
+            "SELECT id, matricula FROM notificaciones WHERE id > ? ORDER BY id",
+            (self.sequence,)
+        )
+        if rows:
+            self.sequence = rows[-1][0]
+            self.publish({matricula for _, matricula in rows})
+
+    def last_id(self, matricula=None):
+        """Último id de la secuencia de notificaciones (global o de un alumno)"""
+        if matricula is None:
+            result = self.db.fetch_one("SELECT COALESCE(MAX(id), 0) FROM notificaciones")
+        else:
+            result = self.db.fetch_one(
+                "SELECT COALESCE(MAX(id), 0) FROM notificaciones WHERE matricula = ?",
+                (matricula,)
+            )
+        return int(result[0]) if result else 0
+
+    def publish(self, matriculas):
+        """Avisa a las sesiones de estos alumnos que sus notificaciones cambiaron"""
+        with self._condition:
+            for matricula in matriculas:
+                self.etags[matricula] = self.etags.get(matricula, 0) + 1
+            self.published += 1
+            self._condition.notify_all()
+
+    def etag(self, matricula):
+        """Etiqueta de cambios del alumno (solo memoria, sin consultar la base)"""
+        with self._condition:
+            return self.etags.get(matricula, 0)
+
+    def wait(self, matricula, etag, timeout):
+        """Bloquea hasta que cambie la etiqueta del alumno o venza el tiempo; devuelve la etiqueta actual"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.etags.get(matricula, 0) != etag, timeout)
+            return self.etags.get(matricula, 0)
+
+    def new_notifications(self, matricula, after_id):
+        """Notificaciones del alumno con id mayor a after_id, más recientes primero"""
+        return self.db.execute_query('''
+            SELECT id, titulo, mensaje, fecha_envio, leida
+            FROM notificaciones
+            WHERE matricula = ? AND id > ?
+            ORDER BY id DESC
+        ''', (matricula, after_id))
@@ -0,0 +1,160 @@
+import os
+import threading
+from datetime import date, timedelta
+import scheduler
+from archive_manager import ArchiveManager
+
+# Notificaciones leídas con más de estos días salen de la tabla activa a su partición mensual
+NOTIFICATION_HOT_DAYS = int(os.getenv("NOTIFICATION_HOT_DAYS", "90"))
+# Notificaciones leídas con más de estos días se eliminan (particiones completas incluidas)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "180"))
+NOTIFICATION_MAINTENANCE_SECONDS = int(os.getenv("NOTIFICATION_MAINTENANCE_SECONDS", "86400"))
+# Páginas libres que se devuelven al sistema en cada compactación
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+NOTIFICATION_COLUMNS = 'id, matricula, oferta_id, titulo, mensaje, leida, archivada, fecha_envio'
+# Columnas agregadas después de crear las primeras particiones
+PARTITION_ADDED_COLUMNS = {'archivada': 'BOOLEAN DEFAULT 0'}
+
+
+class NotificationRetention:
+    """Retención, particionado mensual y compactación del historial de notificaciones"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.archive = ArchiveManager(db)
+        self.last_result = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Instancia compartida por proceso, con mantenimiento diario en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                retention = cls(db)
+                scheduler.schedule(f"notificaciones:{key}", NOTIFICATION_MAINTENANCE_SECONDS, retention.run)
+                cls._instances[key] = retention
+            return cls._instances[key]
+
+    def _partition_tables(self, conn):
+        """Periodos (AAAAMM) con partición de notificaciones creada"""
+        if self.archive.schema:
+            rows = conn.execute(
+                "SELECT name FROM archivo.sqlite_master WHERE type = 'table' AND name LIKE 'notificaciones_%'"
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT table_name FROM information_schema.tables WHERE table_name LIKE 'notificaciones_%'"
+            ).fetchall()
+        return sorted(name[len('notificaciones_'):] for name, in rows if name[len('notificaciones_'):].isdigit())
+
+    def _create_partition(self, tx, tabla):
+        tx.execute(f"CREATE TABLE IF NOT EXISTS {tabla} AS SELECT {NOTIFICATION_COLUMNS} FROM notificaciones WHERE 1 = 0")
+        existentes = {description[0] for description in tx.conn.execute(f"SELECT * FROM {tabla} LIMIT 0").description}
+        for columna, definicion in PARTITION_ADDED_COLUMNS.items():
+            if columna not in existentes:
+                tx.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+    def partition(self, dias=NOTIFICATION_HOT_DAYS):
+        """Mueve las notificaciones leídas antiguas a particiones mensuales; devuelve cuántas se movieron.
+
+        La copia se confirma en el archivo antes de borrar (en WAL, SQLite no confirma atómicamente
+        entre bases adjuntas): solo se borran las notificaciones que ya están en su partición, y una
+        ejecución interrumpida se completa en la siguiente sin duplicar filas."""
+        condition = f"leida = 1 AND fecha_envio < date('now', '-{int(dias)} days')"
+        periods = self.db.fetch_all(
+            f"SELECT DISTINCT strftime('%Y%m', fecha_envio) FROM notificaciones WHERE {condition}"
+        )
+        moved = 0
+        # Una transacción por mes para no retener el escritor durante todo el proceso
+        for periodo, in periods:
+            if not periodo:
+                continue
+            tabla = f"{self.archive.schema}notificaciones_{periodo}"
+            period_condition = f"{condition} AND strftime('%Y%m', fecha_envio) = ?"
+            with self.db.transaction() as tx:
+                self.archive.attach(tx.conn)
+                self._create_partition(tx, tabla)
+                tx.execute(f'''
+                    INSERT INTO {tabla} ({NOTIFICATION_COLUMNS})
+                    SELECT {NOTIFICATION_COLUMNS} FROM notificaciones
+                    WHERE {period_condition} AND id NOT IN (SELECT id FROM {tabla})
+                ''', (periodo,))
+            with self.db.transaction() as tx:
+                self.archive.attach(tx.conn)
+                moved += tx.execute(
+                    f"DELETE FROM notificaciones WHERE {period_condition} AND id IN (SELECT id FROM {tabla})",
+                    (periodo,)
+                )
+        return moved
+
+    def purge(self, dias=NOTIFICATION_RETENTION_DAYS):
+        """Elimina las notificaciones leídas fuera del periodo de retención; devuelve (filas, particiones)"""
+        cutoff = (date.today() - timedelta(days=int(dias))).strftime('%Y%m')
+        with self.db.transaction() as tx:
+            self.archive.attach(tx.conn)
+            deleted = tx.execute(
+                f"DELETE FROM notificaciones WHERE leida = 1 AND fecha_envio < date('now', '-{int(dias)} days')"
+            )
+            # Un mes completo fuera de retención se descarta de golpe, sin borrar fila por fila
+            expired = [periodo for periodo in self._partition_tables(tx.conn) if periodo < cutoff]
+            for periodo in expired:
+                tx.execute(f"DROP TABLE {self.archive.schema}notificaciones_{periodo}")
+        return deleted, len(expired)
+
+    def storage_stats(self):
+        """Páginas totales y libres de la base principal (None si el motor no las expone)"""
+        if not self.db.engine.backend.supports_pragmas:
+            return None
+        page_count = self.db.fetch_one("PRAGMA page_count")[0]
+        freelist = self.db.fetch_one("PRAGMA freelist_count")[0]
+        auto_vacuum = self.db.fetch_one("PRAGMA auto_vacuum")[0]
+        return {
+            'paginas': page_count,
+            'paginas_libres': freelist,
+            'auto_vacuum': {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}.get(auto_vacuum, auto_vacuum)
+        }
+
+    def compact(self, pages=VACUUM_PAGES):
+        """Devuelve al sistema hasta N páginas libres (requiere auto_vacuum INCREMENTAL)"""
+        stats = self.storage_stats()
+        if not stats or stats['auto_vacuum'] != 'INCREMENTAL':
+            return 0
+        with self.db.write_connection() as conn:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        return stats['paginas_libres'] - self.storage_stats()['paginas_libres']
+
+    def enable_incremental_vacuum(self):
+        """Convierte una base existente a auto_vacuum INCREMENTAL (VACUUM completo, una sola vez)"""
+        stats = self.storage_stats()
+        if not stats or stats['auto_vacuum'] == 'INCREMENTAL':
+            return False
+        with self.db.write_connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        return True
+
+    def partitions_summary(self):
+        """Notificaciones archivadas por periodo"""
+        with self.archive.reading() as conn:
+            if conn is None:
+                return []
+            return [
+                (periodo, conn.execute(f"SELECT COUNT(*) FROM {self.archive.schema}notificaciones_{periodo}").fetchone()[0])
+                for periodo in self._partition_tables(conn)
+            ]
+
+    def run(self):
+        """Mantenimiento completo: particionado, retención y compactación"""
+        with self._lock:
+            moved = self.partition()
+            deleted, dropped = self.purge()
+            freed = self.compact()
+            self.last_result = {
+                'movidas': moved, 'eliminadas': deleted,
+                'particiones_eliminadas': dropped, 'paginas_liberadas': freed
+            }
+            return self.last_result
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+import pandas as pd
+
+# Intervalo mínimo entre consultas del contador de versión (agrupa a todas las sesiones)
+FEED_CHECK_SECONDS = float(os.getenv("OFFER_FEED_CHECK_SECONDS", "2"))
+
+FEED_QUERY = '''
+    SELECT ot.*, e.nombre_empresa, e.sector, e.email_contacto
+    FROM ofertas_trabajo ot
+    JOIN empresas e ON ot.empresa_id = e.id
+    WHERE ot.activa = 1
+    ORDER BY ot.fecha_publicacion DESC, ot.id DESC
+'''
+
+
+class OfferFeed:
+    """Feed en memoria de ofertas activas, compartido por todas las sesiones del proceso"""
+    _feeds = {}
+    _feeds_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.version = None
+        self.offers = pd.DataFrame()
+        self.checked_at = 0.0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        key = os.path.abspath(db.db_name)
+        with cls._feeds_lock:
+            if key not in cls._feeds:
+                cls._feeds[key] = cls(db)
+            return cls._feeds[key]
+
+    def get_offers(self):
+        """Ofertas activas, más recientes primero; se recargan solo si cambió ofertas_trabajo/empresas"""
+        if time.monotonic() - self.checked_at >= FEED_CHECK_SECONDS:
+            with self._lock:
+                if time.monotonic() - self.checked_at >= FEED_CHECK_SECONDS:
+                    version = self.db.get_table_version('ofertas_trabajo', 'empresas')
+                    # Sin triggers de versión no hay forma de detectar cambios: se recarga en cada revisión
+                    if version != self.version or not self.db.engine.backend.supports_triggers:
+                        offers = self.db.execute_query(FEED_QUERY)
+                        if not offers.empty:
+                            offers['fecha_publicacion_dt'] = pd.to_datetime(offers['fecha_publicacion'])
+                        self.offers = offers
+                        self.version = version
+                        self.reloads += 1
+                    self.checked_at = time.monotonic()
+        return self.offers
+
+    def new_offer_ids(self, matricula):
+        """Ids de ofertas activas publicadas después de la última vista por el alumno"""
+        seen = self.db.fetch_one(
+            "SELECT ultima_fecha, ultimo_id FROM ofertas_vistas WHERE matricula = ?",
+            (matricula,)
+        )
+        if seen is None:
+            # Sin cursor todas son nuevas (una fecha vacía no es comparable con TIMESTAMP en PostgreSQL)
+            result = self.db.execute_query("SELECT id FROM ofertas_trabajo WHERE activa = 1")
+        else:
+            result = self.db.execute_query('''
+                SELECT id FROM ofertas_trabajo
+                WHERE activa = 1 AND (fecha_publicacion, id) > (?, ?)
+            ''', seen)
+        return set() if result.empty else set(result['id'].tolist())
+
+    def mark_seen(self, matricula):
+        """Avanza el cursor del alumno hasta la oferta más reciente del feed"""
+        offers = self.get_offers()
+        if offers.empty:
+            return
+        newest = offers.iloc[0]
+        self.db.execute_query('''
+            INSERT INTO ofertas_vistas (matricula, ultima_fecha, ultimo_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (matricula) DO UPDATE
+            SET ultima_fecha = excluded.ultima_fecha, ultimo_id = excluded.ultimo_id
+        ''', (matricula, str(newest['fecha_publicacion']), int(newest['id'])))
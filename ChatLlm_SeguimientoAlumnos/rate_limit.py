@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+import scheduler
+
+# Intentos permitidos por ventana deslizante
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_ATTEMPTS_MATRICULA = int(os.getenv("LOGIN_MAX_ATTEMPTS_MATRICULA", "5"))
+LOGIN_MAX_ATTEMPTS_CLIENT = int(os.getenv("LOGIN_MAX_ATTEMPTS_CLIENT", "20"))
+# Intentos sin ninguna dirección (fuera del servidor, p. ej. pruebas), contados juntos
+LOGIN_MAX_ATTEMPTS_UNKNOWN_CLIENT = int(os.getenv("LOGIN_MAX_ATTEMPTS_UNKNOWN_CLIENT", "100"))
+# Proxies propios delante de la aplicación: cada uno agrega un salto al final de X-Forwarded-For,
+# así que la IP del cliente es el salto número N contando desde la derecha. Por omisión 0: sin
+# proxy la cabecera la escribe el cliente y se usa la dirección de la conexión; se activa a propósito
+LOGIN_TRUSTED_PROXIES = int(os.getenv("LOGIN_TRUSTED_PROXIES", "0"))
+# Verificaciones bcrypt simultáneas: las demás esperan turno en lugar de ocupar todos los núcleos
+LOGIN_MAX_CONCURRENT_CHECKS = int(os.getenv("LOGIN_MAX_CONCURRENT_CHECKS", str(max(1, (os.cpu_count() or 2) // 2))))
+LOGIN_CHECK_WAIT_SECONDS = float(os.getenv("LOGIN_CHECK_WAIT_SECONDS", "5"))
+# Matrículas inexistentes recordadas (hasta que cambie la tabla usuarios)
+NEGATIVE_CACHE_SIZE = int(os.getenv("LOGIN_NEGATIVE_CACHE_SIZE", "10000"))
+
+# Hash de referencia (mismo costo que bcrypt.gensalt() por defecto) para que una matrícula
+# inexistente cueste lo mismo que una contraseña incorrecta; fijo para no calcularlo al importar
+DUMMY_HASH = b"$2b$12$m7u8939dp/ZksiZrK3WyhedzW833aneM6HLBH62JJEx2yq.5H1QGe"
+
+
+def client_address(forwarded, trusted_proxies=LOGIN_TRUSTED_PROXIES):
+    """IP del cliente según X-Forwarded-For, o None si no hay una dirección confiable.
+
+    Los primeros saltos los escribe el propio cliente y se pueden falsificar: solo cuentan
+    los que agregaron nuestros proxies, desde la derecha"""
+    if not forwarded or trusted_proxies < 1:
+        return None
+    hops = [hop.strip() for hop in forwarded.split(',')]
+    if len(hops) < trusted_proxies:
+        return None
+    return hops[-trusted_proxies] or None
+
+
+class SlidingWindowLimiter:
+    """Cuenta los intentos de cada clave dentro de los últimos `window` segundos"""
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Registra un intento; devuelve 0 si se permite o los segundos que faltan para reintentar"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            hits = self.hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self.hits.pop(key, None)
+
+    def prune(self):
+        """Descarta las claves sin intentos dentro de la ventana (memoria acotada)"""
+        limite = time.monotonic() - self.window
+        with self._lock:
+            vencidas = [key for key, hits in self.hits.items() if not hits or hits[-1] <= limite]
+            for key in vencidas:
+                del self.hits[key]
+        return len(vencidas)
+
+
+class LoginGuard:
+    """Autenticación con límite de intentos, caché negativa y verificaciones bcrypt acotadas"""
+    _guards = {}
+    _guards_lock = threading.Lock()
+
+    def __init__(self, db, max_matricula=LOGIN_MAX_ATTEMPTS_MATRICULA, max_cliente=LOGIN_MAX_ATTEMPTS_CLIENT,
+                 max_checks=LOGIN_MAX_CONCURRENT_CHECKS, max_sin_direccion=LOGIN_MAX_ATTEMPTS_UNKNOWN_CLIENT):
+        self.db = db
+        self.por_matricula = SlidingWindowLimiter(max_matricula, LOGIN_WINDOW_SECONDS)
+        self.por_cliente = SlidingWindowLimiter(max_cliente, LOGIN_WINDOW_SECONDS)
+        self.sin_direccion = SlidingWindowLimiter(max_sin_direccion, LOGIN_WINDOW_SECONDS)
+        self.unknown = OrderedDict()
+        self.unknown_version = None
+        self.max_checks = max_checks
+        self.checks = threading.BoundedSemaphore(max_checks)
+        self.metrics = {
+            'intentos': 0,
+            'exitosos': 0,
+            'fallidos': 0,
+            'bloqueados_matricula': 0,
+            'bloqueados_cliente': 0,
+            'bloqueados_sin_direccion': 0,
+            'saturados': 0,
+            'cache_negativa': 0,
+            'verificaciones_bcrypt': 0,
+            'verificaciones_simuladas': 0,
+            'bcrypt_total_s': 0.0
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        key = os.path.abspath(db.db_name)
+        with cls._guards_lock:
+            if key not in cls._guards:
+                guard = cls(db)
+                scheduler.schedule(f"limite-login:{key}", LOGIN_WINDOW_SECONDS, guard.prune)
+                cls._guards[key] = guard
+            return cls._guards[key]
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self.metrics[metric] += value
+
+    def _is_unknown(self, matricula):
+        """Consulta la caché negativa; se vacía cuando cambia la tabla usuarios"""
+        version = self.db.get_table_version('usuarios')
+        with self._lock:
+            if version != self.unknown_version or not self.db.engine.backend.supports_triggers:
+                self.unknown.clear()
+                self.unknown_version = version
+            if matricula in self.unknown:
+                self.unknown.move_to_end(matricula)
+                return True
+            return False
+
+    def _remember_unknown(self, matricula):
+        with self._lock:
+            self.unknown[matricula] = True
+            if len(self.unknown) > NEGATIVE_CACHE_SIZE:
+                self.unknown.popitem(last=False)
+
+    def _check_password(self, password, hashed):
+        """bcrypt dentro del semáforo; None si no hubo turno a tiempo"""
+        if not self.checks.acquire(timeout=LOGIN_CHECK_WAIT_SECONDS):
+            self._count('saturados')
+            return None
+        start = time.perf_counter()
+        try:
+            return self.db.verify_password(password, hashed)
+        finally:
+            self.checks.release()
+            self._count('bcrypt_total_s', time.perf_counter() - start)
+
+    def authenticate(self, matricula, password, client):
+        """(usuario o None, segundos de espera si el intento fue bloqueado).
+
+        client: IP del cliente (proxy confiable o conexión) o None; sin ella los intentos comparten un límite"""
+        self._count('intentos')
+        if client is None:
+            retry_after = self.sin_direccion.hit(None)
+            if retry_after:
+                self._count('bloqueados_sin_direccion')
+                return None, retry_after
+        else:
+            retry_after = self.por_cliente.hit(client)
+            if retry_after:
+                self._count('bloqueados_cliente')
+                return None, retry_after
+        retry_after = self.por_matricula.hit(matricula)
+        if retry_after:
+            self._count('bloqueados_matricula')
+            return None, retry_after
+
+        if self._is_unknown(matricula):
+            self._count('cache_negativa')
+            record = None
+        else:
+            record = self.db.get_login_record(matricula)
+            if record is None:
+                self._remember_unknown(matricula)
+
+        if record is None:
+            # Mismo trabajo que una contraseña incorrecta: no revela qué matrículas existen
+            self._count('verificaciones_simuladas')
+            if self._check_password(password, DUMMY_HASH) is None:
+                # Misma espera que con una matrícula existente cuando no hay turno para bcrypt
+                return None, LOGIN_CHECK_WAIT_SECONDS
+            self._count('fallidos')
+            return None, 0
+
+        self._count('verificaciones_bcrypt')
+        valid = self._check_password(password, record['password'])
+        if valid is None:
+            return None, LOGIN_CHECK_WAIT_SECONDS
+        if not valid:
+            self._count('fallidos')
+            return None, 0
+
+        self.por_matricula.reset(matricula)
+        self._count('exitosos')
+        return {key: value for key, value in record.items() if key != 'password'}, 0
+
+    def prune(self):
+        return self.por_matricula.prune() + self.por_cliente.prune() + self.sin_direccion.prune()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['bcrypt_total_s'] = round(stats['bcrypt_total_s'], 3)
+            stats['matriculas_inexistentes'] = len(self.unknown)
+        stats['claves_matricula'] = len(self.por_matricula.hits)
+        stats['claves_cliente'] = len(self.por_cliente.hits)
+        return stats
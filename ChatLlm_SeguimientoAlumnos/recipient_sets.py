@@ -0,0 +1,60 @@
+import os
+import threading
+
+# Audiencias predefinidas: consulta de matrículas (por índice) y tablas que invalidan el conjunto
+AUDIENCE_QUERIES = {
+    'todos': "SELECT matricula FROM usuarios WHERE tipo_usuario = 'alumno' ORDER BY matricula",
+    'carrera': "SELECT matricula FROM alumnos_egresados WHERE carrera_id = ? ORDER BY matricula",
+    'anio': "SELECT matricula FROM alumnos_egresados WHERE anio_egreso = ? ORDER BY matricula"
+}
+AUDIENCE_TABLES = ('usuarios', 'alumnos_egresados')
+
+
+class RecipientSets:
+    """Conjuntos de destinatarios materializados como tuplas de matrículas, reutilizados entre campañas"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.sets = {}
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        key = os.path.abspath(db.db_name)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(db)
+            return cls._instances[key]
+
+    def get(self, audiencia, valor=None):
+        """Matrículas de la audiencia; se recalcula solo si cambiaron usuarios o egresados"""
+        version = self.db.get_table_version(*AUDIENCE_TABLES)
+        with self._lock:
+            if version != self.version or not self.db.engine.backend.supports_triggers:
+                self.sets = {}
+                self.version = version
+            key = (audiencia, valor)
+            if key in self.sets:
+                self.hits += 1
+                return self.sets[key]
+        params = None if valor is None else (valor,)
+        matriculas = tuple(matricula for matricula, in self.db.fetch_all(AUDIENCE_QUERIES[audiencia], params))
+        with self._lock:
+            self.misses += 1
+            if self.version == version:
+                self.sets[key] = matriculas
+        return matriculas
+
+    def send(self, matriculas, titulo, mensaje, oferta_id=None):
+        """Inserta la notificación para todas las matrículas en una sola transacción"""
+        with self.db.transaction() as tx:
+            tx.executemany(
+                "INSERT INTO notificaciones (matricula, titulo, mensaje, oferta_id) VALUES (?, ?, ?, ?)",
+                [(matricula, titulo, mensaje, oferta_id) for matricula in matriculas]
+            )
+        return len(matriculas)
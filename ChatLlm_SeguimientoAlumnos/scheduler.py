@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """Tarea periódica que corre en un hilo de fondo del proceso"""
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.runs = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"job-{name}", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_now()
+
+    def run_now(self):
+        """Ejecuta la tarea inmediatamente registrando su resultado"""
+        start = time.perf_counter()
+        try:
+            self.func()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("Error en la tarea programada %s", self.name)
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_duration = time.perf_counter() - start
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def schedule(name, interval, func):
+    """Programa func cada interval segundos; cada nombre se registra una sola vez por proceso"""
+    with _jobs_lock:
+        if name not in _jobs:
+            job = ScheduledJob(name, interval, func)
+            job.start()
+            _jobs[name] = job
+        return _jobs[name]
+
+
+def cancel(name):
+    """Detiene una tarea programada"""
+    with _jobs_lock:
+        job = _jobs.pop(name, None)
+    if job:
+        job.stop()
+
+
+def get_jobs():
+    """Estado de las tareas programadas en este proceso"""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [{
+        'tarea': job.name,
+        'intervalo_s': job.interval,
+        'ejecuciones': job.runs,
+        'ultima_ejecucion': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(job.last_run)) if job.last_run else None,
+        'duracion_s': round(job.last_duration, 3) if job.last_duration is not None else None,
+        'error': job.last_error
+    } for job in jobs]
@@ -0,0 +1,334 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+import unicodedata
+import scheduler
+
+SEARCH_SYNC_SECONDS = int(os.getenv("SEARCH_SYNC_SECONDS", "30"))
+# Filas que se aplican por cada toma del candado del índice
+SEARCH_BATCH_SIZE = 50000
+# Coincidencias que se ordenan por relevancia (al juntarlas se deja de recorrer el índice)
+SEARCH_RANK_LIMIT = 500
+# Documentos que se recorren uno a uno; con listas más largas se siguen cruzando trigramas
+SEARCH_SCAN_LIMIT = 2000
+
+# Entidades indexadas: consulta (clave, título, detalle) y tablas cuyo cambio obliga a sincronizar
+SEARCH_SOURCES = {
+    'egresado': {
+        'query': '''
+            SELECT ae.matricula, ae.nombre || ' ' || ae.apellidos, COALESCE(c.nombre_carrera, '')
+            FROM alumnos_egresados ae
+            LEFT JOIN carreras c ON ae.carrera_id = c.id
+        ''',
+        'key': 'ae.matricula',
+        'tables': ('alumnos_egresados', 'carreras')
+    },
+    'usuario': {
+        'query': '''
+            SELECT matricula, nombre || ' ' || apellidos, tipo_usuario || ' · ' || COALESCE(email, '')
+            FROM usuarios
+        ''',
+        'key': 'matricula',
+        'tables': ('usuarios',)
+    },
+    'empresa': {
+        'query': '''
+            SELECT CAST(id AS TEXT), nombre_empresa, COALESCE(sector, '') || ' · ' || COALESCE(email_contacto, '')
+            FROM empresas
+        ''',
+        'key': 'CAST(id AS TEXT)',
+        'tables': ('empresas',)
+    },
+    'oferta': {
+        'query': '''
+            SELECT CAST(ot.id AS TEXT), ot.titulo_puesto, COALESCE(e.nombre_empresa, '') || ' · ' || COALESCE(ot.ubicacion, '')
+            FROM ofertas_trabajo ot
+            LEFT JOIN empresas e ON ot.empresa_id = e.id
+        ''',
+        'key': 'CAST(ot.id AS TEXT)',
+        'tables': ('ofertas_trabajo', 'empresas')
+    }
+}
+
+TIPO_ORDER = {tipo: orden for orden, tipo in enumerate(SEARCH_SOURCES)}
+
+# Intervalo mínimo entre revisiones de versión del índice de matrículas
+MATRICULA_CHECK_SECONDS = float(os.getenv("MATRICULA_CHECK_SECONDS", "2"))
+
+# Fuentes de matrículas para sugerencias: consulta (matrícula, nombre) y tablas que la invalidan
+MATRICULA_SOURCES = {
+    'egresados': ("SELECT matricula, nombre || ' ' || apellidos FROM alumnos_egresados", ('alumnos_egresados',)),
+    'usuarios': ("SELECT matricula, nombre || ' ' || apellidos FROM usuarios", ('usuarios',))
+}
+
+
+def normalize(texto):
+    """Minúsculas y sin acentos, para comparar sin importar cómo se escribió"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """Índice en memoria (trigramas + prefijos) sobre egresados, usuarios, empresas y ofertas"""
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.docs = {}
+        self.keys = {}
+        self.trigram_postings = {}
+        self.token_postings = {}
+        self.sorted_tokens = []
+        self.versions = {}
+        self.ready = False
+        self.builds = 0
+        self._next_id = 0
+        self._token_changes = []
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Índice compartido por proceso; se construye al inicio en segundo plano y se sincroniza periódicamente"""
+        key = os.path.abspath(db.db_name)
+        with cls._indexes_lock:
+            if key not in cls._indexes:
+                index = cls(db)
+                threading.Thread(target=index.sync, name="search-index-build", daemon=True).start()
+                scheduler.schedule(f"busqueda:{key}", SEARCH_SYNC_SECONDS, index.sync)
+                cls._indexes[key] = index
+            return cls._indexes[key]
+
+    def _add(self, tipo, clave, titulo, detalle):
+        cabecera = normalize(f"{clave} {titulo}")
+        texto = f"{cabecera} {normalize(detalle)}"
+        doc_id = self._next_id
+        self._next_id += 1
+        self.docs[doc_id] = (tipo, clave, titulo, detalle, texto, cabecera)
+        self.keys[(tipo, clave)] = doc_id
+        for token in set(texto.split()):
+            postings = self.token_postings.get(token)
+            if postings is None:
+                postings = self.token_postings[token] = set()
+                self._token_changes.append((token, True))
+            postings.add(doc_id)
+            for gram in trigrams(token):
+                self.trigram_postings.setdefault(gram, set()).add(doc_id)
+
+    def _remove(self, tipo, clave):
+        doc_id = self.keys.pop((tipo, clave), None)
+        if doc_id is None:
+            return
+        texto = self.docs.pop(doc_id)[4]
+        for token in set(texto.split()):
+            postings = self.token_postings[token]
+            postings.discard(doc_id)
+            if not postings:
+                del self.token_postings[token]
+                self._token_changes.append((token, False))
+            for gram in trigrams(token):
+                gram_postings = self.trigram_postings[gram]
+                gram_postings.discard(doc_id)
+                if not gram_postings:
+                    del self.trigram_postings[gram]
+
+    def _apply(self, tipo, rows, claves=None):
+        """Aplica filas leídas de la base: agrega o reemplaza las que cambiaron y quita las ausentes"""
+        found = set()
+        # Por lotes, para que las búsquedas no esperen toda una carga completa
+        for start in range(0, len(rows), SEARCH_BATCH_SIZE):
+            with self._lock:
+                for clave, titulo, detalle in rows[start:start + SEARCH_BATCH_SIZE]:
+                    found.add(clave)
+                    doc_id = self.keys.get((tipo, clave))
+                    if doc_id is not None:
+                        if self.docs[doc_id][2:4] == (titulo, detalle):
+                            continue
+                        self._remove(tipo, clave)
+                    self._add(tipo, clave, titulo, detalle)
+                self._merge_tokens()
+        with self._lock:
+            if claves is None:
+                claves = [clave for doc_tipo, clave in self.keys if doc_tipo == tipo]
+            for clave in claves:
+                if clave not in found:
+                    self._remove(tipo, clave)
+            self._merge_tokens()
+
+    def _has_token(self, token):
+        position = bisect.bisect_left(self.sorted_tokens, token)
+        return position < len(self.sorted_tokens) and self.sorted_tokens[position] == token
+
+    def _merge_tokens(self):
+        """Lleva los cambios de vocabulario a la lista ordenada de palabras usada para prefijos"""
+        changes, self._token_changes = self._token_changes, []
+        final = dict(changes)
+        added = sorted(token for token, present in final.items()
+                       if present and token in self.token_postings and not self._has_token(token))
+        removed = {token for token, present in final.items() if not present and token not in self.token_postings}
+        if len(added) + len(removed) > 1000:
+            # En cargas masivas: una sola pasada; dos tramos ordenados se mezclan en tiempo lineal
+            tokens = [token for token in self.sorted_tokens if token not in removed] if removed else self.sorted_tokens
+            self.sorted_tokens = sorted(tokens + added)
+            return
+        for token in removed:
+            if self._has_token(token):
+                del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+        for token in added:
+            bisect.insort(self.sorted_tokens, token)
+
+    def refresh(self, tipo, claves):
+        """Actualiza registros concretos tras una escritura (incluye los que se eliminaron)"""
+        claves = [str(clave) for clave in claves]
+        if not claves:
+            return
+        source = SEARCH_SOURCES[tipo]
+        placeholders = ', '.join('?' for _ in claves)
+        rows = self.db.fetch_all(f"{source['query']} WHERE {source['key']} IN ({placeholders})", claves)
+        self._apply(tipo, rows, claves)
+
+    def sync(self):
+        """Relee las entidades cuyas tablas cambiaron (cubre escrituras sin gancho y de otros procesos)"""
+        with self._sync_lock:
+            supports_triggers = self.db.engine.backend.supports_triggers
+            for tipo, source in SEARCH_SOURCES.items():
+                version = self.db.get_table_version(*source['tables'])
+                if supports_triggers and self.versions.get(tipo) == version:
+                    continue
+                self._apply(tipo, self.db.fetch_all(source['query']))
+                self.versions[tipo] = version
+            self.builds += 1
+            self.ready = True
+
+    def _prefix_ids(self, term, cap):
+        """Documentos con alguna palabra que empieza con el término (hasta cap)"""
+        ids = set()
+        start = bisect.bisect_left(self.sorted_tokens, term)
+        for position in range(start, len(self.sorted_tokens)):
+            token = self.sorted_tokens[position]
+            if not token.startswith(term) or len(ids) >= cap:
+                break
+            ids |= self.token_postings.get(token, set())
+        return ids
+
+    def search(self, texto, limit=20, tipos=None):
+        """Resultados (tipo, clave, título, detalle) que contienen todos los términos, más relevantes primero"""
+        terms = sorted(set(normalize(texto).split()), key=len, reverse=True)
+        if not terms:
+            return []
+        with self._lock:
+            # Primero el trigrama más raro de cada término y después los demás; los términos cortos solo se verifican
+            rarest, rest = [], []
+            for term in terms:
+                if len(term) >= 3:
+                    grams = sorted((self.trigram_postings.get(gram, set()) for gram in trigrams(term)), key=len)
+                    rarest.append(grams[0])
+                    rest.extend(grams[1:])
+            postings = sorted(rarest, key=len) + sorted(rest, key=len)
+            if postings:
+                # Se cruzan listas (en C) solo mientras la base siga siendo larga
+                base = postings[0]
+                for gram_postings in postings[1:]:
+                    if len(base) <= SEARCH_SCAN_LIMIT:
+                        break
+                    base = base & gram_postings
+            else:
+                base = self._prefix_ids(terms[0], SEARCH_SCAN_LIMIT)
+
+            # Se recorre la lista más corta confirmando cada término y se corta al juntar suficientes
+            pool = []
+            for doc_id in base:
+                doc = self.docs[doc_id]
+                if tipos and doc[0] not in tipos:
+                    continue
+                texto_doc = doc[4]
+                if all(term in texto_doc if len(term) >= 3 else texto_doc.startswith(term) or f" {term}" in texto_doc
+                       for term in terms):
+                    pool.append(doc)
+                    if len(pool) >= SEARCH_RANK_LIMIT:
+                        break
+
+        # Primero palabras de la clave o del título que empiezan con el término, luego por tipo y título
+        term = terms[-1]
+        ranked = heapq.nsmallest(limit, pool, key=lambda doc: (
+            not (doc[5].startswith(term) or f" {term}" in doc[5]),
+            TIPO_ORDER[doc[0]], doc[2]
+        ))
+        return [doc[:4] for doc in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documentos': len(self.docs),
+                'palabras': len(self.token_postings),
+                'trigramas': len(self.trigram_postings),
+                'sincronizaciones': self.builds
+            }
+
+    def timed_search(self, texto, limit=20, tipos=None):
+        """Búsqueda que devuelve también su duración en milisegundos"""
+        start = time.perf_counter()
+        results = self.search(texto, limit, tipos)
+        return results, (time.perf_counter() - start) * 1000
+
+
+class MatriculaIndex:
+    """Matrículas ordenadas para sugerir por prefijo con bisect, sin consultar la base en cada tecla"""
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, db, fuente):
+        self.db = db
+        self.fuente = fuente
+        # Arreglos paralelos (claves normalizadas para bisect, matrícula original, nombre), reemplazados juntos
+        self.arrays = ([], [], [])
+        self.version = None
+        self.checked_at = 0.0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db, fuente='egresados'):
+        key = (os.path.abspath(db.db_name), fuente)
+        with cls._indexes_lock:
+            if key not in cls._indexes:
+                cls._indexes[key] = cls(db, fuente)
+            return cls._indexes[key]
+
+    def _ensure_fresh(self):
+        """Recarga el arreglo si cambió la tabla (revisando la versión a lo más cada pocos segundos)"""
+        if time.monotonic() - self.checked_at < MATRICULA_CHECK_SECONDS:
+            return
+        with self._lock:
+            if time.monotonic() - self.checked_at < MATRICULA_CHECK_SECONDS:
+                return
+            query, tablas = MATRICULA_SOURCES[self.fuente]
+            version = self.db.get_table_version(*tablas)
+            if version != self.version or not self.db.engine.backend.supports_triggers:
+                rows = sorted((str(matricula).upper(), matricula, nombre) for matricula, nombre in self.db.fetch_all(query))
+                self.arrays = ([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+                self.version = version
+                self.reloads += 1
+            self.checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Fuerza la revisión de versión en la siguiente consulta (tras una escritura)"""
+        self.checked_at = 0.0
+
+    def suggest(self, prefix, limit=20):
+        """Hasta limit pares (matrícula, nombre) cuya matrícula empieza con el prefijo"""
+        self._ensure_fresh()
+        prefix = str(prefix).strip().upper()
+        if not prefix:
+            return []
+        keys, matriculas, nombres = self.arrays
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', start)
+        return [(matriculas[i], nombres[i]) for i in range(start, min(end, start + limit))]
@@ -0,0 +1,298 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import scheduler
+
+# Almacén de sesiones: sqlite (tabla sesiones, por defecto), archivo o kv
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").lower()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(8 * 3600)))
+# Vigencia de cada token (viaja en la URL): se renueva con el uso hasta que vence la sesión
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", "900"))
+SESSION_PURGE_SECONDS = int(os.getenv("SESSION_PURGE_SECONDS", "3600"))
+SESSION_DIR = os.getenv("SESSION_DIR", ".sesiones")
+# Todos los procesos deben compartir el secreto; si no se define se genera uno junto a la base
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+
+
+def load_secret(db_name):
+    """Secreto para firmar tokens: SESSION_SECRET o un archivo creado una sola vez junto a la base"""
+    if SESSION_SECRET:
+        return SESSION_SECRET.encode('utf-8')
+    path = os.path.join(os.path.dirname(os.path.abspath(db_name)), ".session_secret")
+    try:
+        # O_EXCL: si dos procesos arrancan a la vez, solo uno escribe el secreto
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    for _ in range(50):
+        with open(path) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode('utf-8')
+        # El otro proceso todavía no termina de escribirlo
+        time.sleep(0.01)
+    raise RuntimeError(f"No se pudo leer el secreto de sesiones en {path}")
+
+
+class SessionTokens:
+    """Tokens firmados con HMAC-SHA256: id de sesión, expiración y firma.
+
+    La firma incluye la huella del cliente (dirección y navegador) sin que viaje en el token:
+    un token copiado de la URL (historial, Referer, registros del proxy) no sirve desde otro cliente"""
+    def __init__(self, secret):
+        self.secret = secret
+
+    def _sign(self, payload, client):
+        digest = hmac.new(self.secret, f"{payload}.{client}".encode('utf-8'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def issue(self, session_id, expira, client=''):
+        payload = f"{session_id}.{expira}"
+        return f"{payload}.{self._sign(payload, client)}"
+
+    def parse(self, token, client=''):
+        """(id de sesión, expiración) si la firma es válida para el cliente y no ha vencido; None en otro caso"""
+        try:
+            session_id, expira, firma = token.split('.')
+            expira = int(expira)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(firma, self._sign(f"{session_id}.{expira}", client)):
+            return None
+        if expira < time.time():
+            return None
+        return session_id, expira
+
+    def verify(self, token, client=''):
+        """Id de sesión si el token es válido (sin consultar el almacén)"""
+        parsed = self.parse(token, client)
+        return parsed[0] if parsed else None
+
+
+class SQLiteSessionStore:
+    """Sesiones en la tabla sesiones de la base de la aplicación"""
+    name = "sqlite"
+
+    def __init__(self, db):
+        self.db = db
+
+    def save(self, session_id, user, expira):
+        with self.db.transaction() as tx:
+            tx.execute(
+                "INSERT INTO sesiones (id, matricula, datos, expira) VALUES (?, ?, ?, ?)",
+                (session_id, user['matricula'], json.dumps(user), expira)
+            )
+
+    def load(self, session_id):
+        result = self.db.fetch_one(
+            "SELECT datos FROM sesiones WHERE id = ? AND expira >= ?",
+            (session_id, int(time.time()))
+        )
+        return json.loads(result[0]) if result else None
+
+    def delete(self, session_id):
+        with self.db.transaction() as tx:
+            tx.execute("DELETE FROM sesiones WHERE id = ?", (session_id,))
+
+    def delete_user(self, matricula):
+        with self.db.transaction() as tx:
+            return tx.execute("DELETE FROM sesiones WHERE matricula = ?", (matricula,))
+
+    def purge_expired(self):
+        with self.db.transaction() as tx:
+            return tx.execute("DELETE FROM sesiones WHERE expira < ?", (int(time.time()),))
+
+
+class FileSessionStore:
+    """Un archivo JSON por sesión en un directorio compartido (volumen común de los procesos)"""
+    name = "archivo"
+
+    def __init__(self, db, directory=SESSION_DIR):
+        self.directory = directory if os.path.isabs(directory) else os.path.join(
+            os.path.dirname(os.path.abspath(db.db_name)), directory
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, session_id, user, expira):
+        path = self._path(session_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'user': user, 'expira': expira}, f)
+        # Reemplazo atómico: ningún proceso lee un archivo a medio escribir
+        os.replace(tmp_path, path)
+
+    def load(self, session_id):
+        entry = self._read(self._path(session_id))
+        if entry is None or entry['expira'] < time.time():
+            return None
+        return entry['user']
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        for nombre in os.listdir(self.directory):
+            if nombre.endswith('.json'):
+                path = os.path.join(self.directory, nombre)
+                yield path, self._read(path)
+
+    def delete_user(self, matricula):
+        deleted = 0
+        for path, entry in self._entries():
+            if entry and entry['user']['matricula'] == matricula:
+                self.delete(os.path.basename(path)[:-len('.json')])
+                deleted += 1
+        return deleted
+
+    def purge_expired(self):
+        deleted = 0
+        now = time.time()
+        for path, entry in self._entries():
+            if entry is None or entry['expira'] < now:
+                self.delete(os.path.basename(path)[:-len('.json')])
+                deleted += 1
+        return deleted
+
+
+class LocalKVStore:
+    """Sustituto local de un almacén clave-valor en red (get/set con vencimiento/delete).
+
+    Vive en la memoria del proceso, así que solo sirve con un proceso o en pruebas;
+    para varios procesos se reemplaza por un cliente del servicio con la misma interfaz."""
+    name = "kv"
+
+    def __init__(self, db=None):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    # Operaciones del almacén clave-valor
+    def kv_set(self, key, value, ttl):
+        with self._lock:
+            self.data[key] = (value, time.time() + ttl)
+
+    def kv_get(self, key):
+        with self._lock:
+            entry = self.data.get(key)
+            if entry is None or entry[1] < time.time():
+                self.data.pop(key, None)
+                return None
+            return entry[0]
+
+    def kv_delete(self, key):
+        with self._lock:
+            self.data.pop(key, None)
+
+    # Interfaz del almacén de sesiones
+    def save(self, session_id, user, expira):
+        self.kv_set(f"sesion:{session_id}", json.dumps(user), expira - time.time())
+
+    def load(self, session_id):
+        value = self.kv_get(f"sesion:{session_id}")
+        return json.loads(value) if value else None
+
+    def delete(self, session_id):
+        self.kv_delete(f"sesion:{session_id}")
+
+    def delete_user(self, matricula):
+        with self._lock:
+            keys = [key for key, (value, _) in self.data.items() if json.loads(value)['matricula'] == matricula]
+            for key in keys:
+                del self.data[key]
+        return len(keys)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            keys = [key for key, (_, expira) in self.data.items() if expira < now]
+            for key in keys:
+                del self.data[key]
+        return len(keys)
+
+
+SESSION_STORES = {
+    'sqlite': SQLiteSessionStore,
+    'archivo': FileSessionStore,
+    'kv': LocalKVStore
+}
+
+
+def create_session_store(db, store_name=None):
+    """Crea el almacén configurado en SESSION_STORE (o el indicado explícitamente)"""
+    store_name = (store_name or SESSION_STORE).lower()
+    if store_name not in SESSION_STORES:
+        raise ValueError(f"Almacén de sesiones no soportado: {store_name}")
+    return SESSION_STORES[store_name](db)
+
+
+class SessionManager:
+    """Sesiones sin estado en el proceso: el token firmado viaja con el cliente y los datos en el almacén"""
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, db, store=None):
+        self.db = db
+        self.store = store or create_session_store(db)
+        self.tokens = SessionTokens(load_secret(db.db_name))
+
+    @classmethod
+    def for_database(cls, db):
+        """Administrador compartido por proceso, con depuración periódica de sesiones vencidas"""
+        key = os.path.abspath(db.db_name)
+        with cls._managers_lock:
+            if key not in cls._managers:
+                manager = cls(db)
+                scheduler.schedule(f"sesiones:{key}", SESSION_PURGE_SECONDS, manager.store.purge_expired)
+                cls._managers[key] = manager
+            return cls._managers[key]
+
+    def _issue(self, session_id, client):
+        return self.tokens.issue(session_id, int(time.time()) + SESSION_TOKEN_TTL_SECONDS, client)
+
+    def create(self, user, client=''):
+        """Registra la sesión del usuario y devuelve su token firmado para ese cliente"""
+        session_id = secrets.token_urlsafe(24)
+        expira = int(time.time()) + SESSION_TTL_SECONDS
+        self.store.save(session_id, user, expira)
+        return self._issue(session_id, client)
+
+    def resolve(self, token, client=''):
+        """Usuario de la sesión, o None si el token es inválido, de otro cliente, venció o fue cerrada"""
+        session_id = self.tokens.verify(token, client)
+        if session_id is None:
+            return None
+        return self.store.load(session_id)
+
+    def renew(self, token, client=''):
+        """Token nuevo si al válido le queda menos de la mitad de su vigencia; si no, el mismo.
+
+        El anterior deja de servir al vencer (minutos); la sesión termina con SESSION_TTL_SECONDS"""
+        parsed = self.tokens.parse(token, client)
+        if parsed is None or parsed[1] - time.time() > SESSION_TOKEN_TTL_SECONDS / 2:
+            return token
+        return self._issue(parsed[0], client)
+
+    def revoke(self, token, client=''):
+        """Cierra la sesión del token (en todos los procesos)"""
+        session_id = self.tokens.verify(token, client)
+        if session_id is not None:
+            self.store.delete(session_id)
@@ -1,11 +1,24 @@
 import streamlit as st
 import pandas as pd
 from database import DatabaseManager
+from offer_feed import OfferFeed
+from catalog_cache import ReferenceCatalog
+from notification_hub import NotificationHub, NOTIFICATION_POLL_SECONDS, LIVE_WINDOW_SECONDS
+from campaigns import SubmissionWriter
 from datetime import datetime, date
+import time
+
+# Límite de notificaciones por pestaña, para que la consulta no crezca con el historial
+UNREAD_NOTIFICATIONS_LIMIT = 200
+READ_NOTIFICATIONS_LIMIT = 50
 
 class StudentModule:
     def __init__(self):
         self.db = DatabaseManager()
+        self.offer_feed = OfferFeed.for_database(self.db)
+        self.catalog = ReferenceCatalog.for_database(self.db)
+        self.hub = NotificationHub.for_database(self.db)
+        self.submissions = SubmissionWriter.for_database(self.db)
 
     def show_student_dashboard(self, user):
         """Dashboard principal del estudiante"""
@@ -47,6 +60,11 @@ class StudentModule:
             key="sidebar_menu_radio"
         )
 
+        # Insignia de notificaciones sin leer (una lectura por clave primaria)
+        unread_count, _ = self.refresh_notification_counter(user['matricula'])
+        if unread_count:
+            st.sidebar.caption(f"🔔 {unread_count} notificaciones sin leer")
+
         # Solo actualizar si cambió la selección
         if option != st.session_state.student_menu_selection:
             st.session_state.student_menu_selection = option
@@ -69,11 +87,7 @@ class StudentModule:
 
     def is_first_login(self, matricula):
         """Verifica si es el primer login (contraseña = matrícula)"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT password FROM usuarios WHERE matricula = ?", (matricula,))
-        result = cursor.fetchone()
-        conn.close()
+        result = self.db.fetch_one("SELECT password FROM usuarios WHERE matricula = ?", (matricula,))
 
         if result:
             # Verificar si la contraseña actual es igual a la matrícula
@@ -117,6 +131,18 @@ class StudentModule:
                     except Exception as e:
                         st.error(f"Error al cambiar contraseña: {str(e)}")
 
+    def refresh_notification_counter(self, matricula):
+        """Lee el contador del alumno (una lectura por clave primaria) y lo guarda en la sesión"""
+        st.session_state.notification_counter = (matricula, self.db.get_notification_counter(matricula))
+        return st.session_state.notification_counter[1]
+
+    def notification_counter(self, matricula):
+        """(no leídas, versión) del alumno; reutiliza la lectura hecha al inicio de la ejecución"""
+        cached = st.session_state.get('notification_counter')
+        if cached and cached[0] == matricula:
+            return cached[1]
+        return self.refresh_notification_counter(matricula)
+
     def show_personal_dashboard(self, matricula):
         """Dashboard personal del estudiante"""
         st.subheader("📊 Mi Dashboard Personal")
@@ -149,12 +175,8 @@ class StudentModule:
             st.metric("Años de Egreso", años_egresado)
 
         with col4:
-            # Contar notificaciones no leídas
-            notifications = self.db.execute_query(
-                "SELECT COUNT(*) as count FROM notificaciones WHERE matricula = ? AND leida = 0",
-                (matricula,)
-            )
-            unread_count = notifications.iloc[0]['count'] if not notifications.empty else 0
+            # Notificaciones no leídas desde el contador del alumno
+            unread_count, _ = self.notification_counter(matricula)
             st.metric("Notificaciones", unread_count)
 
         # Resumen de situación actual
@@ -164,10 +186,10 @@ class StudentModule:
 
         with col1:
             st.write("### 🎓 Situación Académica")
-            academic = self.db.execute_query(
+            academic = self.catalog.decode(self.db.execute_query(
                 "SELECT * FROM situacion_academica WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
                 (matricula,)
-            )
+            ))
 
             if not academic.empty:
                 acad_data = academic.iloc[0]
@@ -186,10 +208,10 @@ class StudentModule:
 
         with col2:
             st.write("### 💼 Situación Laboral")
-            work = self.db.execute_query(
+            work = self.catalog.decode(self.db.execute_query(
                 "SELECT * FROM situacion_laboral WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
                 (matricula,)
-            )
+            ))
 
             if not work.empty:
                 work_data = work.iloc[0]
@@ -208,16 +230,21 @@ class StudentModule:
 
         # Ofertas de trabajo recientes
         st.subheader("💼 Ofertas de Trabajo Recientes")
-        recent_offers = self.db.execute_query('''
-            SELECT ot.titulo_puesto, e.nombre_empresa, ot.modalidad, ot.fecha_publicacion
-            FROM ofertas_trabajo ot
-            JOIN empresas e ON ot.empresa_id = e.id
-            WHERE ot.activa = 1
-            ORDER BY ot.fecha_publicacion DESC
-            LIMIT 5
-        ''')
+        recent_offers = self.offer_feed.get_offers().head(5)
 
         if not recent_offers.empty:
+            # El conteo se guarda en la sesión por versión del feed; Ofertas de Trabajo lo descarta al marcarlas vistas
+            panel_key = f"ofertas_nuevas_panel_{matricula}"
+            cached = st.session_state.get(panel_key)
+            if (cached is None or cached['version'] != self.offer_feed.version
+                    or not self.db.engine.backend.supports_triggers):
+                cached = st.session_state[panel_key] = {
+                    'version': self.offer_feed.version,
+                    'count': len(self.offer_feed.new_offer_ids(matricula))
+                }
+            new_count = cached['count']
+            if new_count:
+                st.caption(f"🆕 {new_count} ofertas nuevas desde tu última visita a Ofertas de Trabajo")
             for _, offer in recent_offers.iterrows():
                 with st.expander(f"🏢 {offer['titulo_puesto']} - {offer['nombre_empresa']}"):
                     st.write(f"**Modalidad:** {offer['modalidad']}")
@@ -281,18 +308,19 @@ class StudentModule:
 
                 if submit:
                     try:
-                        # Actualizar tabla usuarios
-                        self.db.execute_query(
-                            "UPDATE usuarios SET email = ?, telefono = ? WHERE matricula = ?",
-                            (email, telefono, matricula)
-                        )
-
-                        # Actualizar tabla alumnos_egresados
-                        self.db.execute_query('''
-                            UPDATE alumnos_egresados
-                            SET email = ?, telefono = ?, cedula_profesional = ?, titulo_obtenido = ?
-                            WHERE matricula = ?
-                        ''', (email, telefono, cedula_profesional, titulo_obtenido, matricula))
+                        with self.db.transaction() as tx:
+                            # Actualizar tabla usuarios
+                            tx.execute(
+                                "UPDATE usuarios SET email = ?, telefono = ? WHERE matricula = ?",
+                                (email, telefono, matricula)
+                            )
+
+                            # Actualizar tabla alumnos_egresados
+                            tx.execute('''
+                                UPDATE alumnos_egresados
+                                SET email = ?, telefono = ?, cedula_profesional = ?, titulo_obtenido = ?
+                                WHERE matricula = ?
+                            ''', (email, telefono, cedula_profesional, titulo_obtenido, matricula))
 
                         st.success("¡Información actualizada exitosamente!")
                         import time
@@ -306,10 +334,10 @@ class StudentModule:
         st.subheader("🎓 Mi Situación Académica Actual")
 
         # Mostrar situación actual
-        current_academic = self.db.execute_query(
+        current_academic = self.catalog.decode(self.db.execute_query(
             "SELECT * FROM situacion_academica WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
             (matricula,)
-        )
+        ))
 
         if not current_academic.empty:
             st.write("### 📋 Situación Actual")
@@ -434,13 +462,8 @@ class StudentModule:
                             st.error("Por favor complete todos los campos obligatorios (*)")
                             return
 
-                        query = '''
-                            INSERT INTO situacion_academica 
-                            (matricula, estudia_actualmente, institucion_actual, tipo_estudios, 
-                             nombre_programa, fecha_inicio, fecha_fin_estimada)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        self.db.execute_query(query, (
+                        # Las respuestas se guardan en lotes junto con las de otros alumnos
+                        self.submissions.submit('academica', (
                             matricula,
                             True,
                             institucion_actual,
@@ -450,12 +473,7 @@ class StudentModule:
                             fecha_fin_estimada
                         ))
                     else:
-                        query = '''
-                            INSERT INTO situacion_academica 
-                            (matricula, estudia_actualmente)
-                            VALUES (?, ?)
-                        '''
-                        self.db.execute_query(query, (matricula, False))
+                        self.submissions.submit('academica', (matricula, False, None, None, None, None, None))
 
                     st.success("¡Situación académica actualizada exitosamente!")
                     # Limpiar session state
@@ -472,10 +490,10 @@ class StudentModule:
         st.subheader("💼 Mi Situación Laboral Actual")
 
         # Mostrar situación actual
-        current_work = self.db.execute_query(
+        current_work = self.catalog.decode(self.db.execute_query(
             "SELECT * FROM situacion_laboral WHERE matricula = ? ORDER BY fecha_actualizacion DESC LIMIT 1",
             (matricula,)
-        )
+        ))
 
         if not current_work.empty:
             st.write("### 📋 Situación Actual")
@@ -654,13 +672,8 @@ class StudentModule:
                             st.error("Por favor complete todos los campos obligatorios (*)")
                             return
 
-                        query = '''
-                            INSERT INTO situacion_laboral 
-                            (matricula, trabaja_actualmente, empresa, cargo, sector, 
-                             salario_rango, anos_experiencia, fecha_inicio_trabajo, relacionado_carrera)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        self.db.execute_query(query, (
+                        # Las respuestas se guardan en lotes junto con las de otros alumnos
+                        self.submissions.submit('laboral', (
                             matricula,
                             True,
                             empresa,
@@ -672,12 +685,7 @@ class StudentModule:
                             relacionado_carrera == "Sí"
                         ))
                     else:
-                        query = '''
-                            INSERT INTO situacion_laboral 
-                            (matricula, trabaja_actualmente)
-                            VALUES (?, ?)
-                        '''
-                        self.db.execute_query(query, (matricula, False))
+                        self.submissions.submit('laboral', (matricula, False, None, None, None, None, None, None, None))
 
                     st.success("¡Situación laboral actualizada exitosamente!")
                     # Limpiar session state
@@ -693,28 +701,51 @@ class StudentModule:
         """Mostrar notificaciones del estudiante"""
         st.subheader("📧 Mis Notificaciones")
 
-        # Obtener notificaciones
-        notifications = self.db.execute_query('''
+        # Avisos en vivo de notificaciones que llegan mientras la página está abierta
+        live_area = self.start_live_notifications(matricula)
+
+        # Obtener notificaciones (las leídas, solo las más recientes; el resto pasa al archivo)
+        query = '''
             SELECT n.*, ot.titulo_puesto, e.nombre_empresa
             FROM notificaciones n
             LEFT JOIN ofertas_trabajo ot ON n.oferta_id = ot.id
             LEFT JOIN empresas e ON ot.empresa_id = e.id
-            WHERE n.matricula = ?
+            WHERE n.matricula = ? AND n.leida = ? AND n.archivada = ?
             ORDER BY n.fecha_envio DESC
-        ''', (matricula,))
-
-        if notifications.empty:
+            LIMIT ?
+        '''
+        # Las listas se guardan en la sesión y solo se recargan si cambió la versión del contador
+        _, version = self.notification_counter(matricula)
+        cached = st.session_state.get('notification_lists')
+        if version is not None and cached and cached['matricula'] == matricula and cached['version'] == version:
+            unread, read, archived = cached['unread'], cached['read'], cached['archived']
+        else:
+            unread = self.db.execute_query(query, (matricula, 0, 0, UNREAD_NOTIFICATIONS_LIMIT))
+            read = self.db.execute_query(query, (matricula, 1, 0, READ_NOTIFICATIONS_LIMIT))
+            archived = self.db.execute_query(query, (matricula, 1, 1, READ_NOTIFICATIONS_LIMIT))
+            st.session_state.notification_lists = {
+                'matricula': matricula, 'version': version, 'unread': unread, 'read': read, 'archived': archived
+            }
+
+        feedback = st.session_state.pop('notification_feedback', None)
+        if feedback:
+            st.success(feedback)
+
+        if unread.empty and read.empty and archived.empty:
             st.info("📭 No tienes notificaciones")
+            self.listen_live_notifications(matricula, live_area)
             return
 
-        # Tabs para notificaciones leídas y no leídas
-        unread = notifications[notifications['leida'] == 0]
-        read = notifications[notifications['leida'] == 1]
-
-        tab1, tab2 = st.tabs([f"📬 No Leídas ({len(unread)})", f"📭 Leídas ({len(read)})"])
+        # Tabs para notificaciones no leídas, leídas y archivadas
+        tab1, tab2, tab3 = st.tabs([
+            f"📬 No Leídas ({len(unread)})", f"📭 Leídas ({len(read)})", f"🗄️ Archivadas ({len(archived)})"
+        ])
 
         with tab1:
             if not unread.empty:
+                self.notification_bulk_actions(matricula, unread, 'no_leidas', [
+                    ('leer', "📖 Marcar como leídas"), ('archivar', "🗄️ Archivar"), ('eliminar', "🗑️ Eliminar")
+                ])
                 for _, notif in unread.iterrows():
                     with st.expander(f"🔔 {notif['titulo']}", expanded=True):
                         st.write(f"**Fecha:** {notif['fecha_envio']}")
@@ -722,16 +753,18 @@ class StudentModule:
                         if notif['oferta_id']:
                             st.write(f"**Oferta relacionada:** {notif['titulo_puesto']} - {notif['nombre_empresa']}")
                         if st.button(f"Marcar como leída", key=f"read_{notif['id']}"):
-                            self.db.execute_query(
-                                "UPDATE notificaciones SET leida = 1 WHERE id = ?",
-                                (notif['id'],)
-                            )
+                            self.apply_notification_action(matricula, [notif['id']], 'leer')
                             st.rerun()
             else:
                 st.info("✅ No tienes notificaciones pendientes")
 
         with tab2:
             if not read.empty:
+                if len(read) == READ_NOTIFICATIONS_LIMIT:
+                    st.caption(f"Se muestran las {READ_NOTIFICATIONS_LIMIT} notificaciones leídas más recientes")
+                self.notification_bulk_actions(matricula, read, 'leidas', [
+                    ('archivar', "🗄️ Archivar"), ('eliminar', "🗑️ Eliminar")
+                ])
                 for _, notif in read.iterrows():
                     with st.expander(f"📖 {notif['titulo']}"):
                         st.write(f"**Fecha:** {notif['fecha_envio']}")
@@ -741,18 +774,155 @@ class StudentModule:
             else:
                 st.info("No tienes notificaciones leídas")
 
+        with tab3:
+            if not archived.empty:
+                self.notification_bulk_actions(matricula, archived, 'archivadas', [('eliminar', "🗑️ Eliminar")])
+                for _, notif in archived.iterrows():
+                    with st.expander(f"🗄️ {notif['titulo']}"):
+                        st.write(f"**Fecha:** {notif['fecha_envio']}")
+                        st.write(f"**Mensaje:** {notif['mensaje']}")
+            else:
+                st.info("No tienes notificaciones archivadas")
+
         # Botón para marcar todas como leídas
         if not unread.empty:
             if st.button("📖 Marcar todas como leídas"):
-                self.db.execute_query(
-                    "UPDATE notificaciones SET leida = 1 WHERE matricula = ? AND leida = 0",
-                    (matricula,)
-                )
-                st.success("Todas las notificaciones han sido marcadas como leídas")
-                import time
-                time.sleep(1)
+                if len(unread) < UNREAD_NOTIFICATIONS_LIMIT:
+                    # Todas las pendientes están en pantalla: se marcan por id y la lista se actualiza en memoria
+                    self.apply_notification_action(matricula, unread['id'].tolist(), 'leer')
+                else:
+                    self.db.execute_query(
+                        "UPDATE notificaciones SET leida = 1 WHERE matricula = ? AND leida = 0",
+                        (matricula,)
+                    )
+                    self.hub.publish([matricula])
+                st.session_state.notification_feedback = "Todas las notificaciones han sido marcadas como leídas"
                 st.rerun()
 
+        self.listen_live_notifications(matricula, live_area)
+
+    def notification_bulk_actions(self, matricula, notifs, key, acciones):
+        """Selección múltiple de notificaciones y acciones en bloque sobre ellas"""
+        etiquetas = {
+            int(notif['id']): f"{notif['titulo']} · {notif['fecha_envio']}"
+            for _, notif in notifs.iterrows()
+        }
+        accion = None
+        with st.form(f"acciones_{key}", clear_on_submit=True):
+            todas = st.checkbox(f"Seleccionar todas ({len(etiquetas)})")
+            seleccion = st.multiselect("Notificaciones seleccionadas", options=list(etiquetas), format_func=etiquetas.get)
+            columnas = st.columns(len(acciones))
+            for columna, (nombre, etiqueta) in zip(columnas, acciones):
+                with columna:
+                    if st.form_submit_button(etiqueta):
+                        accion = nombre
+
+        if accion:
+            ids = list(etiquetas) if todas else seleccion
+            if not ids:
+                st.warning("Seleccione al menos una notificación")
+                return
+            afectadas = self.apply_notification_action(matricula, ids, accion)
+            verbos = {'leer': "marcadas como leídas", 'archivar': "archivadas", 'eliminar': "eliminadas"}
+            st.session_state.notification_feedback = f"{afectadas} notificaciones {verbos[accion]}"
+            st.rerun()
+
+    def apply_notification_action(self, matricula, ids, accion):
+        """Aplica la acción en una sola transacción y actualiza en memoria las listas de la sesión, sin volver a consultarlas"""
+        afectadas, antes, despues = self.db.apply_notification_action(matricula, ids, accion)
+        self.hub.publish([matricula])
+
+        cached = st.session_state.get('notification_lists')
+        if despues is None or not cached or cached['matricula'] != matricula or cached['version'] != antes:
+            # Las listas no estaban al día (o no hay versión): se recargan en la siguiente ejecución
+            st.session_state.pop('notification_lists', None)
+            return afectadas
+
+        ids = {int(notification_id) for notification_id in ids}
+        unread, read, archived = cached['unread'], cached['read'], cached['archived']
+        if accion == 'leer':
+            movidas = unread[unread['id'].isin(ids)].assign(leida=1)
+            read = self._merge_notifications(movidas, read)
+        elif accion == 'archivar':
+            movidas = pd.concat([unread[unread['id'].isin(ids)], read[read['id'].isin(ids)]]).assign(leida=1, archivada=1)
+            read = read[~read['id'].isin(ids)]
+            archived = self._merge_notifications(movidas, archived)
+        else:
+            read = read[~read['id'].isin(ids)]
+            archived = archived[~archived['id'].isin(ids)]
+        unread = unread[~unread['id'].isin(ids)]
+
+        cached.update(version=despues, unread=unread, read=read, archived=archived)
+        return afectadas
+
+    def _merge_notifications(self, movidas, lista):
+        """Agrega las notificaciones movidas a una lista, más recientes primero y dentro de su límite"""
+        if movidas.empty:
+            return lista
+        if lista.empty:
+            return movidas.head(READ_NOTIFICATIONS_LIMIT)
+        combinada = pd.concat([movidas, lista]).sort_values('fecha_envio', ascending=False)
+        return combinada.head(READ_NOTIFICATIONS_LIMIT)
+
+    def start_live_notifications(self, matricula):
+        """Prepara el área de avisos en vivo; con st.fragment se actualiza sola, sin recargar la página"""
+        # La página completa ya muestra todo lo recibido hasta ahora: desde aquí se esperan cambios
+        st.session_state.live_notifications = {
+            'matricula': matricula,
+            'etag': self.hub.etag(matricula),
+            'ultimo_id': self.hub.last_id(matricula),
+            'nuevas': None
+        }
+        fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+        if fragment:
+            fragment(run_every=NOTIFICATION_POLL_SECONDS)(self._refresh_live_notifications)(matricula)
+            return None
+        return st.empty()
+
+    def _refresh_live_notifications(self, matricula, area=None):
+        """Consulta la base solo si cambió la etiqueta del alumno y dibuja la insignia y las nuevas"""
+        live = st.session_state.live_notifications
+        etag = self.hub.etag(matricula)
+        if etag != live['etag']:
+            live['etag'] = etag
+            live['nuevas'] = self.hub.new_notifications(matricula, live['ultimo_id'])
+            self.refresh_notification_counter(matricula)
+
+        nuevas = live['nuevas']
+        if nuevas is None or nuevas.empty:
+            return
+        unread_count, _ = self.notification_counter(matricula)
+        with area.container() if area is not None else st.container():
+            st.info(f"🔔 {len(nuevas)} notificaciones nuevas · {unread_count} sin leer")
+            for _, notif in nuevas.iterrows():
+                st.write(f"**{notif['titulo']}** ({notif['fecha_envio']}): {notif['mensaje']}")
+
+    def listen_live_notifications(self, matricula, area):
+        """Sin st.fragment: una espera corta por ejecución y luego otra ejecución de la página.
+
+        Cada ejecución termina en segundos, así que las interacciones del alumno se atienden entre esperas;
+        la escucha se pausa tras LIVE_WINDOW_SECONDS sin interacción"""
+        if area is None:
+            return
+        if not st.toggle("🔴 Actualización en vivo", key="live_notifications_toggle"):
+            return
+
+        now = time.monotonic()
+        # Las ejecuciones que lanza la propia escucha no cuentan como actividad del alumno
+        if not st.session_state.pop('live_notifications_rerun', False):
+            st.session_state.live_notifications_until = now + LIVE_WINDOW_SECONDS
+        if now >= st.session_state.live_notifications_until:
+            st.caption("Actualización en vivo pausada por inactividad")
+            return
+
+        st.caption(f"🔴 En vivo · última revisión {datetime.now():%H:%M:%S}")
+        live = st.session_state.live_notifications
+        if self.hub.wait(matricula, live['etag'], NOTIFICATION_POLL_SECONDS) != live['etag']:
+            # La siguiente ejecución vuelve a leer las listas con el contador actualizado
+            self.refresh_notification_counter(matricula)
+        st.session_state.live_notifications_rerun = True
+        st.rerun()
+
     def show_job_offers(self, matricula):
         """Mostrar ofertas de trabajo disponibles"""
         st.subheader("💼 Ofertas de Trabajo Disponibles")
@@ -767,15 +937,12 @@ class StudentModule:
                 key="filter_modalidad_job"
             )
 
+        # Feed compartido de ofertas activas (sin consultar la base en cada rerun)
+        offers = self.offer_feed.get_offers()
+
         with col2:
-            # Obtener sectores únicos
-            sectors = self.db.execute_query('''
-                SELECT DISTINCT e.sector
-                FROM empresas e
-                JOIN ofertas_trabajo ot ON e.id = ot.empresa_id
-                WHERE ot.activa = 1 AND e.sector IS NOT NULL
-            ''')
-            sector_options = ["Todos"] + (sectors['sector'].tolist() if not sectors.empty else [])
+            # Sectores únicos de las ofertas activas
+            sector_options = ["Todos"] + self.catalog.sectores_ofertas()
             sector_filter = st.selectbox("Filtrar por sector", sector_options, key="filter_sector_job")
 
         with col3:
@@ -785,34 +952,34 @@ class StudentModule:
                 key="filter_fecha_job"
             )
 
-        # Construir query con filtros
-        base_query = '''
-            SELECT ot.*, e.nombre_empresa, e.sector, e.email_contacto
-            FROM ofertas_trabajo ot
-            JOIN empresas e ON ot.empresa_id = e.id
-            WHERE ot.activa = 1
-        '''
-        params = []
-
-        if modalidad_filter != "Todas":
-            base_query += " AND ot.modalidad = ?"
-            params.append(modalidad_filter)
-
-        if sector_filter != "Todos":
-            base_query += " AND e.sector = ?"
-            params.append(sector_filter)
-
-        if fecha_filter != "Todas":
-            if fecha_filter == "Última semana":
-                base_query += " AND ot.fecha_publicacion >= date('now', '-7 days')"
-            elif fecha_filter == "Último mes":
-                base_query += " AND ot.fecha_publicacion >= date('now', '-1 month')"
-            elif fecha_filter == "Últimos 3 meses":
-                base_query += " AND ot.fecha_publicacion >= date('now', '-3 months')"
-
-        base_query += " ORDER BY ot.fecha_publicacion DESC"
-
-        offers = self.db.execute_query(base_query, params if params else None)
+        # Ofertas nuevas desde la última visita (se calculan una vez por versión del feed)
+        new_key = f"ofertas_nuevas_{matricula}"
+        if st.session_state.get(new_key, {}).get('version') != self.offer_feed.version:
+            st.session_state[new_key] = {
+                'version': self.offer_feed.version,
+                'ids': self.offer_feed.new_offer_ids(matricula)
+            }
+            self.offer_feed.mark_seen(matricula)
+            st.session_state.pop(f"ofertas_nuevas_panel_{matricula}", None)
+        new_ids = st.session_state[new_key]['ids']
+
+        # Aplicar filtros sobre el feed en memoria
+        if not offers.empty:
+            if modalidad_filter != "Todas":
+                offers = offers[offers['modalidad'] == modalidad_filter]
+
+            if sector_filter != "Todos":
+                offers = offers[offers['sector'] == sector_filter]
+
+            if fecha_filter != "Todas":
+                today = pd.Timestamp.utcnow().tz_localize(None).normalize()
+                if fecha_filter == "Última semana":
+                    cutoff = today - pd.Timedelta(days=7)
+                elif fecha_filter == "Último mes":
+                    cutoff = today - pd.DateOffset(months=1)
+                else:
+                    cutoff = today - pd.DateOffset(months=3)
+                offers = offers[offers['fecha_publicacion_dt'] >= cutoff]
 
         if offers.empty:
             st.info("📭 No hay ofertas de trabajo que coincidan con los filtros seleccionados")
@@ -822,7 +989,8 @@ class StudentModule:
 
         # Mostrar ofertas
         for _, offer in offers.iterrows():
-            with st.expander(f"🏢 {offer['titulo_puesto']} - {offer['nombre_empresa']}"):
+            badge = "🆕 " if offer['id'] in new_ids else ""
+            with st.expander(f"{badge}🏢 {offer['titulo_puesto']} - {offer['nombre_empresa']}"):
                 col1, col2 = st.columns(2)
 
                 with col1:
@@ -879,11 +1047,7 @@ class StudentModule:
                     st.error("La nueva contraseña no puede ser igual a su matrícula")
                 else:
                     # Verificar contraseña actual
-                    conn = self.db.get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT password FROM usuarios WHERE matricula = ?", (matricula,))
-                    result = cursor.fetchone()
-                    conn.close()
+                    result = self.db.fetch_one("SELECT password FROM usuarios WHERE matricula = ?", (matricula,))
 
                     if result and self.db.verify_password(current_password, result[0]):
                         try:
@@ -0,0 +1,157 @@
+import os
+import threading
+import pandas as pd
+import scheduler
+
+TREND_ROLLUP_SECONDS = int(os.getenv("TREND_ROLLUP_SECONDS", "300"))
+TREND_BATCH_SIZE = int(os.getenv("TREND_BATCH_SIZE", "5000"))
+
+# Dimensión -> (tabla con historial, columna de situación)
+TREND_DIMENSIONS = {
+    'laboral': ('situacion_laboral', 'trabaja_actualmente'),
+    'academica': ('situacion_academica', 'estudia_actualmente')
+}
+
+
+class TrendRollup:
+    """Serie mensual de situación por carrera y cohorte, agregada solo a partir de los registros nuevos.
+
+    Cada registro de historial que cambia la situación de un egresado resta 1 a su situación
+    anterior y suma 1 a la nueva en el mes del registro; la suma acumulada por mes es la serie."""
+    _rollups = {}
+    _rollups_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, db):
+        """Agregación compartida por proceso, actualizada periódicamente en segundo plano"""
+        key = os.path.abspath(db.db_name)
+        with cls._rollups_lock:
+            if key not in cls._rollups:
+                rollup = cls(db)
+                scheduler.schedule(f"tendencias:{key}", TREND_ROLLUP_SECONDS, rollup.run)
+                cls._rollups[key] = rollup
+            return cls._rollups[key]
+
+    def watermark(self, dimension):
+        result = self.db.fetch_one("SELECT ultimo_id FROM marcas_agregacion WHERE proceso = ?", (f"tendencias:{dimension}",))
+        return int(result[0]) if result else 0
+
+    def _rollup_batch(self, dimension):
+        """Agrega un lote de registros posteriores a la marca; devuelve cuántos procesó"""
+        tabla, columna = TREND_DIMENSIONS[dimension]
+        proceso = f"tendencias:{dimension}"
+        marca = self.watermark(dimension)
+        rows = self.db.fetch_all(f'''
+            SELECT s.id, s.matricula, s.{columna}, s.fecha_actualizacion,
+                   COALESCE(ae.carrera_id, 0), COALESCE(ae.anio_egreso, 0)
+            FROM {tabla} s
+            LEFT JOIN alumnos_egresados ae ON ae.matricula = s.matricula
+            WHERE s.id > ?
+            ORDER BY s.id
+            LIMIT ?
+        ''', (marca, TREND_BATCH_SIZE))
+        if not rows:
+            return 0
+
+        matriculas = list({row[1] for row in rows})
+        placeholders = ', '.join('?' for _ in matriculas)
+        vigentes = {
+            matricula: (estado, carrera_id, anio)
+            for matricula, estado, carrera_id, anio in self.db.fetch_all(
+                f"SELECT matricula, estado, carrera_id, anio_egreso FROM estados_vigentes WHERE dimension = ? AND matricula IN ({placeholders})",
+                [dimension] + matriculas
+            )
+        }
+
+        cambios = {}
+        for _, matricula, estado, fecha, carrera_id, anio in rows:
+            estado = int(bool(estado))
+            periodo = str(fecha)[:7]
+            anterior = vigentes.get(matricula)
+            if anterior and anterior[0] == estado:
+                continue
+            if anterior:
+                # Se descuenta donde se contó, aunque después cambie su carrera o cohorte
+                clave = (anterior[1], anterior[2], anterior[0], periodo)
+                cambios[clave] = cambios.get(clave, 0) - 1
+            clave = (carrera_id, anio, estado, periodo)
+            cambios[clave] = cambios.get(clave, 0) + 1
+            vigentes[matricula] = (estado, carrera_id, anio)
+
+        with self.db.transaction() as tx:
+            tx.execute(
+                "INSERT INTO marcas_agregacion (proceso, ultimo_id) VALUES (?, 0) ON CONFLICT (proceso) DO NOTHING",
+                (proceso,)
+            )
+            # Avance condicional de la marca: si otro proceso ya agregó este lote, no se cuenta dos veces
+            avanzada = tx.execute(
+                "UPDATE marcas_agregacion SET ultimo_id = ?, fecha_actualizacion = CURRENT_TIMESTAMP WHERE proceso = ? AND ultimo_id = ?",
+                (rows[-1][0], proceso, marca)
+            )
+            if not avanzada:
+                return 0
+            tx.executemany('''
+                INSERT INTO tendencias_mensuales (dimension, carrera_id, anio_egreso, estado, periodo, cambio)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dimension, carrera_id, anio_egreso, estado, periodo)
+                DO UPDATE SET cambio = tendencias_mensuales.cambio + excluded.cambio
+            ''', [(dimension,) + clave + (cambio,) for clave, cambio in cambios.items() if cambio])
+            tx.executemany('''
+                INSERT INTO estados_vigentes (matricula, dimension, estado, carrera_id, anio_egreso)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (matricula, dimension)
+                DO UPDATE SET estado = excluded.estado, carrera_id = excluded.carrera_id, anio_egreso = excluded.anio_egreso
+            ''', [(matricula, dimension) + vigente for matricula, vigente in vigentes.items()])
+        return len(rows)
+
+    def run(self):
+        """Agrega todo lo nuevo desde la última marca, por lotes; devuelve registros procesados por dimensión"""
+        with self._lock:
+            procesados = {}
+            for dimension in TREND_DIMENSIONS:
+                total = 0
+                while True:
+                    count = self._rollup_batch(dimension)
+                    total += count
+                    if count < TREND_BATCH_SIZE:
+                        break
+                procesados[dimension] = total
+            self.processed += sum(procesados.values())
+            return procesados
+
+    def series(self, dimension, carrera_id=None):
+        """Porcentaje mensual de egresados en situación 1 (trabaja/estudia) por cohorte, con columnas por año de egreso"""
+        query = '''
+            SELECT periodo, anio_egreso, estado, SUM(cambio) AS cambio
+            FROM tendencias_mensuales
+            WHERE dimension = ?
+        '''
+        params = [dimension]
+        if carrera_id is not None:
+            query += " AND carrera_id = ?"
+            params.append(carrera_id)
+        rows = self.db.fetch_all(query + " GROUP BY periodo, anio_egreso, estado", params)
+        if not rows:
+            return pd.DataFrame()
+
+        cambios = pd.DataFrame(rows, columns=['periodo', 'anio_egreso', 'estado', 'cambio'])
+        cambios['periodo'] = pd.PeriodIndex(cambios['periodo'], freq='M')
+        tabla = cambios.pivot_table(index='periodo', columns=['anio_egreso', 'estado'], values='cambio', aggfunc='sum', fill_value=0)
+        # Meses sin cambios conservan el conteo del mes anterior
+        meses = pd.period_range(tabla.index.min(), max(tabla.index.max(), pd.Period.now('M')), freq='M')
+        conteos = tabla.reindex(meses, fill_value=0).cumsum()
+
+        porcentajes = {}
+        for anio in sorted(conteos.columns.get_level_values(0).unique()):
+            en_situacion = conteos[(anio, 1)] if (anio, 1) in conteos else 0
+            fuera = conteos[(anio, 0)] if (anio, 0) in conteos else 0
+            total = en_situacion + fuera
+            porcentajes[str(anio) if anio else "Sin cohorte"] = (en_situacion * 100 / total.where(total > 0)).round(1)
+        resultado = pd.DataFrame(porcentajes)
+        resultado.index = resultado.index.astype(str)
+        return resultado